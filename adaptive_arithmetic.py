@@ -1,13 +1,23 @@
 import math
-from sys import stdout as so
-from bisect import bisect
-from bitstring import BitArray
+import progress
+import bitio
+from fenwick import FenwickTree
 
 """
 This file details the functions needed to apply an adaptive Arithmetic coding
-algorithm. It uses a Laplacian estimator of the ASCII characters, and encodes
-the file length to the start of the the compressed file using Elias Gamma
-coding. Decaying functionality is included.
+algorithm. It uses a Laplacian estimator of the byte values, kept as
+integer counts in a Fenwick tree so that each symbol costs O(log alphabet),
+and encodes the file length to the start of the the compressed file using
+Elias Gamma coding. Decaying functionality is included: rather than scaling
+every count by alpha, each decay divides the weight given to new symbols by
+alpha, and counts and weight are scaled back down together only when the
+total reaches its maximum, see _normalise. Counts are fixed point, with up to
+8 fractional bits (see _scale), so the weight is rounded to a small fraction
+of a symbol and the decay is close to exact exponential forgetting. Every
+count is coded with a floor of 1/128 of the weight of new symbols added,
+which keeps the symbols that decay has forgotten codable, so that frequent
+decay (N=1 with alpha=0.5 codes text at about 6.9 bits/symbol) does not do
+worse than a uniform model.
 
 O. Jones Dec 2018
 """
@@ -39,70 +49,81 @@ def elias_gamma_encode(x):
 
 def elias_gamma_decode(y):
     """
-    Decodes an Elias gamma encoding at the start of a binary list
+    Decodes an Elias gamma encoding at the start of a binary stream
 
     Parameters:
     -----------
-    y: list of bits
+    y: list of bits, bitio.BitWriter, bytes or bitio.BitReader
     Binary to be decoded
 
     Returns:
     --------
     num: int
     Decoded integer
-    y: list of bits
-    Rest of y that has not been decoded
+    y: bitio.BitReader
+    Reader positioned at the rest of y that has not been decoded
     """
+    y = bitio.reader(y)
     n = 0
-    for i in range(len(y)):
-        if y[i] == 0:
-            n += 1
-        else:
-            break
-    num = y[i:i+n+1]
-    num = BitArray(num)
-    num = num.uint
-    y = y[i+n+1:]
+    while y.read_bit() == 0:
+        n += 1
+        if not y.remaining:
+            raise ValueError("Bit stream ended inside Elias gamma code")
+    num = (1 << n) | y.read(n)
     return num, y
 
 
-def cumulative_update(freq):
+def _scale(alphabet, max_total):
+    """
+    Returns the count of one symbol in the fixed point counts of the model:
+    a power of 2, at most 2**8, that leaves the initial counts no more than a
+    quarter of max_total.
     """
-    Updates the cumulative probabilities of a distribution from input counts
+    return 1 << min(8, max(0, (max_total//(4*alphabet)).bit_length() - 1))
 
-    Parameters:
-    -----------
-    freq: dict
-    Dictionary of alphabet_counts
+
+FLOOR_BITS = 7  # every count is coded as if weight/2**7 higher
+
+
+def _normalise(freq, weight, max_total, scale=1):
+    """
+    Scales the counts of freq down once their total has reached max_total,
+    dividing them and the weight of new symbols by the largest power of 2 in
+    weight/scale, so that the weight keeps its precision, and then halving
+    the counts if they are still too large.
 
     Returns:
     --------
-    f: dict
-    Dictionary of cumulative distribution
+    weight: float
+    Weight of new symbols
     """
-    tot_count = sum(freq.values())
-    p = dict([(a, freq[a]/tot_count) for a in freq.keys()])
-
-    f = [0]
-    for symbol, probability in p.items():
-        f.append(f[-1]+probability)
+    shift = max(0, (int(weight)//scale).bit_length() - 1)
+    if shift:
+        weight /= 1 << shift
+        freq.scale(lambda f: (f + (1 << shift) - 1) >> shift)
+    while freq.total >= max_total:
+        freq.scale(lambda f: (f + 1)//2)
+    return weight
 
-    f = dict([(a, mf) for a, mf in zip(p, f)])
-    return f, p
 
-
-def encode(x, N=1500, alpha=0.5):
+def encode(x, N=1500, alpha=0.5, report=None, alphabet=256, max_total=1 << 24):
     """
     Encodes data using the Arithmetic coding algorithm
 
     Parameters:
     -----------
-    x: str
-    Data string to be compressed
+    x: bytes-like or str
+    Data to be compressed, see bitio.symbols
+    report=None: progress.Progress
+    Reports progress if given
+    alphabet=256: int
+    Number of symbols, bytes with values below alphabet
+    max_total=1 << 24: int
+    Counts are halved whenever their total reaches this, at most 2**30
 
     Returns:
     --------
-    y: binary list
+    y: bitio.BitWriter
     x data encoded with the p probability
     """
 
@@ -112,41 +133,48 @@ def encode(x, N=1500, alpha=0.5):
     quarter = int(math.ceil(one/4))
     half = 2*quarter
     threequarters = 3*quarter
+    if max_total > quarter:
+        raise ValueError("Total of {} does not fit in the coder's range".format(max_total))
 
-    # Laplacian Estimator
-    freq = dict([(chr(a), 1) for a in range(128)])
-    f, p = cumulative_update(freq)
+    # Laplacian Estimator, in fixed point
+    scale = _scale(alphabet, max_total)
+    freq = FenwickTree([scale]*alphabet)
+    weight, inc = float(scale), scale  # weight of new symbols, relative to those decayed
+    floor = inc >> FLOOR_BITS
 
-    y = elias_gamma_encode(len(x))           # initialise output list
+    x = bitio.symbols(x)
+    y = bitio.BitWriter(elias_gamma_encode(len(x)))  # initialise output stream
     lo, hi = 0, one  # initialise lo and hi to be [0,1.0)
     straddle = 0     # initialise the straddle counter to 0
 
+    checkpoint = progress.begin(report, 'Arithmetic encoded', len(x))
     for k in range(len(x)):  # for every symbol
 
         # display progress bar
-        if k % 100 == 0:
-            so.write('Arithmetic encoded %d%%    \r' % int(math.floor(k/len(x)*100)))
-            so.flush()
+        if k == checkpoint:
+            checkpoint = report.update(k)
+
+        a = x[k]
+        if not 0 <= a < alphabet:
+            raise ValueError("Symbol {} outside alphabet of {}".format(a, alphabet))
 
         lohi_range = hi - lo + 1
         # narrow the interval end-points [lo,hi) to the new range [f,f+p]
-        lo = lo + int(math.ceil(f[x[k]]*lohi_range))
-        hi = lo + int(math.floor(p[x[k]]*lohi_range))
-        if (lo == hi):
-            raise NameError('Zero interval!')
+        c = freq.cumulative(a) + a*floor
+        total = freq.total + alphabet*floor
+        hi = lo + lohi_range*(c + freq.counts[a] + floor)//total - 1
+        lo = lo + lohi_range*c//total
 
         # Re-scale the interval if its end-points have bits in common
         while True:
             if hi < half:  # if lo < hi < 1/2
                 # append 0 and appropriate number of straddle 1s, stretch dealt with after
-                y.append(0)
-                y += [1]*straddle
+                y.write((1 << straddle) - 1, straddle + 1)
                 straddle = 0
 
             elif lo >= half:  # if hi > lo >= 1/2
                 # append 1 and appropriate number of straddle 0s, stretch dealt with after
-                y.append(1)
-                y += [0]*straddle
+                y.write(1 << straddle, straddle + 1)
                 straddle = 0
                 lo -= half
                 hi -= half
@@ -165,39 +193,49 @@ def encode(x, N=1500, alpha=0.5):
             #      A BOX OF CHOCOLATES FOR ANYONE WHO GIVES ME A WELL ARGUED REASON FOR THIS... It seems
             #      to solve a minor precision problem.)
 
-        freq[x[k]] += 1
-        f, p = cumulative_update(freq)
+        freq.add(a, inc)
         if k % N == 0 and k != 0:
-            for char in freq:
-                freq[char] = math.ceil(freq[char]*alpha)
+            weight /= alpha
+            inc = round(weight)
+        if freq.total >= max_total:
+            weight = _normalise(freq, weight, max_total, scale)
+            inc = round(weight)
+        floor = inc >> FLOOR_BITS
 
     # termination bits
     # after processing all input symbols, flush any bits still in the 'straddle' pipeline
     straddle += 1     # adding 1 to straddle for "good measure" (ensures prefix-freeness)
     if lo < quarter:  # the position of lo determines the dyadic interval that fits
-        y.append(0)
-        y += [1]*straddle
+        y.write((1 << straddle) - 1, straddle + 1)
     else:
-        y.append(1)
-        y += [0]*straddle
+        y.write(1 << straddle, straddle + 1)
 
+    progress.end(report)
     # encode prefix free length of string
     return(y)
 
 
-def decode(y, N=1500, alpha=0.5):
+def decode(y, N=1500, alpha=0.5, report=None, alphabet=256, max_total=1 << 24, out=None):
     """
     Encodes data using the Arithmetic coding algorithm
 
     Parameters:
     -----------
-    y: binary list
+    y: list, bitio.BitWriter or bytes
     list of bits Arithmetically Encoded
+    report=None: progress.Progress
+    Reports progress if given
+    alphabet=256: int
+    Number of symbols, as given to encode
+    max_total=1 << 24: int
+    Total at which counts are halved, as given to encode
+    out=None: writable bytes-like
+    Buffer to decode into, see bitio.output
 
     Returns:
     --------
-    x: list of char
-    y data decoded
+    x: bytearray or memoryview
+    y data decoded, in out if given
     """
     n, y = elias_gamma_decode(y)
 
@@ -207,45 +245,41 @@ def decode(y, N=1500, alpha=0.5):
     half = 2*quarter
     threequarters = 3*quarter
 
-    freq = dict([(chr(a), 1) for a in range(128)])
-    f, p = cumulative_update(freq)
-    alphabet = list(p)
+    scale = _scale(alphabet, max_total)
+    freq = FenwickTree([scale]*alphabet)
+    weight, inc = float(scale), scale
+    floor = inc >> FLOOR_BITS
 
-    p = list(p.values())
-    f = list(f.values())
-
-    y.extend(precision*[0])  # dummy zeros to prevent index out of bound errors
-    x = n*[0]                # initialise all zeros
+    y = bitio.reader(y)  # reads past the end give dummy zeros
+    end = y.tell() + y.remaining + precision
+    x = bitio.output(out, n)  # initialise all zeros
 
     # initialise by taking first 'precision' bits from y and converting to a number
-    value = int(''.join(str(a) for a in y[0:precision]), 2)
-    y_position = precision  # position where currently reading y
+    value = y.read(precision)
     lo, hi = 0, one
 
     x_position = 0
+    checkpoint = progress.begin(report, 'Arithmetic decoded', n)
     while 1:
-        if x_position % 100 == 0:
-            so.write('Arithmetic decoded %d%%    \r' % int(math.floor(x_position/n*100)))
-            so.flush()
+        if x_position == checkpoint:
+            checkpoint = report.update(x_position)
 
         lohi_range = hi - lo + 1
-        a = bisect(f, (value-lo)/lohi_range) - 1
-        x[x_position] = alphabet[a]
+        total = freq.total + alphabet*floor
+        a, c = freq.find(((value - lo + 1)*total - 1)//lohi_range, floor)
+        x[x_position] = a
 
-        lo = lo + int(math.ceil(f[a]*lohi_range))
-        hi = lo + int(math.floor(p[a]*lohi_range))
+        hi = lo + lohi_range*(c + freq.counts[a] + floor)//total - 1
+        lo = lo + lohi_range*c//total
 
-        freq[x[x_position]] += 1
-        f, p = cumulative_update(freq)
+        freq.add(a, inc)
         if x_position % N == 0 and x_position != 0:
-            for char in freq:
-                freq[char] = math.ceil(freq[char]*alpha)
-
-        p = list(p.values())
-        f = list(f.values())
-
-        if (lo == hi):
-            raise NameError('Zero interval!')
+            weight /= alpha
+            inc = round(weight)
+        if freq.total >= max_total:
+            weight = _normalise(freq, weight, max_total, scale)
+            inc = round(weight)
+        floor = inc >> FLOOR_BITS
 
         while True:
             if hi < half:
@@ -263,16 +297,16 @@ def decode(y, N=1500, alpha=0.5):
                 break
             lo = 2*lo
             hi = 2*hi + 1
-            value = 2*value + y[y_position]
-            y_position += 1
-            if y_position == len(y):
+            value = 2*value + y.read_bit()
+            if y.tell() == end:
                 break
 
         x_position += 1
-        if x_position == n or y_position == len(y):
+        if x_position == n or y.tell() == end:
             break
 
-    return(x)
+    progress.end(report)
+    return x
 
 
 if __name__ == "__main__":
@@ -280,4 +314,4 @@ if __name__ == "__main__":
     N = 10
     y = encode(data, N=N)
     x = decode(y, N=N)
-    print(''.join(x))
+    print(x.decode())
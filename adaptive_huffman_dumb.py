@@ -1,7 +1,6 @@
-import trees
-import vl_codes
-from sys import stdout as so
-from math import floor
+import heapq
+import progress
+import bitio
 
 """
 This file details the functions needed to apply an adaptive Huffman coding
@@ -10,6 +9,10 @@ Laplacian estimator, and the counts can be decayed by the given input
 parameters. This is considered a 'dumb' algorithm as it is vary slow compared to
 more sophistacted methods such as the FGK or Vitter algorithm.
 
+The tree is kept in a CachedHuffman, which gives exactly the tree
+vl_codes.huffman would build from the counts but only merges again the part
+of it that an update changes the order of, and reuses the codewords otherwise.
+
 O. Jones Dec 2018
 """
 
@@ -30,59 +33,181 @@ def return_extended(xt):
     return [[i, j, k] for i, j, k, l, m in xt]
 
 
-def encode(x, N=10, alpha=0.5):
-    # intialise empty probability of uniform data
-    freq = dict([(chr(a), 1) for a in range(128)])
+class CachedHuffman:
+    """
+    Huffman tree of a dictionary of counts, the same as vl_codes.huffman
+    builds, kept up to date as the counts change.
+
+    Nodes are numbered as in vl_codes.huffman: the symbols in the order of
+    the dictionary, then the internal nodes in the order they were merged.
+    order lists the nodes in the order they were taken from the heap, so the
+    tree is the one vl_codes.huffman builds exactly when the keys (count,
+    node) are increasing along order. After an update only the merges from
+    the first place this fails are redone.
+    """
 
-    # create empty list to add data to
-    y = []
-    codebook = {}
+    def __init__(self, freq):
+        self.symbols = list(freq)
+        self.leaf = dict([(a, k) for k, a in enumerate(self.symbols)])
+        n = len(self.symbols)
+        self.weight = [freq[a] for a in self.symbols] + [0]*(n - 1)
+        self.parent = [-1]*(2*n - 1)
+        self.children = [None]*n + [[-1, -1] for k in range(n - 1)]
+        self.order = list(range(n))  # before any merge only the leaves are made
+        self.position = [-1]*(2*n - 1)
+        self.root = 2*n - 2
+        self.merges = 0
+        self.codebook = {}
+        self.merge(0)
+
+    def merge(self, m):
+        """
+        Redoes the merges of the Huffman algorithm from merge m onwards.
+        """
+        n = len(self.symbols)
+        weight, parent, children, order, position = self.weight, self.parent, self.children, self.order, self.position
+        # heap of (count, node) as it was before merge m, the nodes that had
+        # been made but not yet taken
+        heap = [(weight[k], k) for k in order[2*m:] if k < n + m]
+        heapq.heapify(heap)
+        del order[2*m:]
+        for node in range(n + m, 2*n - 1):
+            p0, n0 = heapq.heappop(heap)
+            p1, n1 = heapq.heappop(heap)
+            weight[node] = p0 + p1
+            children[node] = [n0, n1]
+            parent[n0], parent[n1] = node, node
+            position[n0], position[n1] = len(order), len(order) + 1
+            order += [n0, n1]
+            heapq.heappush(heap, (p0 + p1, node))
+        parent[self.root] = -1
+        self.merges += 1
+        self.codebook.clear()
+
+    def code(self, a):
+        """
+        Returns the codeword of symbol a as an integer and its length, from
+        the codebook if the tree has not changed since it was last found.
+        """
+        c = self.codebook.get(a)
+        if c is None:
+            parent, children = self.parent, self.children
+            code, length = 0, 0
+            node = self.leaf[a]
+            while node != self.root:
+                p = parent[node]
+                code |= (children[p][1] == node) << length
+                length += 1
+                node = p
+            c = self.codebook[a] = (code, length)
+        return c
+
+    def update(self, a, f):
+        """
+        Sets the count of symbol a to f, in O(depth**2) time unless the tree
+        changes.
+        """
+        weight, parent, children, order, position = self.weight, self.parent, self.children, self.order, self.position
+        node = self.leaf[a]
+        weight[node] = f
+        changed = []
+        while node != self.root:
+            changed.append(node)
+            node = parent[node]
+            c0, c1 = children[node]
+            weight[node] = weight[c0] + weight[c1]
+
+        # keys only increased, so order can only fail at a changed node, and
+        # the smallest key after it is that of a changed node or the first
+        # unchanged one
+        first = len(order)
+        for node in changed:
+            j = position[node]
+            k = j + 1
+            while k < len(order) and order[k] in changed:
+                k += 1
+            later = [(weight[c], c) for c in changed if position[c] > j]
+            if k < len(order):
+                later.append((weight[order[k]], order[k]))
+            if later and (weight[node], node) >= min(later):
+                first = min(first, j)
+        if first < len(order):
+            self.merge(first//2)
+
+    def rescale(self, freq):
+        """
+        Sets every count from freq, in O(n) time unless the tree changes.
+        """
+        n = len(self.symbols)
+        weight, children, order = self.weight, self.children, self.order
+        for k, a in enumerate(self.symbols):
+            weight[k] = freq[a]
+        for node in range(n, 2*n - 1):
+            c0, c1 = children[node]
+            weight[node] = weight[c0] + weight[c1]
+
+        # the first node whose key is not below all those after it
+        first = len(order)
+        smallest = None
+        for j in range(len(order) - 1, -1, -1):
+            key = (weight[order[j]], order[j])
+            if smallest is not None and key >= smallest:
+                first = j
+            else:
+                smallest = key
+        if first < len(order):
+            self.merge(first//2)
+
+
+def encode(x, N=10, alpha=0.5, report=None, alphabet=256):
+    # intialise empty probability of uniform data over the byte values
+    freq = dict([(a, 1) for a in range(alphabet)])
+    tree = CachedHuffman(freq)
+    x = bitio.symbols(x)
+
+    # create empty stream to add data to
+    y = bitio.BitWriter()
+    checkpoint = progress.begin(report, 'Dynamic Huffman encoded', len(x))
     for i in range(len(x)):
-        if i % 100 == 0:
-            so.write('Dynamic Huffman encoded %d%%    \r' % int(floor(i/len(x)*100)))
-            so.flush()
-        # create new codebook
-        xt = vl_codes.huffman(freq)
-        codebook = trees.xtree2code(xt)
-        y.extend(codebook[x[i]])
+        if i == checkpoint:
+            checkpoint = report.update(i)
+        # codeword in the tree of the counts so far
+        code, length = tree.code(x[i])
+        y.write(code, length)
         freq[x[i]] += 1
+        tree.update(x[i], freq[x[i]])
 
         # update tree after N iterations
         if i % N == 0 and i != 0:
             freq = dict([(key, size*alpha) for key, size in freq.items()])
+            tree.rescale(freq)
 
+    progress.end(report)
     return y
 
 
-def decode(y, N=10, alpha=0.5):
-    # intialise empty probability of uniform data
-    freq = dict([(chr(a), 1) for a in range(128)])
-
-    # create empty list to add data to
-    x = []
-    xt = vl_codes.huffman(freq)
-
-    root = [k for k in range(len(xt)) if xt[k][0] == -1]
-    root = root[0]
-
-    n = root
-
-    for k in y:
-        if len(xt[n][1]) < k:
-            raise NameError('Symbol exceeds alphabet size in tree node')
-        if xt[n][1][k] == -1:
-            raise NameError('Symbol not assigned in tree node')
-        n = xt[n][1][k]
-        if len(xt[n][1]) == 0:  # it's a leaf!
-            x.append(xt[n][2])
-            n = root
-            freq[x[-1]] += 1
-
-            # create new tree
-            xt = vl_codes.huffman(freq)
-            root = [k for k in range(len(xt)) if xt[k][0] == -1]
-            root = root[0]
-
-            if len(x) % N == 1 and len(x) != 1:
+def decode(y, N=10, alpha=0.5, alphabet=256, out=None):
+    # intialise empty probability of uniform data over the byte values
+    freq = dict([(a, 1) for a in range(alphabet)])
+    tree = CachedHuffman(freq)
+    children, symbols = tree.children, tree.symbols
+    n = len(symbols)
+
+    # create empty buffer, or take the caller's, to add data to
+    x = bitio.output(out)
+    m = 0  # number of symbols decoded
+    node = tree.root
+    for k in bitio.reader(y):
+        node = children[node][k]
+        if node < n:  # it's a leaf!
+            a = symbols[node]
+            bitio.store(x, m, a)
+            m += 1
+            node = tree.root
+            freq[a] += 1
+            tree.update(a, freq[a])
+
+            if m % N == 1 and m != 1:
                 freq = dict([(key, size*alpha) for key, size in freq.items()])
-    return x
+                tree.rescale(freq)
+    return x[:m] if m < len(x) else x
@@ -0,0 +1,273 @@
+import struct
+import ntpath
+import posixpath
+import numpy as np
+import bitio
+import vl_codes
+import container
+
+"""
+This file details the .czar archive: many files compressed together with one
+model, or a few, shared between them rather than one each, which for a lot of
+small and similar files costs less than the models themselves. Blocks are
+framed and coded exactly as in a container (see container.py), and a central
+directory at the end says where every member starts, so members can be listed
+and extracted one at a time without decoding the others. All integers are
+big-endian.
+
+    header     magic b'CZAR', version (1 byte), codec id (1 byte), block size
+               (4 bytes), number of models (4 bytes), number of members
+               (4 bytes), offset of the directory (8 bytes)
+    models     for every model: length (4 bytes), then the model as written
+               by container.encode_model
+    members    for every member: its blocks of block size bytes (the last may
+               be shorter), as in a container
+    directory  for every member: model number (4 bytes), original length
+               (8 bytes), offset of its first block (8 bytes), name length
+               (2 bytes), then the name in UTF-8
+
+Offsets are from the start of the archive. Members are given a model by
+cluster, which groups them by their symbol counts. Member names are relative
+paths without '..', see check_name, so that extracting them cannot write
+outside the directory they are extracted to. The arithmetic codec is not
+offered: its floating point coder cannot decode every block it writes.
+"""
+
+MAGIC = b'CZAR'
+VERSION = 1
+
+_HEADER = struct.Struct('>4sBBIIIQ')
+_LENGTH = struct.Struct('>I')
+_ENTRY = struct.Struct('>IQQH')
+
+
+def check_name(name):
+    """
+    Raises ValueError unless name is a relative path with no '..' component,
+    under either POSIX or Windows rules.
+    """
+    parts = name.replace('\\', '/').split('/')
+    if (not name or posixpath.isabs(name) or ntpath.isabs(name) or ntpath.splitdrive(name)[0]
+            or '..' in parts):
+        raise ValueError('Unsafe member name %r' % name)
+
+
+def cluster(counts, k=1, iterations=20):
+    """
+    Groups members by their symbol counts so that each group can share a
+    model, minimising the total length of their optimal codes under the
+    (Laplace smoothed) distribution of their group. The groups are seeded
+    one at a time with the member worst coded by those so far, then refined
+    as in k-means.
+
+    Parameters:
+    -----------
+    counts: list of dict
+    Byte values and corresponding counts of each member
+    k=1: int
+    Most groups wanted, fewer are returned if some would be empty
+    iterations=20: int
+    Most refinements
+
+    Returns:
+    --------
+    groups: list of int
+    Group of each member, numbered in order of their first member
+    """
+    if k <= 1 or len(counts) <= 1:
+        return [0]*len(counts)
+
+    F = np.zeros((len(counts), 256))
+    for i, c in enumerate(counts):
+        F[i, list(c)] = list(c.values())
+
+    def costs(centres):
+        # bits taken by every member under the distribution of every group
+        return -F @ np.log2((centres + 1)/(centres + 1).sum(axis=1, keepdims=True)).T
+
+    centres = F.sum(axis=0, keepdims=True)
+    groups = np.zeros(len(counts), dtype=int)
+    while len(centres) < k:
+        cost = costs(centres)[np.arange(len(counts)), groups]
+        worst = int(np.argmax(cost))
+        if cost[worst] <= costs(F[worst:worst+1])[worst, 0]:
+            break  # every member is coded as well as it can be
+        centres = np.vstack([centres, F[worst]])
+        groups = np.argmin(costs(centres), axis=1)
+
+    for t in range(iterations):
+        centres = np.array([F[groups == j].sum(axis=0) for j in range(len(centres))])
+        update = np.argmin(costs(centres), axis=1)
+        if np.array_equal(update, groups):
+            break
+        groups = update
+
+    numbers = {}
+    return [numbers.setdefault(int(j), len(numbers)) for j in groups]
+
+
+def write(fout, method, members, clusters=1, block_size=container.BLOCK_SIZE):
+    """
+    Writes an archive of members, coded with at most clusters models.
+
+    Parameters:
+    -----------
+    fout: file
+    File opened for binary writing, seekable
+    method: str
+    Name of the codec, a key of container.CODECS
+    members: list of tuple
+    Name and contents of every member, the contents any bytes-like object
+    clusters=1: int
+    Most models, see cluster
+    block_size: int
+    Number of input bytes per block
+    """
+    if method not in container.CODECS:
+        raise NameError('Compression method %s unknown' % method)
+    if method == 'arithmetic':
+        raise ValueError("The arithmetic codec cannot decode every block it writes, use 'range'")
+    for name, x in members:
+        check_name(name)
+    members = [(name, bitio.symbols(x)) for name, x in members]
+    counts = [vl_codes.count_symbols(x) for name, x in members]
+    groups = cluster(counts, clusters)
+    nmodels = max(groups, default=-1) + 1
+
+    base = fout.tell()
+    fout.write(bytes(_HEADER.size))  # filled in once the directory is written
+    states = []
+    for j in range(nmodels):
+        model = container.encode_model(method, vl_codes.merge_frequencies(
+            [c for c, group in zip(counts, groups) if group == j]))
+        fout.write(_LENGTH.pack(len(model)))
+        fout.write(model)
+        states.append(container.coder(method, container.decode_model(method, model)))
+
+    entries = []
+    for (name, x), group in zip(members, groups):
+        entries.append((name, group, len(x), fout.tell() - base))
+        for k in range(0, len(x), block_size):
+            block = x[k:k+block_size]
+            container.write_block(fout, container.encode_block(method, states[group], block), block)
+
+    directory = fout.tell() - base
+    for name, group, n, offset in entries:
+        name = name.encode('utf-8')
+        fout.write(_ENTRY.pack(group, n, offset, len(name)))
+        fout.write(name)
+
+    end = fout.tell()
+    fout.seek(base)
+    fout.write(_HEADER.pack(MAGIC, VERSION, container.CODECS[method], block_size, nmodels, len(entries),
+                            directory))
+    fout.seek(end)
+
+
+def read_directory(fin):
+    """
+    Reads the header, models and directory of an archive, and nothing of its
+    members.
+
+    Returns:
+    --------
+    method: str
+    Name of the codec
+    models: list of bytes
+    Serialised models, for container.decode_model
+    entries: list of tuple
+    Name, model number, original length and offset of every member, in the
+    order they were written
+    """
+    base = fin.tell()
+    header = fin.read(_HEADER.size)
+    if len(header) < _HEADER.size or header[:4] != MAGIC:
+        raise ValueError('Not a camzip archive')
+    magic, version, codec, block_size, nmodels, nentries, directory = _HEADER.unpack(header)
+    if version != VERSION:
+        raise ValueError('Unsupported camzip archive version %d' % version)
+    if codec not in container.METHODS:
+        raise ValueError('Unknown codec id %d' % codec)
+
+    models = []
+    for j in range(nmodels):
+        length = fin.read(_LENGTH.size)
+        if len(length) < _LENGTH.size:
+            raise ValueError('Truncated camzip archive')
+        length, = _LENGTH.unpack(length)
+        models.append(fin.read(length))
+        if len(models[-1]) < length:
+            raise ValueError('Truncated camzip archive')
+
+    fin.seek(base + directory)
+    entries = []
+    for i in range(nentries):
+        entry = fin.read(_ENTRY.size)
+        if len(entry) < _ENTRY.size:
+            raise ValueError('Truncated camzip archive')
+        group, n, offset, length = _ENTRY.unpack(entry)
+        if group >= nmodels:
+            raise ValueError('Member model %d out of range' % group)
+        name = fin.read(length)
+        if len(name) < length:
+            raise ValueError('Truncated camzip archive')
+        name = name.decode('utf-8')
+        check_name(name)
+        entries.append((name, group, n, offset))
+    fin.seek(base)
+    return container.METHODS[codec], models, entries
+
+
+def _decode_member(fin, base, method, state, n, offset, out=None):
+    # decodes the blocks of a member, checking each against its checksum
+    fin.seek(base + offset)
+    x = bitio.output(out, n)
+    view = memoryview(x)  # slices of a bytearray would be copies
+    k, start = 0, 0
+    while start < n:
+        y, m, crc = container.read_block(fin)
+        container.check_block(container.decode_block(method, state, y, m, view[start:]), crc, k)
+        start += m
+        k += 1
+    return x
+
+
+def extract(fin, name, out=None):
+    """
+    Decodes the member called name, reading only the header, the models,
+    the directory and its own blocks.
+
+    Parameters:
+    -----------
+    fin: file
+    Seekable file opened for binary reading, at the start of an archive
+    name: str
+    Name of the member
+    out=None: writable bytes-like
+    Buffer to decode into, see bitio.output
+
+    Returns:
+    --------
+    x: bytearray or memoryview
+    """
+    base = fin.tell()
+    method, models, entries = read_directory(fin)
+    for member, group, n, offset in entries:
+        if member == name:
+            state = container.coder(method, container.decode_model(method, models[group]))
+            return _decode_member(fin, base, method, state, n, offset, out)
+    raise KeyError(name)
+
+
+def read(fin):
+    """
+    Reads a whole archive, yielding the name and contents of every member in
+    order, building each model once.
+    """
+    base = fin.tell()
+    method, models, entries = read_directory(fin)
+    states = [None]*len(models)
+    for name, group, n, offset in entries:
+        if states[group] is None:
+            states[group] = container.coder(method, container.decode_model(method, models[group]))
+        yield name, _decode_member(fin, base, method, states[group], n, offset)
@@ -1,9 +1,10 @@
 from math import floor, ceil
-from sys import stdout as so
+import progress
 from bisect import bisect
+import bitio
 
 
-def encode(x, p):
+def encode(x, p, report=None):
     """
     Encodes data using the Arithmetic coding algorithm
 
@@ -13,10 +14,12 @@ def encode(x, p):
     Data string to be compressed
     p: dict
     Alphabet and corresponding probability
+    report=None: progress.Progress
+    Reports progress if given
 
     Returns:
     --------
-    y: binary list
+    y: bitio.BitWriter
     x data encoded with the p probability
     """
     # error check p
@@ -42,16 +45,16 @@ def encode(x, p):
 
     f = dict([(a, mf) for a, mf in zip(p, f)])
 
-    y = []           # initialise output list
+    y = bitio.BitWriter()  # initialise output stream
     lo, hi = 0, one  # initialise lo and hi to be [0,1.0)
     straddle = 0     # initialise the straddle counter to 0
 
+    checkpoint = progress.begin(report, 'Arithmetic encoded', len(x))
     for k in range(len(x)):  # for every symbol
 
         # display progress bar
-        if k % 100 == 0:
-            so.write('Arithmetic encoded %d%%    \r' % int(floor(k/len(x)*100)))
-            so.flush()
+        if k == checkpoint:
+            checkpoint = report.update(k)
 
         lohi_range = hi - lo + 1
         # narrow the interval end-points [lo,hi) to the new range [f,f+p]
@@ -64,14 +67,12 @@ def encode(x, p):
         while True:
             if hi < half:  # if lo < hi < 1/2
                 # append 0 and appropriate number of straddle 1s, stretch dealt with after
-                y.append(0)
-                y += [1]*straddle
+                y.write((1 << straddle) - 1, straddle + 1)
                 straddle = 0
 
             elif lo >= half:  # if hi > lo >= 1/2
                 # append 1 and appropriate number of straddle 0s, stretch dealt with after
-                y.append(1)
-                y += [0]*straddle
+                y.write(1 << straddle, straddle + 1)
                 straddle = 0
                 lo -= half
                 hi -= half
@@ -94,31 +95,35 @@ def encode(x, p):
     # after processing all input symbols, flush any bits still in the 'straddle' pipeline
     straddle += 1     # adding 1 to straddle for "good measure" (ensures prefix-freeness)
     if lo < quarter:  # the position of lo determines the dyadic interval that fits
-        y.append(0)
-        y += [1]*straddle
+        y.write((1 << straddle) - 1, straddle + 1)
     else:
-        y.append(1)
-        y += [0]*straddle
+        y.write(1 << straddle, straddle + 1)
+    progress.end(report)
     return(y)
 
 
-def decode(y, p, n):
+def decode(y, p, n, report=None, out=None):
     """
     Decodes data using the Arithmetic coding algorithm
 
     Parameters:
     -----------
-    y: list
+    y: list, bitio.BitWriter or bytes
     list of bits encoded with p
     p: dict
     Alphabet and corresponding probability
     n: int
     Decoded file length in bytes
+    report=None: progress.Progress
+    Reports progress if given
+    out=None: writable bytes-like
+    Buffer to decode byte values into, see bitio.output
 
     Returns:
     --------
-    y: binary list
-    x data encoded with the p probability
+    x: bytearray, memoryview if out is given, or list if p has symbols other
+    than byte values
+    Symbols of y decoded with the p probability
     """
     # error check p
     if not all((a >= 0 for a in p.values())):
@@ -143,19 +148,22 @@ def decode(y, p, n):
 
     p = list(p.values())
 
-    y.extend(precision*[0])  # dummy zeros to prevent index out of bound errors
-    x = n*[0]                # initialise all zeros
+    y = bitio.reader(y)  # reads past the end give dummy zeros
+    end = y.tell() + y.remaining + precision
+    if out is None and not bitio.is_bytes(alphabet):
+        x = n*[0]
+    else:
+        x = bitio.output(out, n)  # initialise all zeros
 
     # initialise by taking first 'precision' bits from y and converting to a number
-    value = int(''.join(str(a) for a in y[0:precision]), 2)
-    y_position = precision  # position where currently reading y
+    value = y.read(precision)
     lo, hi = 0, one
 
     x_position = 0
+    checkpoint = progress.begin(report, 'Arithmetic decoded', n)
     while 1:
-        if x_position % 100 == 0:
-            so.write('Arithmetic decoded %d%%    \r' % int(floor(x_position/n*100)))
-            so.flush()
+        if x_position == checkpoint:
+            checkpoint = report.update(x_position)
 
         lohi_range = hi - lo + 1
         a = bisect(f, (value-lo)/lohi_range) - 1
@@ -182,13 +190,13 @@ def decode(y, p, n):
                 break
             lo = 2*lo
             hi = 2*hi + 1
-            value = 2*value + y[y_position]
-            y_position += 1
-            if y_position == len(y):
+            value = 2*value + y.read_bit()
+            if y.tell() == end:
                 break
 
         x_position += 1
-        if x_position == n or y_position == len(y):
+        if x_position == n or y.tell() == end:
             break
 
+    progress.end(report)
     return(x)
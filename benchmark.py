@@ -0,0 +1,496 @@
+import io
+import os
+import bz2
+import json
+import lzma
+import math
+import time
+import zlib
+import random
+import platform
+import tracemalloc
+from sys import argv, exit
+import trees
+import vl_codes
+import arithmetic
+import range_coder
+import container
+import adaptive_arithmetic
+import context_arithmetic
+import ppm
+import adaptive_huffman_dumb
+import fgk
+import vitter
+
+"""
+This file contains benchmarks comparing the speed of the coding algorithms on
+hamlet.txt and larger generated corpora. Run it directly to print tables of
+results, or as
+
+    python benchmark.py --suite [results.json]
+
+to run every codec, and zlib, bz2 and lzma as baselines, on the inputs of
+suite_corpora and save speed, rate and peak memory of each run as JSON.
+"""
+
+
+def zipf_corpus(n, alphabet=256, s=1.1, seed=0):
+    """
+    Generates n bytes drawn independently from a Zipf distribution
+
+    Parameters:
+    -----------
+    n: int
+    Number of bytes
+    alphabet=256: int
+    Number of distinct byte values
+    s=1.1: float
+    Zipf exponent, larger is more skewed
+    seed=0: int
+    Random seed so that runs are reproducible
+
+    Returns:
+    --------
+    x: bytes
+    """
+    rng = random.Random(seed)
+    weights = [1/(k+1)**s for k in range(alphabet)]
+    return bytes(rng.choices(range(alphabet), weights=weights, k=n))
+
+
+def corpora(filename='hamlet.txt'):
+    """
+    Returns a dictionary of named benchmark inputs: the file, the file
+    repeated ten times and a 2MB Zipf source.
+    """
+    with open(filename, 'rb') as fin:
+        x = fin.read()
+    return {filename: x,
+            filename + ' x10': x*10,
+            'zipf 2MB': zipf_corpus(2*2**20)}
+
+
+def timed(func, *args):
+    """
+    Returns the result of func(*args) and the time it took in seconds
+    """
+    start = time.perf_counter()
+    out = func(*args)
+    return out, time.perf_counter() - start
+
+
+def bench_vl_decode(x, method='huffman', k=9):
+    """
+    Compares tree walk decoding with table-driven decoding of x
+
+    Returns:
+    --------
+    rates: dict
+    Decoding speed in MB/s of vl_decode and vl_decode_table
+    """
+    p, frequencies = vl_codes.probability_dict(x)
+    if method == 'huffman':
+        xt = vl_codes.huffman(p)
+        c = trees.xtree2code(xt)
+    else:
+        c = vl_codes.shannon_fano(p)
+        xt = trees.code2xtree(c)
+    y = vl_codes.vl_encode(x, c).getvalue()
+
+    tree_x, tree_time = timed(vl_codes.vl_decode, y, xt)
+    table_x, table_time = timed(lambda: vl_codes.vl_decode_table(y, vl_codes.decode_table(c, k)))
+    if tree_x != table_x or bytes(table_x) != x:
+        raise RuntimeError('Decoders disagree for %s' % method)
+
+    mb = len(x)/2**20
+    return {'vl_decode': mb/tree_time, 'vl_decode_table': mb/table_time}
+
+
+def bench_vl_encode(x, method='huffman'):
+    """
+    Compares encoding x symbol by symbol with the numpy encoder
+
+    Returns:
+    --------
+    rates: dict
+    Encoding speed in MB/s of the two encoders
+    """
+    p, frequencies = vl_codes.probability_dict(x)
+    if method == 'huffman':
+        c = trees.xtree2code(vl_codes.huffman(p))
+    else:
+        c = vl_codes.shannon_fano(p)
+
+    loop_y, loop_time = timed(vl_codes.vl_encode, list(x), c)
+    array_y, array_time = timed(vl_codes.vl_encode_array, x, c)
+    if loop_y.getvalue() != array_y.getvalue():
+        raise RuntimeError('Encoders disagree for %s' % method)
+
+    mb = len(x)/2**20
+    return {'vl_encode': mb/loop_time, 'vl_encode_array': mb/array_time}
+
+
+def bench_range_coder(x):
+    """
+    Compares the integer range coder with the floating point arithmetic coder
+
+    Returns:
+    --------
+    results: dict
+    For each coder, encoding and decoding speed in MB/s and bits/symbol
+    """
+    p, frequencies = vl_codes.probability_dict(x)
+    mb = len(x)/2**20
+    results = {}
+
+    y, encode_time = timed(arithmetic.encode, x, p)
+    decoded, decode_time = timed(arithmetic.decode, y, p, len(x))
+    if bytes(decoded) != bytes(x):
+        raise RuntimeError('Arithmetic coder failed to round trip')
+    results['arithmetic'] = (mb/encode_time, mb/decode_time, len(y)/len(x))
+
+    y, encode_time = timed(range_coder.encode, x, frequencies)
+    decoded, decode_time = timed(range_coder.decode, y, frequencies, len(x))
+    if bytes(decoded) != bytes(x):
+        raise RuntimeError('Range coder failed to round trip')
+    results['range'] = (mb/encode_time, mb/decode_time, len(y)/len(x))
+    return results
+
+
+def bench_parallel(x, method='huffman', workers=(1, 2, 4), block_size=1 << 20):
+    """
+    Times block mode compression and decompression of x for each number of
+    worker processes, checking that the output does not depend on it.
+
+    Returns:
+    --------
+    rates: dict
+    For each number of workers, encoding and decoding speed in MB/s
+    """
+    blocks = [x[k:k+block_size] for k in range(0, len(x), block_size)]
+    mb = len(x)/2**20
+    rates = {}
+    y = None
+    for n in workers:
+        f = io.BytesIO()
+        out, encode_time = timed(container.write_independent, f, method, blocks, len(x), block_size, n)
+        if y is not None and f.getvalue() != y:
+            raise RuntimeError('Block mode output depends on the number of workers')
+        y = f.getvalue()
+        f.seek(0)
+        decoded, decode_time = timed(lambda: b''.join(container.read(f, n)))
+        if decoded != x:
+            raise RuntimeError('Block mode failed to round trip')
+        rates[n] = (mb/encode_time, mb/decode_time)
+    return rates
+
+
+def markov_corpus(n, alphabet=128, successors=4, seed=0):
+    """
+    Generates n bytes from a first order Markov chain in which each symbol is
+    followed by one of a few successors chosen at random
+
+    Parameters:
+    -----------
+    n: int
+    Number of bytes
+    alphabet=128: int
+    Number of distinct byte values
+    successors=4: int
+    Number of symbols that can follow each symbol
+    seed=0: int
+    Random seed so that runs are reproducible
+
+    Returns:
+    --------
+    x: bytes
+    """
+    rng = random.Random(seed)
+    table = [rng.sample(range(alphabet), successors) for a in range(alphabet)]
+    weights = [2**-k for k in range(successors)]
+    x = bytearray(n)
+    a = 0
+    for k in range(n):
+        a = rng.choices(table[a], weights=weights)[0]
+        x[k] = a
+    return bytes(x)
+
+
+def binary_corpus(n, seed=0):
+    """
+    Generates n bytes of binary data: a random walk stored as little-endian
+    32-bit integers, so that high bytes are mostly constant and low bytes
+    vary.
+    """
+    rng = random.Random(seed)
+    out = bytearray()
+    value = 1 << 20
+    while len(out) < n:
+        value = (value + rng.randint(-300, 300)) & 0xFFFFFFFF
+        out += value.to_bytes(4, 'little')
+    return bytes(out[:n])
+
+
+def skewed_corpus(n, p=0.99, alphabet=128, seed=0):
+    """
+    Generates n bytes in which b'a' has probability p and the rest of the
+    alphabet shares the remainder uniformly.
+    """
+    rng = random.Random(seed)
+    others = [a for a in range(alphabet) if a != ord('a')]
+    return bytes([ord('a') if rng.random() < p else rng.choice(others) for k in range(n)])
+
+
+def suite_corpora(sizes=(1 << 12, 1 << 15, 1 << 18), filename='hamlet.txt'):
+    """
+    Returns the inputs of the benchmark suite as a list of (name, size, x):
+    the start of the file, repeated if needed, and Zipf, Markov, uniformly
+    random, binary and highly skewed data at each size.
+    """
+    with open(filename, 'rb') as fin:
+        text = fin.read()
+    out = []
+    for n in sizes:
+        out += [(filename, n, (text*(n//len(text) + 1))[:n]),
+                ('zipf', n, zipf_corpus(n, alphabet=128)),
+                ('markov', n, markov_corpus(n)),
+                ('random', n, random.Random(0).randbytes(n)),
+                ('binary', n, binary_corpus(n)),
+                ('skewed', n, skewed_corpus(n))]
+    return out
+
+
+def entropy(x):
+    """
+    Returns the empirical order 0 entropy of x in bits per symbol
+    """
+    n = len(x)
+    return -sum([f/n*math.log2(f/n) for f in vl_codes.count_symbols(x).values()])
+
+
+def _container_codec(method):
+    def encode(x):
+        f = io.BytesIO()
+        blocks = [x[k:k+container.BLOCK_SIZE] for k in range(0, len(x), container.BLOCK_SIZE)]
+        container.write(f, method, blocks, vl_codes.count_symbols(x))
+        return f.getvalue(), None
+
+    def decode(y, state, n):
+        return b''.join(container.read(io.BytesIO(y)))
+    return encode, decode
+
+
+def _adaptive_codec(encoder, decoder):
+    # the adaptive codecs take and return bytes, with any side information
+    # after the bit stream
+    def encode(x):
+        y = encoder(x)
+        if isinstance(y, tuple):
+            return y[0].getvalue(), y[1:]
+        return y.getvalue(), ()
+
+    def decode(y, state, n):
+        return decoder(y, *state)
+    return encode, decode
+
+
+def _stdlib_codec(module):
+    return (lambda x: (module.compress(x), None)), (lambda y, state, n: module.decompress(y))
+
+
+# Codecs of the suite: name -> (encode, decode, limit). encode(x) returns the
+# compressed bytes and any side information decode(y, state, n) needs. No
+# codec is run on inputs longer than its limit, if given, to keep the slowest
+# ones tractable. The transition matrix context_arithmetic needs to decode is
+# not counted in its rate.
+SUITE = {'huffman': _container_codec('huffman') + (None,),
+         'shannon_fano': _container_codec('shannon_fano') + (None,),
+         'canonical': _container_codec('canonical') + (None,),
+         'range': _container_codec('range') + (None,),
+         'adaptive_arithmetic': _adaptive_codec(adaptive_arithmetic.encode, adaptive_arithmetic.decode)
+         + (1 << 18,),
+         'context_arithmetic': _adaptive_codec(context_arithmetic.encode, context_arithmetic.decode)
+         + (1 << 18,),
+         'ppm': _adaptive_codec(ppm.encode, ppm.decode) + (1 << 18,),
+         'fgk': _adaptive_codec(fgk.encode, fgk.decode) + (1 << 15,),
+         'vitter': _adaptive_codec(vitter.vitter_encode, vitter.vitter_decode) + (1 << 15,),
+         'adaptive_huffman_dumb': _adaptive_codec(adaptive_huffman_dumb.encode, adaptive_huffman_dumb.decode)
+         + (1 << 15,),
+         'zlib': _stdlib_codec(zlib) + (None,),
+         'bz2': _stdlib_codec(bz2) + (None,),
+         'lzma': _stdlib_codec(lzma) + (None,)}
+
+
+# Adaptive Huffman codecs timed by bench_alphabet: name -> (encode, decode),
+# with Vitter also run without decay so that tree updates are timed alone
+ALPHABET_CODECS = {'adaptive_huffman_dumb': SUITE['adaptive_huffman_dumb'][:2],
+                   'fgk': SUITE['fgk'][:2],
+                   'vitter': SUITE['vitter'][:2],
+                   'vitter alpha=1': _adaptive_codec(lambda x: vitter.vitter_encode(x, alpha=1),
+                                                     lambda y: vitter.vitter_decode(y, alpha=1))}
+
+
+def bench_alphabet(codecs=ALPHABET_CODECS, sizes=(2, 8, 32, 128), n=1 << 14, seed=0):
+    """
+    Times codecs on uniform random symbols from alphabets of increasing size,
+    to show how the cost per symbol grows with the alphabet
+
+    Parameters:
+    -----------
+    codecs: dict
+    Codecs by name, as pairs of the encode and decode functions of SUITE
+    sizes: tuple
+    Alphabet sizes, the first of the 7-bit characters
+    n=1 << 14: int
+    Number of symbols
+
+    Returns:
+    --------
+    costs: dict
+    For each codec and alphabet size, encoding and decoding time per symbol
+    in microseconds
+    """
+    rng = random.Random(seed)
+    costs = {}
+    for codec, (encode, decode) in codecs.items():
+        costs[codec] = {}
+        for k in sizes:
+            x = bytes(rng.choices(range(k), k=n))
+            (y, state), encode_time = timed(encode, x)
+            decoded, decode_time = timed(decode, y, state, n)
+            if decoded != x:
+                raise RuntimeError('%s failed to round trip' % codec)
+            costs[codec][k] = (1e6*encode_time/n, 1e6*decode_time/n)
+    return costs
+
+
+def bench_codec(codec, x, memory=True):
+    """
+    Runs one codec of the suite on x, checking that it round trips
+
+    Parameters:
+    -----------
+    codec: str
+    Key of SUITE
+    x: bytes
+    memory=True: bool
+    Whether to measure the peak memory, with tracemalloc on a second run so
+    that the timings are not slowed down by it
+
+    Returns:
+    --------
+    result: dict
+    Encoding and decoding speed in MB/s, compressed size, bits/symbol and the
+    peak memory allocated while encoding and decoding in bytes, None if not
+    measured
+    """
+    encode, decode, limit = SUITE[codec]
+    (y, state), encode_time = timed(encode, x)
+    decoded, decode_time = timed(decode, y, state, len(x))
+    if decoded != x:
+        raise RuntimeError('%s failed to round trip' % codec)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        decode(*encode(x), len(x))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    mb = len(x)/2**20
+    return {'encode_mbps': mb/encode_time, 'decode_mbps': mb/decode_time, 'compressed_bytes': len(y),
+            'bits_per_symbol': 8*len(y)/len(x), 'peak_memory_bytes': peak}
+
+
+def run_suite(codecs=None, sizes=(1 << 12, 1 << 15, 1 << 18), memory=True, log=None):
+    """
+    Runs every codec on every input of suite_corpora that it supports
+
+    Parameters:
+    -----------
+    codecs=None: list
+    Keys of SUITE to run, all of them if None
+    sizes: tuple
+    Input sizes in bytes
+    memory=True: bool
+    Whether to measure peak memory
+    log=None: function
+    Called with each result as it is produced
+
+    Returns:
+    --------
+    results: list of dict
+    One record per codec and input, with the corpus name, size and empirical
+    entropy alongside the results of bench_codec
+    """
+    results = []
+    for name, n, x in suite_corpora(sizes):
+        h = entropy(x)
+        for codec in codecs or SUITE:
+            encode, decode, limit = SUITE[codec]
+            if limit is not None and n > limit:
+                continue
+            result = {'corpus': name, 'size': n, 'codec': codec, 'entropy': h}
+            result.update(bench_codec(codec, x, memory))
+            results.append(result)
+            if log is not None:
+                log(result)
+    return results
+
+
+def write_json(results, filename):
+    """
+    Writes suite results to a JSON file along with details of the machine, so
+    that runs can be compared.
+    """
+    with open(filename, 'w') as fout:
+        json.dump({'python': platform.python_version(), 'platform': platform.platform(),
+                   'cpus': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'results': results}, fout, indent=1)
+
+
+def print_result(result):
+    peak = result['peak_memory_bytes']
+    print('%-12s %8d %-22s %10.3f %10.3f %8.4f %8.4f %10s' % (
+        result['corpus'], result['size'], result['codec'], result['encode_mbps'], result['decode_mbps'],
+        result['bits_per_symbol'], result['entropy'], '-' if peak is None else '%.1f' % (peak/2**20)))
+
+
+if __name__ == "__main__":
+    if len(argv) > 1 and argv[1] == '--suite':
+        print('%-12s %8s %-22s %10s %10s %8s %8s %10s' % ('corpus', 'size', 'codec', 'enc MB/s', 'dec MB/s',
+                                                       'bits', 'entropy', 'peak MB'))
+        write_json(run_suite(log=print_result), argv[2] if len(argv) > 2 else 'benchmark.json')
+        exit()
+
+    print('%-18s %-13s %12s %16s %8s' % ('corpus', 'method', 'tree MB/s', 'table MB/s', 'speedup'))
+    for name, x in corpora().items():
+        for method in ['huffman', 'shannon_fano']:
+            rates = bench_vl_decode(x, method)
+            print('%-18s %-13s %12.3f %16.3f %8.2f' % (name, method, rates['vl_decode'], rates['vl_decode_table'],
+                                                      rates['vl_decode_table']/rates['vl_decode']))
+
+    print('\n%-18s %-13s %12s %16s %8s' % ('corpus', 'method', 'loop MB/s', 'numpy MB/s', 'speedup'))
+    for name, x in corpora().items():
+        for method in ['huffman', 'shannon_fano']:
+            rates = bench_vl_encode(x, method)
+            print('%-18s %-13s %12.3f %16.3f %8.2f' % (name, method, rates['vl_encode'], rates['vl_encode_array'],
+                                                      rates['vl_encode_array']/rates['vl_encode']))
+
+    with open('hamlet.txt', 'rb') as fin:
+        x = fin.read()
+    results = bench_range_coder(x)
+    print('\n%-18s %-13s %12s %16s %8s' % ('corpus', 'method', 'enc MB/s', 'dec MB/s', 'bits'))
+    for method, (encode_rate, decode_rate, rate) in results.items():
+        print('%-18s %-13s %12.3f %16.3f %8.4f' % ('hamlet.txt', method, encode_rate, decode_rate, rate))
+
+    print('\n%-18s %-13s %12s %16s' % ('codec', 'alphabet', 'enc us/sym', 'dec us/sym'))
+    for codec, costs in bench_alphabet().items():
+        for k, (encode_cost, decode_cost) in costs.items():
+            print('%-18s %-13d %12.3f %16.3f' % (codec, k, encode_cost, decode_cost))
+
+    x = zipf_corpus(16*2**20)
+    cpus = os.cpu_count() or 1
+    print('\n%-18s %-13s %12s %16s' % ('corpus', 'workers', 'enc MB/s', 'dec MB/s'))
+    for n, (encode_rate, decode_rate) in bench_parallel(x, workers=range(1, max(cpus, 4) + 1)).items():
+        print('%-18s %-13d %12.3f %16.3f' % ('zipf 16MB', n, encode_rate, decode_rate))
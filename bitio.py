@@ -0,0 +1,385 @@
+"""
+This file contains the packed bit stream used by every encoder and decoder in
+the package. Bits are written most significant first into a bytearray through
+an integer accumulator, and read back from any bytes-like object, so a stream
+costs one bit of memory per bit rather than one Python int.
+
+The serialised form is the one produced by vl_codes.bits2bytes: the first 3
+bits give the number of zero bits padding the stream out to a whole byte.
+
+The data on the other side of the codecs is bytes: encoders take any object
+supporting the buffer protocol through symbols, and decoders write into a
+bytearray, or a buffer of the caller's, made ready by output.
+"""
+
+HEADER_BITS = 3
+
+# bits of every byte value, most significant first, for fast iteration
+_BYTE_BITS = [tuple((b >> (7 - i)) & 1 for i in range(8)) for b in range(256)]
+
+
+class BitWriter:
+    """
+    Growable, packed sequence of bits. Behaves like the list of bits returned
+    by the encoders before it (len, indexing, iteration and copy) so existing
+    callers keep working, while getvalue() gives the padded byte stream.
+    """
+
+    def __init__(self, bits=()):
+        self._buf = bytearray()
+        self._acc = 0                # pending bits not yet forming a byte
+        self._nacc = HEADER_BITS     # room for the padding header
+        self._nbits = 0
+        self.write_bits(bits)
+
+    def write(self, value, nbits):
+        """
+        Appends the nbits least significant bits of value, most significant
+        first.
+        """
+        if nbits <= 0:
+            return
+        acc = (self._acc << nbits) | (value & ((1 << nbits) - 1))
+        nacc = self._nacc + nbits
+        self._nbits += nbits
+        if nacc >= 8:
+            rem = nacc & 7
+            self._buf += (acc >> rem).to_bytes(nacc >> 3, 'big')
+            acc &= (1 << rem) - 1
+            nacc = rem
+        self._acc = acc
+        self._nacc = nacc
+
+    def write_bit(self, bit):
+        self.write(bit, 1)
+
+    def write_run(self, bit, count):
+        """
+        Appends count copies of bit.
+        """
+        if count > 0:
+            self.write((1 << count) - 1 if bit else 0, count)
+
+    def write_bits(self, bits):
+        """
+        Appends an iterable of bits, e.g. a codeword list.
+        """
+        value = 0
+        n = 0
+        for b in bits:
+            value = (value << 1) | b
+            n += 1
+        self.write(value, n)
+
+    extend = write_bits
+    append = write_bit
+
+    @property
+    def alignment(self):
+        """
+        Number of bits already used in the byte currently being written.
+        """
+        return self._nacc
+
+    def write_packed(self, data, nbits):
+        """
+        Appends nbits bits packed most significant first in data. The bits
+        must start at bit alignment of the first byte of data, with the bits
+        before them zero, so whole bytes can be copied across unshifted.
+
+        Parameters:
+        -----------
+        data: bytes-like
+        At least (alignment + nbits + 7)//8 bytes
+        nbits: int
+        Number of bits to append
+        """
+        if nbits <= 0:
+            return
+        data = memoryview(data).cast('B')
+        nacc = self._nacc
+        total = nacc + nbits
+        first = data[0] | ((self._acc << (8 - nacc)) & 0xFF)
+        nfull = total >> 3
+        rem = total & 7
+        if nfull:
+            self._buf.append(first)
+            self._buf += data[1:nfull]
+            last = data[nfull] if rem else 0
+        else:
+            last = first
+        self._acc = last >> (8 - rem) if rem else 0
+        self._nacc = rem
+        self._nbits += nbits
+
+    @property
+    def padding(self):
+        """
+        Number of zero bits that will pad out the last byte, the value of the
+        3 bit header.
+        """
+        return (8 - self._nacc) % 8
+
+    def getvalue(self):
+        """
+        Returns the stream as bytes, framed with the 3 bit padding header.
+        """
+        pad = self.padding
+        out = bytearray(self._buf)
+        if self._nacc:
+            out.append((self._acc << pad) & 0xFF)
+        out[0] |= pad << 5
+        return bytes(out)
+
+    def copy(self):
+        new = BitWriter()
+        new._buf = bytearray(self._buf)
+        new._acc, new._nacc, new._nbits = self._acc, self._nacc, self._nbits
+        return new
+
+    def _locate(self, i):
+        if i < 0:
+            i += self._nbits
+        if not 0 <= i < self._nbits:
+            raise IndexError('bit index out of range')
+        pos = i + HEADER_BITS
+        nbuf = len(self._buf) << 3
+        return pos, nbuf
+
+    def __len__(self):
+        return self._nbits
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(self._nbits))]
+        pos, nbuf = self._locate(i)
+        if pos < nbuf:
+            return (self._buf[pos >> 3] >> (7 - (pos & 7))) & 1
+        return (self._acc >> (self._nacc - 1 - (pos - nbuf))) & 1
+
+    def __setitem__(self, i, bit):
+        pos, nbuf = self._locate(i)
+        if pos < nbuf:
+            mask = 1 << (7 - (pos & 7))
+            if bit:
+                self._buf[pos >> 3] |= mask
+            else:
+                self._buf[pos >> 3] &= ~mask
+        else:
+            mask = 1 << (self._nacc - 1 - (pos - nbuf))
+            self._acc = self._acc | mask if bit else self._acc & ~mask
+
+    def __iter__(self):
+        return iter(BitReader(self.getvalue()))
+
+    def __eq__(self, other):
+        if isinstance(other, BitWriter):
+            return len(self) == len(other) and self.getvalue() == other.getvalue()
+        try:
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return 'BitWriter(%d bits)' % self._nbits
+
+
+class BitReader:
+    """
+    Sequential reader over a packed bit stream. Reads past the end of the
+    stream return zeros, which is what the arithmetic decoders expect.
+
+    Parameters:
+    -----------
+    data: bytes-like
+    Packed stream, read without copying through a memoryview
+    header=True: bool
+    Whether data starts with the 3 bit padding header of bits2bytes
+    nbits=None: int
+    Number of valid bits when there is no header (defaults to all of data)
+    """
+
+    def __init__(self, data, header=True, nbits=None):
+        self._data = memoryview(data).cast('B')
+        total = len(self._data) << 3
+        if header:
+            if total == 0:
+                raise ValueError('Empty bit stream has no header')
+            pad = self._data[0] >> 5
+            self.start = HEADER_BITS
+            self.end = total - pad
+        else:
+            self.start = 0
+            self.end = total if nbits is None else nbits
+        self.pos = self.start
+
+    def __len__(self):
+        return self.end - self.start
+
+    @property
+    def remaining(self):
+        return max(self.end - self.pos, 0)
+
+    def tell(self):
+        """
+        Returns the number of bits consumed so far.
+        """
+        return self.pos - self.start
+
+    def read_bit(self):
+        pos = self.pos
+        self.pos = pos + 1
+        if pos >= self.end:
+            return 0
+        return (self._data[pos >> 3] >> (7 - (pos & 7))) & 1
+
+    def peek(self, nbits):
+        """
+        Returns the next nbits as an integer without consuming them, padding
+        with zeros past the end of the stream.
+        """
+        pos = self.pos
+        if nbits <= 0:
+            return 0
+        avail = self.end - pos
+        if avail <= 0:
+            return 0
+        take = min(nbits, avail)
+        first = pos >> 3
+        last = (pos + take - 1) >> 3
+        chunk = int.from_bytes(self._data[first:last+1], 'big')
+        chunk >>= ((last + 1) << 3) - pos - take
+        return (chunk & ((1 << take) - 1)) << (nbits - take)
+
+    def read(self, nbits):
+        """
+        Returns the next nbits as an integer, most significant first.
+        """
+        value = self.peek(nbits)
+        self.pos += nbits
+        return value
+
+    def skip(self, nbits):
+        self.pos += nbits
+
+    def __iter__(self):
+        """
+        Yields the remaining bits, consuming them.
+        """
+        pos, end = self.pos, self.end
+        self.pos = max(pos, end)
+        if pos >= end:
+            return
+        data = self._data
+        first, last = pos >> 3, (end - 1) >> 3
+        if first == last:
+            yield from _BYTE_BITS[data[first]][pos & 7:((end - 1) & 7) + 1]
+            return
+        yield from _BYTE_BITS[data[first]][pos & 7:]
+        for byte in data[first+1:last]:
+            yield from _BYTE_BITS[byte]
+        yield from _BYTE_BITS[data[last]][:((end - 1) & 7) + 1]
+
+
+def reader(y):
+    """
+    Wraps the input of a decoder in a BitReader. Bytes-like input is taken to
+    be a framed stream (as written to a file), while a BitWriter or a list of
+    bits is the raw output of an encoder.
+
+    Parameters:
+    -----------
+    y: BitReader, BitWriter, bytes-like or list of bits
+    Encoded data
+
+    Returns:
+    --------
+    r: BitReader
+    """
+    if isinstance(y, BitReader):
+        return y
+    if isinstance(y, BitWriter):
+        return BitReader(y.getvalue())
+    if isinstance(y, (bytes, bytearray, memoryview)):
+        return BitReader(y)
+    return BitReader(BitWriter(y).getvalue())
+
+
+def symbols(x):
+    """
+    Views the input of an encoder as its byte values without copying it.
+    Anything supporting the buffer protocol is accepted (bytes, bytearray,
+    mmap, a contiguous numpy uint8 array...), and a str of characters below
+    256 is encoded as latin-1 first.
+
+    Parameters:
+    -----------
+    x: bytes-like or str
+    Data to be encoded
+
+    Returns:
+    --------
+    x: memoryview
+    One dimensional view of unsigned bytes, whose items are ints
+    """
+    if isinstance(x, str):
+        x = x.encode('latin-1')
+    x = memoryview(x)
+    if x.format != 'B' or x.ndim != 1:
+        x = x.cast('B')
+    return x
+
+
+def output(out=None, n=None):
+    """
+    Prepares the buffer a decoder writes its output into, one byte per
+    symbol, so no list of symbols is built and copied.
+
+    Parameters:
+    -----------
+    out=None: writable bytes-like
+    Buffer given by the caller, such as a bytearray, a memoryview of part of
+    one or an mmap opened for writing. If None a bytearray is made.
+    n=None: int
+    Number of bytes to be decoded, if known
+
+    Returns:
+    --------
+    x: bytearray or memoryview
+    A new bytearray of n zero bytes, empty if n is None, or the first n bytes
+    of out (all of it if n is None) viewed as unsigned bytes
+    """
+    if out is None:
+        return bytearray(n or 0)
+    x = memoryview(out)
+    if x.readonly:
+        raise ValueError('Output buffer is read only')
+    if x.format != 'B' or x.ndim != 1:
+        x = x.cast('B')
+    if n is None:
+        return x
+    if len(x) < n:
+        raise ValueError('Output buffer of {} bytes is too small for {}'.format(len(x), n))
+    return x[:n]
+
+
+def is_bytes(alphabet):
+    """
+    Returns whether every symbol of alphabet is a byte value, so that a
+    decoder can write them to a bytearray rather than a list.
+    """
+    return all(isinstance(a, int) and 0 <= a < 256 for a in alphabet)
+
+
+def store(x, k, a):
+    """
+    Writes byte a at position k of the output x of a decoder that does not
+    know its length in advance, from output. A bytearray grows to hold it,
+    while a buffer given by the caller must be large enough.
+    """
+    if k < len(x):
+        x[k] = a
+    elif isinstance(x, bytearray):
+        x.append(a)
+    else:
+        raise ValueError('Output buffer of {} bytes is too small'.format(len(x)))
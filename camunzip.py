@@ -1,62 +1,125 @@
-import trees
-import vl_codes
-import arithmetic
-from json import load
-from sys import argv, exit
-
-
-def camunzip(filename):
-    if (filename[-1] == 'h'):
-        method = 'huffman'
-    elif (filename[-1] == 's'):
-        method = 'shannon_fano'
-    elif (filename[-1] == 'a'):
-        method = 'arithmetic'
-    else:
-        raise NameError('Unknown compression method')
-
-    with open(filename, 'rb') as fin:
-        y = fin.read()
-    y = vl_codes.bytes2bits(y)
-
-    pfile = filename[:-1] + 'p'
-    with open(pfile, 'r') as fp:
-        frequencies = load(fp)
-    n = sum([frequencies[a] for a in frequencies])
-    p = dict([(int(a), frequencies[a]/n) for a in frequencies])
-
-    if method == 'huffman' or method == 'shannon_fano':
-        if (method == 'huffman'):
-            xt = vl_codes.huffman(p)
-            c = trees.xtree2code(xt)
-        else:
-            c = vl_codes.shannon_fano(p)
-            xt = trees.code2xtree(c)
+import mmap
+import container
+import archive
+from sys import argv, exit, stdout
 
-        x = vl_codes.vl_decode(y, xt)
 
-    elif method == 'arithmetic':
-        x = arithmetic.decode(y, p, n)
+def camunzip(filename, workers=None):
+    """
+    Decompresses a camzip file, whatever its name, one block at a time. The
+    codec and its model are read from the file itself. Files written by
+    camzip_blocks are decoded on workers processes, all the CPUs if None.
+    """
+    # '.cuz' for Cam UnZipped (don't want to overwrite the original file...)
+    outfile = filename[:-4] + '.cuz'
 
-    elif method == 'arithmetic_ftr':
-        x = arithmetic_ftr.decode(y, p, n)
+    with open(filename, 'rb') as fin, open(outfile, 'wb') as fout:
+        for x in container.read(fin, workers):
+            fout.write(x)
 
-    else:
-        raise NameError('This will never happen (famous last words)')
 
-    # '.cuz' for Cam UnZipped (don't want to overwrite the original file...)
+def camunzip_mmap(filename, workers=None):
+    """
+    Decompresses a camzip file like camunzip, with the output file sized to
+    the original length from the header and mapped into memory, so that the
+    blocks are decoded straight into it.
+    """
     outfile = filename[:-4] + '.cuz'
 
-    with open(outfile, 'wb') as fout:
-        fout.write(bytes(x))
+    with open(filename, 'rb') as fin, open(outfile, 'w+b') as fout:
+        n = container.read_header(fin)[1]
+        fin.seek(0)
+        fout.truncate(n)
+        if n:  # an empty file cannot be mapped
+            # unmapped once the last view of it goes, rather than closed,
+            # as the views of a failed decode outlive it in the traceback
+            container.read_into(fin, mmap.mmap(fout.fileno(), n), workers)
+
+
+def camunzip_range(filename, start, end):
+    """
+    Decompresses only bytes start to end (exclusive) of the original file,
+    decoding just the blocks that cover them.
+
+    Returns:
+    --------
+    x: bytes
+    """
+    with open(filename, 'rb') as fin:
+        return container.read_range(fin, start, end)
+
+
+def camunzip_list(filename):
+    """
+    Lists the members of an archive from its directory alone.
+
+    Returns:
+    --------
+    members: list of tuple
+    Name and original length of every member
+    """
+    with open(filename, 'rb') as fin:
+        method, models, entries = archive.read_directory(fin)
+    return [(name, n) for name, group, n, offset in entries]
+
+
+def camunzip_archive(filename, names=None):
+    """
+    Extracts the members of an archive called names, all of them if None,
+    each to its name followed by '.cuz'. Only the blocks of the members
+    wanted are decoded.
+    """
+    with open(filename, 'rb') as fin:
+        if names is None:
+            members = archive.read(fin)
+        else:
+            members = ((name, archive.extract(fin, name)) for name in names)
+        for name, x in members:
+            with open(name + '.cuz', 'wb') as fout:
+                fout.write(x)
 
 
 if __name__ == "__main__":
+    if len(argv) > 2 and argv[1] in ('--list', '--archive'):
+        if argv[1] == '--list':
+            for name, n in camunzip_list(argv[2]):
+                print('%12d  %s' % (n, name))
+        else:
+            camunzip_archive(argv[2], argv[3:] or None)
+        exit()
+
+    workers = None
+    if len(argv) > 2 and argv[1] == '--workers':
+        workers = int(argv[2])
+        del argv[1:3]
+
+    mapped = len(argv) > 1 and argv[1] == '--mmap'
+    if mapped:
+        argv.pop(1)
+
+    byte_range = None
+    if len(argv) > 3 and argv[1] == '--range':
+        byte_range = int(argv[2]), int(argv[3])
+        del argv[1:4]
+
     if (len(argv) != 2):
-        print('Usage: python %s filename\n' % argv[0])
+        print('Usage: python %s [--workers N | --mmap | --range START END] filename\n' % argv[0])
         print('Example: python %s hamlet.txt.czh' % argv[0])
         print('or:      python %s hamlet.txt.czs' % argv[0])
         print('or:      python %s hamlet.txt.cza' % argv[0])
+        print('or:      python %s hamlet.txt.czc' % argv[0])
+        print('or:      python %s hamlet.txt.czr' % argv[0])
+        print('or:      python %s --workers 4 hamlet.txt.czh' % argv[0])
+        print('or:      python %s --mmap hamlet.txt.czh' % argv[0])
+        print('or:      python %s --range 1000 2000 hamlet.txt.czh' % argv[0])
+        print('or:      python %s --list logs.czar' % argv[0])
+        print('or:      python %s --archive logs.czar [member...]' % argv[0])
         exit()
 
-    camunzip(argv[1])
+    if byte_range:
+        # the slice goes to standard output rather than a .cuz file
+        stdout.buffer.write(camunzip_range(argv[1], *byte_range))
+    elif mapped:
+        camunzip_mmap(argv[1], workers)
+    else:
+        camunzip(argv[1], workers)
@@ -1,58 +1,192 @@
-import trees
+import os
+import mmap
 import vl_codes
-import arithmetic
-import arithmetic_ftr
-from itertools import groupby
-from json import dump
+import container
+import archive
 from sys import argv
 
 
-def camzip(method, filename):
+def camzip(method, filename, block_size=container.BLOCK_SIZE):
 
     with open(filename, 'rb') as fin:
         x = fin.read()
 
     p, frequencies = vl_codes.probability_dict(x)
+    view = memoryview(x)  # blocks are slices of it rather than copies
+    blocks = [view[k:k+block_size] for k in range(0, len(x), block_size)]
 
-    if method == 'huffman' or method == 'shannon_fano':
-        if (method == 'huffman'):
-            xt = vl_codes.huffman(p)
-            c = trees.xtree2code(xt)
-        else:
-            c = vl_codes.shannon_fano(p)
-            xt = trees.code2xtree(c)
+    outfile = filename + '.cz' + method[0]
 
-        y = vl_codes.vl_encode(x, c)
+    with open(outfile, 'wb') as fout:
+        container.write(fout, method, blocks, frequencies, block_size)
 
-    elif method == 'arithmetic':
-        y = arithmetic.encode(x, p)
 
-    elif method == 'arithmetic_ftr':
-        y = arithmetic_ftr.encode(x, p)
+def read_blocks(fin, chunk):
+    """
+    Yields the contents of an open file in blocks of at most chunk bytes.
+    """
+    while True:
+        block = fin.read(chunk)
+        if not block:
+            return
+        yield block
 
-    else:
-        raise NameError('Compression method %s unknown' % method)
 
-    y = bytes(vl_codes.bits2bytes(y))
+def count_chunk(filename, offset, chunk):
+    """
+    Counts the symbols of chunk bytes of a file from offset.
+    """
+    with open(filename, 'rb') as fin:
+        fin.seek(offset)
+        return vl_codes.count_symbols(fin.read(chunk))
+
+
+def count_frequencies(filename, chunk=1 << 20, workers=1):
+    """
+    Counts the symbols of a file one chunk at a time. Each process of the
+    pool reads the chunks it counts itself, so only the counts are sent
+    between processes.
+
+    Parameters:
+    -----------
+    filename: str
+    chunk=1 << 20: int
+    Number of bytes counted at a time
+    workers=1: int
+    Number of processes, all the CPUs if None
+
+    Returns:
+    --------
+    frequencies: dict
+    Alphabet and corresponding counts over the whole file
+    """
+    offsets = range(0, os.path.getsize(filename), chunk)
+    counts = container.pool_map(count_chunk, ((filename, k, chunk) for k in offsets), workers)
+    return vl_codes.merge_frequencies(counts)
+
+
+def camzip_stream(method, filename, block_size=container.BLOCK_SIZE):
+    """
+    Compresses a file like camzip, to the same output, while holding only one
+    block of the input and output in memory at a time. The file is read
+    twice, once to count the symbols and once to encode them.
+    """
+    frequencies = count_frequencies(filename, block_size)
 
     outfile = filename + '.cz' + method[0]
 
-    with open(outfile, 'wb') as fout:
-        fout.write(y)
+    with open(filename, 'rb') as fin, open(outfile, 'wb') as fout:
+        container.write(fout, method, read_blocks(fin, block_size), frequencies, block_size)
 
-    pfile = filename + '.czp'
-    n = len(x)
 
-    with open(pfile, 'w') as fp:
-        dump(frequencies, fp)
+def camzip_blocks(method, filename, workers=None, block_size=container.BLOCK_SIZE):
+    """
+    Compresses a file in independently modelled blocks, encoded in parallel
+    on workers processes (all the CPUs if None). The output is the same for
+    any number of workers and camunzip can decode its blocks in parallel.
+    """
+    outfile = filename + '.cz' + method[0]
+
+    with open(filename, 'rb') as fin, open(outfile, 'wb') as fout:
+        container.write_independent(fout, method, read_blocks(fin, block_size), os.path.getsize(filename),
+                                    block_size, workers)
+
+
+def camzip_mmap(method, filename, block_size=container.BLOCK_SIZE):
+    """
+    Compresses a file like camzip, to the same output, with the file mapped
+    into memory rather than read: the encoders are given slices of the map
+    and the operating system pages it in as they go. With the variable
+    length codes the size of the output is known once the blocks are
+    counted, so the output file is sized up front and written through a map
+    as well.
+    """
+    outfile = filename + '.cz' + method[0]
+
+    with open(filename, 'rb') as fin:
+        if os.fstat(fin.fileno()).st_size == 0:  # an empty file cannot be mapped
+            return camzip(method, filename, block_size)
+        # the maps are unmapped once the last view of them goes, rather than
+        # closed, as the views of a failed encode outlive them in the traceback
+        x = memoryview(mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ))
+
+    blocks = [x[k:k+block_size] for k in range(0, len(x), block_size)]
+    counts = [vl_codes.count_symbols(block) for block in blocks]
+    frequencies = vl_codes.merge_frequencies(counts)
+    size = container.encoded_size(method, frequencies, counts)
+
+    if size is None:
+        with open(outfile, 'wb') as fout:
+            container.write(fout, method, blocks, frequencies, block_size)
+    else:
+        with open(outfile, 'w+b') as fout:
+            fout.truncate(size)
+            container.write(mmap.mmap(fout.fileno(), size), method, blocks, frequencies, block_size)
+
+
+def camzip_archive(method, filenames, outfile, clusters=1, block_size=container.BLOCK_SIZE):
+    """
+    Compresses many files into one archive, sharing at most clusters models
+    between them rather than storing one per file, see archive.py. Files
+    are stored under their names as given, which must be relative paths
+    without '..', and the arithmetic codec is refused, use range instead.
+    """
+    members = []
+    for filename in filenames:
+        with open(filename, 'rb') as fin:
+            members.append((filename, fin.read()))
+
+    with open(outfile, 'wb') as fout:
+        archive.write(fout, method, members, clusters, block_size)
 
 
 if __name__ == "__main__":
+    if len(argv) > 2 and argv[1] == '--archive':
+        outfile = argv[2]
+        del argv[1:3]
+        clusters = 1
+        if len(argv) > 2 and argv[1] == '--clusters':
+            clusters = int(argv[2])
+            del argv[1:3]
+        if len(argv) < 3:
+            print('Usage: python %s --archive outfile [--clusters K] compression_method filename...\n' % argv[0])
+            print('Example: python %s --archive logs.czar --clusters 4 huffman *.log' % argv[0])
+            exit()
+        camzip_archive(argv[1], argv[2:], outfile, clusters)
+        exit()
+
+    stream = len(argv) > 1 and argv[1] == '--stream'
+    if stream:
+        argv.pop(1)
+
+    mapped = len(argv) > 1 and argv[1] == '--mmap'
+    if mapped:
+        argv.pop(1)
+
+    workers = None
+    blocks = len(argv) > 2 and argv[1] == '--workers'
+    if blocks:
+        workers = int(argv[2])
+        del argv[1:3]
+
     if (len(argv) != 3):
-        print('Usage: python %s compression_method filename\n' % argv[0])
+        print('Usage: python %s [--stream | --mmap | --workers N] compression_method filename\n' % argv[0])
         print('Example: python %s huffman hamlet.txt' % argv[0])
         print('or:      python %s shannon_fano hamlet.txt' % argv[0])
         print('or:      python %s arithmetic hamlet.txt' % argv[0])
+        print('or:      python %s canonical hamlet.txt' % argv[0])
+        print('or:      python %s range hamlet.txt' % argv[0])
+        print('or:      python %s --stream huffman hamlet.txt' % argv[0])
+        print('or:      python %s --mmap huffman hamlet.txt' % argv[0])
+        print('or:      python %s --workers 4 huffman hamlet.txt' % argv[0])
+        print('or:      python %s --archive logs.czar [--clusters K] huffman a.log b.log...' % argv[0])
         exit()
 
-    camzip(argv[1], argv[2])
+    if blocks:
+        camzip_blocks(argv[1], argv[2], workers)
+    elif stream:
+        camzip_stream(argv[1], argv[2])
+    elif mapped:
+        camzip_mmap(argv[1], argv[2])
+    else:
+        camzip(argv[1], argv[2])
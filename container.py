@@ -0,0 +1,743 @@
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import trees
+import vl_codes
+import arithmetic
+import range_coder
+import bitio
+
+"""
+This file details the .cz container that camzip writes: a single
+self-describing file holding everything camunzip needs, so the codec is read
+from the file rather than guessed from its name and no model sidecar is
+needed. All integers are big-endian.
+
+    header  magic b'CZIP', version (1 byte), codec id (1 byte),
+            original length (8 bytes), block size (4 bytes),
+            model length (4 bytes)
+    model   codec-specific binary model, see encode_model
+    index   offset from the start of the container of every block (8 bytes
+            each)
+    blocks  for every block of block size input bytes (the last may be
+            shorter): payload length (4 bytes), original length (4 bytes),
+            CRC-32 of the original bytes (4 bytes), then the payload
+
+Each payload is a complete framed bit stream, so blocks can be decoded one at
+a time with only the shared model. Every block is thus a sync point: with the
+index, any byte range of the original data can be decoded from the blocks
+covering it alone, see read_range. Version 1 containers, which have no index,
+can still be read.
+
+The floating point arithmetic coder cannot decode every block it writes, so
+containers are never written with it: write and write_independent code the
+same model with the range coder instead, and write_header refuses it.
+Containers written with it before can still be read.
+
+A block mode container (version 2) instead models every block on its own so
+that blocks can be encoded and decoded independently, in parallel. Its header
+is the same with an empty model section, followed by
+
+    index   as above
+    blocks  for every block: payload length (4 bytes), original length
+            (4 bytes), CRC-32 of the original bytes (4 bytes), model length
+            (4 bytes), then the model and the payload
+"""
+
+MAGIC = b'CZIP'
+VERSION = 3
+BLOCK_VERSION = 2
+UNINDEXED_VERSION = 1
+
+CODECS = {'huffman': 1, 'shannon_fano': 2, 'arithmetic': 3, 'canonical': 4, 'range': 5}
+METHODS = dict([(CODECS[m], m) for m in CODECS])
+
+_HEADER = struct.Struct('>4sBBQII')
+_BLOCK = struct.Struct('>III')
+_INDEPENDENT = struct.Struct('>IIII')
+_OFFSET = struct.Struct('>Q')
+
+BLOCK_SIZE = 1 << 20
+
+# codecs containers are written with in place of those that cannot decode
+# every block they write
+WRITTEN_AS = {'arithmetic': 'range'}
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    value, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_model(method, frequencies):
+    """
+    Serialises the model of a codec. Canonical Huffman only needs its code
+    lengths, which are stored as in vl_codes.write_code_lengths; every other
+    codec stores the symbol counts as the number of symbols (2 bytes) followed
+    by each symbol (1 byte) and its count (LEB128 varint).
+
+    Parameters:
+    -----------
+    method: str
+    Name of the codec, a key of CODECS
+    frequencies: dict
+    Byte values and corresponding counts
+
+    Returns:
+    --------
+    model: bytes
+    """
+    if method == 'canonical':
+        y = bitio.BitWriter()
+        if frequencies:
+            n = sum(frequencies.values())
+            p = dict([(a, frequencies[a]/n) for a in frequencies])
+            vl_codes.write_code_lengths(y, vl_codes.code_lengths(vl_codes.huffman(p)))
+        return y.getvalue()
+
+    out = bytearray(struct.pack('>H', len(frequencies)))
+    for a in sorted(frequencies):
+        out.append(a)
+        _write_varint(out, frequencies[a])
+    return bytes(out)
+
+
+def decode_model(method, model):
+    """
+    Inverse of encode_model.
+
+    Returns:
+    --------
+    model: dict
+    Code lengths for canonical Huffman, symbol counts otherwise
+    """
+    if method == 'canonical':
+        y = bitio.BitReader(model)
+        return vl_codes.read_code_lengths(y) if y.remaining else {}
+
+    nsym, = struct.unpack_from('>H', model)
+    frequencies = {}
+    pos = 2
+    for k in range(nsym):
+        a = model[pos]
+        frequencies[a], pos = _read_varint(model, pos + 1)
+    return frequencies
+
+
+def _decode_table(c):
+    # a lone symbol may have an empty codeword, which needs no table
+    if not any(len(w) for w in c.values()):
+        return None
+    return vl_codes.decode_table(c)
+
+
+def coder(method, model):
+    """
+    Builds what a codec needs from its decoded model to encode or decode a
+    block, once for the whole file.
+
+    Parameters:
+    -----------
+    method: str
+    Name of the codec, a key of CODECS
+    model: dict
+    Code lengths or symbol counts as returned by decode_model
+
+    Returns:
+    --------
+    state: tuple
+    Code or probabilities passed on to encode_block and decode_block, with
+    the decoding tables of the codecs that have them
+    """
+    if method == 'canonical':
+        c = vl_codes.canonical_code(model)
+        return (c, _decode_table(c))
+
+    n = sum(model.values())
+    p = dict([(a, model[a]/n) for a in sorted(model)])
+
+    if method == 'huffman' or method == 'shannon_fano':
+        if not p:
+            return ({},)
+        if method == 'huffman':
+            c = trees.xtree2code(vl_codes.huffman(p))
+        else:
+            c = vl_codes.shannon_fano(p)
+        return (c, _decode_table(c))
+
+    elif method == 'arithmetic':
+        return (p,)
+
+    elif method == 'range':
+        freq = range_coder.quantise(model)
+        return (freq, range_coder.decode_table(freq))
+
+    raise NameError('Compression method %s unknown' % method)
+
+
+def encode_block(method, state, x):
+    """
+    Encodes one block of data as a framed bit stream.
+
+    Returns:
+    --------
+    y: bytes
+    """
+    if method in ('huffman', 'shannon_fano', 'canonical'):
+        y = vl_codes.vl_encode(x, state[0])
+    elif method == 'arithmetic':
+        y = arithmetic.encode(x, state[0])
+    elif method == 'range':
+        y = range_coder.encode(x, state[0])
+    else:
+        raise NameError('Compression method %s unknown' % method)
+    return y.getvalue()
+
+
+def decode_block(method, state, y, n, out=None):
+    """
+    Decodes one block of n symbols from its framed bit stream, straight into
+    out if given (see bitio.output).
+
+    Returns:
+    --------
+    x: bytearray or memoryview
+    """
+    x = bitio.output(out, n)
+    if method in ('huffman', 'shannon_fano', 'canonical'):
+        c, table = state
+        if table is None and len(c) == 1:
+            x[:] = bytes(list(c))*n  # a lone symbol may have an empty codeword
+        elif table is None:
+            raise NameError('Codebook has no codewords of non-zero length')
+        elif len(vl_codes.vl_decode_table(y, table, x)) != n:
+            raise ValueError('Truncated camzip file')
+    elif method == 'arithmetic':
+        arithmetic.decode(y, state[0], n, out=x)
+    elif method == 'range':
+        range_coder.decode(y, state[0], n, out=x, table=state[1])
+    else:
+        raise NameError('Compression method %s unknown' % method)
+    return x
+
+
+def write_header(fout, method, n, model, block_size=BLOCK_SIZE, version=VERSION):
+    """
+    Writes the header and model section of a container.
+
+    Parameters:
+    -----------
+    fout: file
+    File opened for binary writing
+    method: str
+    Name of the codec, a key of CODECS
+    n: int
+    Length of the original data
+    model: bytes
+    Model returned by encode_model
+    block_size: int
+    Number of input bytes per block
+    version: int
+    VERSION for a shared model, BLOCK_VERSION for independent blocks
+    """
+    if method not in CODECS:
+        raise NameError('Compression method %s unknown' % method)
+    if method in WRITTEN_AS:
+        raise ValueError("The %s codec cannot decode every block it writes, use '%s'"
+                         % (method, WRITTEN_AS[method]))
+    fout.write(_HEADER.pack(MAGIC, version, CODECS[method], n, block_size, len(model)))
+    fout.write(model)
+
+
+def read_header(fin):
+    """
+    Reads the header and model section of a container.
+
+    Returns:
+    --------
+    method: str
+    Name of the codec
+    n: int
+    Length of the original data
+    model: bytes
+    Serialised model, for decode_model
+    block_size: int
+    Number of input bytes per block
+    version: int
+    VERSION, BLOCK_VERSION or UNINDEXED_VERSION
+    """
+    header = fin.read(_HEADER.size)
+    if len(header) < _HEADER.size or header[:4] != MAGIC:
+        raise ValueError('Not a camzip file')
+    magic, version, codec, n, block_size, nmodel = _HEADER.unpack(header)
+    if version not in (VERSION, BLOCK_VERSION, UNINDEXED_VERSION):
+        raise ValueError('Unsupported camzip version %d' % version)
+    if codec not in METHODS:
+        raise ValueError('Unknown codec id %d' % codec)
+    model = fin.read(nmodel)
+    if len(model) < nmodel:
+        raise ValueError('Truncated camzip file')
+    return METHODS[codec], n, model, block_size, version
+
+
+def write_block(fout, y, x):
+    """
+    Writes an encoded block y of the original bytes x with its checksum.
+    """
+    fout.write(_BLOCK.pack(len(y), len(x), zlib.crc32(x)))
+    fout.write(y)
+
+
+def read_block(fin):
+    """
+    Reads the next block.
+
+    Returns:
+    --------
+    y: bytes
+    Encoded block
+    n: int
+    Length of the original block
+    crc: int
+    CRC-32 of the original block
+    """
+    header = fin.read(_BLOCK.size)
+    if len(header) < _BLOCK.size:
+        raise ValueError('Truncated camzip file')
+    nbytes, n, crc = _BLOCK.unpack(header)
+    y = fin.read(nbytes)
+    if len(y) < nbytes:
+        raise ValueError('Truncated camzip file')
+    return y, n, crc
+
+
+def check_block(x, crc, k=0):
+    """
+    Raises ValueError if the decoded block k does not match its checksum.
+    """
+    if zlib.crc32(x) != crc:
+        raise ValueError('Checksum mismatch in block %d' % k)
+
+
+def write(fout, method, blocks, frequencies, block_size=BLOCK_SIZE):
+    """
+    Writes a whole container, encoding the blocks one at a time.
+
+    Parameters:
+    -----------
+    fout: file
+    File opened for binary writing
+    method: str
+    Name of the codec, a key of CODECS, see WRITTEN_AS
+    blocks: iterable of bytes
+    Data to be compressed in blocks of block_size bytes, the last may be
+    shorter
+    frequencies: dict
+    Byte values and corresponding counts over all the blocks
+    block_size: int
+    Number of input bytes per block
+    """
+    method = WRITTEN_AS.get(method, method)
+    model = encode_model(method, frequencies)
+    state = coder(method, decode_model(method, model))
+    n = sum(frequencies.values())
+    base = fout.tell()
+    write_header(fout, method, n, model, block_size)
+    start = fout.tell()
+    fout.write(bytes(_OFFSET.size*block_count(n, block_size)))
+
+    offsets = []
+    for x in blocks:
+        offsets.append(fout.tell() - base)
+        write_block(fout, encode_block(method, state, x), x)
+    write_index(fout, start, offsets, block_count(n, block_size))
+
+
+def encoded_size(method, frequencies, counts):
+    """
+    Predicts the size of the container write produces without encoding
+    anything, so that the output can be allocated up front. Only the
+    variable length codes can be predicted, every payload being the sum of
+    the lengths of its codewords.
+
+    Parameters:
+    -----------
+    method: str
+    Name of the codec, a key of CODECS
+    frequencies: dict
+    Byte values and corresponding counts over all the blocks
+    counts: list of dict
+    Byte values and corresponding counts of each block
+
+    Returns:
+    --------
+    size: int
+    Number of bytes, None for the arithmetic and range coders
+    """
+    if method not in ('huffman', 'shannon_fano', 'canonical'):
+        return None
+    model = encode_model(method, frequencies)
+    c = coder(method, decode_model(method, model))[0]
+    size = _HEADER.size + len(model) + _OFFSET.size*len(counts)
+    for f in counts:
+        bits = sum([f[a]*len(c[a]) for a in f])
+        size += _BLOCK.size + (bitio.HEADER_BITS + bits + 7)//8
+    return size
+
+
+def read(fin, workers=None):
+    """
+    Reads a whole container, yielding the decoded blocks in order after
+    checking each against its checksum.
+
+    Parameters:
+    -----------
+    fin: file
+    File opened for binary reading
+    workers=None: int
+    Number of processes decoding a block mode container, all the CPUs if
+    None. Containers with a shared model are always decoded in process.
+    """
+    base = fin.tell()
+    method, n, model, block_size, version = read_header(fin)
+    if version == BLOCK_VERSION:
+        offsets = read_index(fin, n, block_size)
+        records = read_records(fin, base, offsets)
+        yield from pool_map(decode_independent, ((method, y, k) for k, y in enumerate(records)), workers)
+        return
+
+    if version == VERSION:
+        read_index(fin, n, block_size)
+    state = coder(method, decode_model(method, model))
+    k = 0
+    while n > 0:
+        y, m, crc = read_block(fin)
+        x = decode_block(method, state, y, m)
+        check_block(x, crc, k)
+        yield x
+        n -= m
+        k += 1
+
+
+def read_into(fin, out, workers=None):
+    """
+    Reads a whole container like read, decoding the blocks straight into
+    their place in out rather than yielding them. Blocks of a block mode
+    container decoded by other processes are copied into place.
+
+    Parameters:
+    -----------
+    fin: file
+    File opened for binary reading
+    out: writable bytes-like
+    Buffer of at least the length of the original data, such as an mmap of
+    the output file
+    workers=None: int
+    Number of processes decoding a block mode container, see read
+
+    Returns:
+    --------
+    x: memoryview
+    The original data, the start of out
+    """
+    base = fin.tell()
+    method, n, model, block_size, version = read_header(fin)
+    x = bitio.output(out, n)
+    if version == BLOCK_VERSION:
+        records = read_records(fin, base, read_index(fin, n, block_size))
+        if workers == 1:
+            for k, y in enumerate(records):
+                decode_independent(method, y, k, x[k*block_size:])
+        else:
+            for k, block in enumerate(pool_map(decode_independent, ((method, y, k) for k, y in enumerate(records)),
+                                               workers)):
+                x[k*block_size:k*block_size + len(block)] = block
+        return x
+
+    if version == VERSION:
+        read_index(fin, n, block_size)
+    state = coder(method, decode_model(method, model))
+    k, start = 0, 0
+    while start < n:
+        y, m, crc = read_block(fin)
+        check_block(decode_block(method, state, y, m, x[start:]), crc, k)
+        start += m
+        k += 1
+    return x
+
+
+def block_count(n, block_size):
+    """
+    Returns the number of blocks of block_size bytes holding n bytes.
+    """
+    return -(-n // block_size)
+
+
+def encode_independent(method, x):
+    """
+    Models and encodes one block on its own.
+
+    Parameters:
+    -----------
+    method: str
+    Name of the codec, a key of CODECS
+    x: bytes
+    Block of data, not empty
+
+    Returns:
+    --------
+    record: bytes
+    Block header, model and payload as stored in a block mode container
+    """
+    model = encode_model(method, vl_codes.probability_dict(x)[1])
+    y = encode_block(method, coder(method, decode_model(method, model)), x)
+    return _INDEPENDENT.pack(len(y), len(x), zlib.crc32(x), len(model)) + model + y
+
+
+def decode_independent(method, record, k=0, out=None):
+    """
+    Inverse of encode_independent, checking the decoded block k against its
+    checksum. The block is decoded into out if given.
+
+    Returns:
+    --------
+    x: bytearray or memoryview
+    """
+    nbytes, n, crc, nmodel = _INDEPENDENT.unpack_from(record)
+    start = _INDEPENDENT.size + nmodel
+    model = record[_INDEPENDENT.size:start]
+    if len(record) < start + nbytes:
+        raise ValueError('Truncated camzip file')
+    x = decode_block(method, coder(method, decode_model(method, model)), record[start:start+nbytes], n, out)
+    check_block(x, crc, k)
+    return x
+
+
+def pool_map(func, args, workers=None):
+    """
+    Yields func(*a) for every tuple a of args, in order, computed on a pool
+    of processes. At most two tasks per process are in flight at a time so
+    that args can be consumed lazily.
+
+    Parameters:
+    -----------
+    func: function
+    Module level function, so that it can be sent to the pool
+    args: iterable of tuple
+    Arguments of each call
+    workers=None: int
+    Number of processes, all the CPUs if None. With a single process func is
+    run in the calling process.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        for a in args:
+            yield func(*a)
+        return
+
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for a in args:
+            pending.append(pool.submit(func, *a))
+            if len(pending) >= 2*workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def read_index(fin, n, block_size, first=0, last=None):
+    """
+    Reads the block offsets of a container from its index, which starts at
+    the current position of fin, just after the header. Only the entries of
+    the blocks wanted are read.
+
+    Parameters:
+    -----------
+    fin: file
+    File opened for binary reading
+    n: int
+    Length of the original data
+    block_size: int
+    Number of input bytes per block
+    first=0: int
+    First block wanted
+    last=None: int
+    One past the last block wanted, all the blocks if None
+
+    Returns:
+    --------
+    offsets: list
+    Offset of blocks first to last from the start of the container
+    """
+    nblocks = block_count(n, block_size)
+    if last is None:
+        last = nblocks
+    if first:
+        fin.seek(_OFFSET.size*first, 1)
+    index = fin.read(_OFFSET.size*(last - first))
+    if len(index) < _OFFSET.size*(last - first):
+        raise ValueError('Truncated camzip file')
+    return [_OFFSET.unpack_from(index, _OFFSET.size*k)[0] for k in range(last - first)]
+
+
+def scan_index(fin, base, n):
+    """
+    Finds the block offsets of a version 1 container, which has no index, by
+    skipping from block header to block header.
+
+    Returns:
+    --------
+    offsets: list
+    Offset of every block from the start of the container
+    """
+    offsets = []
+    while n > 0:
+        offsets.append(fin.tell() - base)
+        header = fin.read(_BLOCK.size)
+        if len(header) < _BLOCK.size:
+            raise ValueError('Truncated camzip file')
+        nbytes, m, crc = _BLOCK.unpack(header)
+        fin.seek(nbytes, 1)
+        n -= m
+    return offsets
+
+
+def write_index(fout, start, offsets, nblocks):
+    """
+    Fills in the index reserved at position start of fout once all the blocks
+    have been written, leaving fout at its end.
+    """
+    if len(offsets) != nblocks:
+        raise ValueError('Expected %d blocks, got %d' % (nblocks, len(offsets)))
+    end = fout.tell()
+    fout.seek(start)
+    fout.write(b''.join([_OFFSET.pack(offset) for offset in offsets]))
+    fout.seek(end)
+
+
+def read_record(fin):
+    """
+    Reads the block record of a block mode container at the current position.
+
+    Returns:
+    --------
+    record: bytes
+    Block header, model and payload, for decode_independent
+    """
+    header = fin.read(_INDEPENDENT.size)
+    if len(header) < _INDEPENDENT.size:
+        raise ValueError('Truncated camzip file')
+    nbytes, n, crc, nmodel = _INDEPENDENT.unpack(header)
+    body = fin.read(nmodel + nbytes)
+    if len(body) < nmodel + nbytes:
+        raise ValueError('Truncated camzip file')
+    return header + body
+
+
+def read_records(fin, base, offsets):
+    """
+    Yields the block records at offsets from base, the start of the container.
+    """
+    for offset in offsets:
+        fin.seek(base + offset)
+        yield read_record(fin)
+
+
+def write_independent(fout, method, blocks, n, block_size=BLOCK_SIZE, workers=None):
+    """
+    Writes a block mode container, modelling and encoding every block on its
+    own across a pool of processes. The output does not depend on the number
+    of processes. fout must be seekable, as the index is filled in once all
+    the blocks have been written.
+
+    Parameters:
+    -----------
+    fout: file
+    File opened for binary writing
+    method: str
+    Name of the codec, a key of CODECS, see WRITTEN_AS
+    blocks: iterable of bytes
+    Data to be compressed in blocks of block_size bytes, the last may be
+    shorter
+    n: int
+    Total length of the blocks
+    block_size: int
+    Number of input bytes per block
+    workers=None: int
+    Number of processes, all the CPUs if None
+    """
+    method = WRITTEN_AS.get(method, method)
+    base = fout.tell()
+    write_header(fout, method, n, b'', block_size, BLOCK_VERSION)
+    nblocks = block_count(n, block_size)
+    start = fout.tell()
+    fout.write(bytes(_OFFSET.size*nblocks))
+
+    offsets = []
+    for record in pool_map(encode_independent, ((method, x) for x in blocks), workers):
+        offsets.append(fout.tell() - base)
+        fout.write(record)
+    write_index(fout, start, offsets, nblocks)
+
+
+def read_range(fin, start, end):
+    """
+    Decodes bytes start to end (exclusive) of the original data, reading
+    only the header, the index entries and the blocks covering them, so the
+    time taken does not depend on the size of the container.
+
+    Parameters:
+    -----------
+    fin: file
+    Seekable file opened for binary reading, at the start of a container
+    start: int
+    First byte wanted
+    end: int
+    One past the last byte wanted, clipped to the length of the data
+
+    Returns:
+    --------
+    x: bytes
+    """
+    base = fin.tell()
+    method, n, model, block_size, version = read_header(fin)
+    end = min(end, n)
+    if start < 0 or start >= end:
+        return b''
+    first, last = start // block_size, (end - 1) // block_size + 1
+
+    if version == UNINDEXED_VERSION:
+        offsets = scan_index(fin, base, n)[first:last]
+    else:
+        offsets = read_index(fin, n, block_size, first, last)
+
+    # the blocks are decoded side by side into one buffer
+    x = memoryview(bytearray(min(last*block_size, n) - first*block_size))
+    if version == BLOCK_VERSION:
+        for k, y in enumerate(read_records(fin, base, offsets), first):
+            decode_independent(method, y, k, x[(k - first)*block_size:])
+    else:
+        state = coder(method, decode_model(method, model))
+        for k, offset in enumerate(offsets, first):
+            fin.seek(base + offset)
+            y, m, crc = read_block(fin)
+            check_block(decode_block(method, state, y, m, x[(k - first)*block_size:]), crc, k)
+
+    skip = start - first*block_size
+    return bytes(x[skip:skip + end - start])
@@ -1,9 +1,11 @@
 import numpy as np
 import math
 import copy
+import itertools
 import vl_codes as vl
-from sys import stdout as so
-from bisect import bisect
+import range_coder
+import bitio
+import progress
 from adaptive_arithmetic import elias_gamma_decode, elias_gamma_encode
 
 
@@ -12,61 +14,96 @@ This file details the functions needed to apply a first pass context based
 Static Arithmetic coding algorithm. It uses a 1st order Markov process (Markov
 chain) to encode the data, and encodes the file length to the start of the
 compressed file using Elias Gamma coding. The decoder needs the transition
-matrix and the initial distribution of the file.
+matrix and the initial distribution of the file. Both sides compile these
+once into integer cumulative counts and symbol lookup tables for every
+context, see compile_model.
 
 O. Jones Dec 2018
 """
 
 
+def _codes(data):
+    # symbols of data as a numpy array of byte values, without copying
+    return np.frombuffer(bitio.symbols(data), dtype=np.uint8)
+
+
 def transition_matrix(data):
     """
-    Creates a transition matrix for a set of ASCII characters
+    Creates a transition matrix for a set of byte values
     current stat is the row, next state is the column
     """
+    transitions = _codes(data)
+    n = 1 + int(transitions.max())  # number of states
 
-    # convert data to array of ints
-    transitions = np.zeros(len(data), dtype=np.uint8)
-
-    for i in range(len(data)):
-        transitions[i] = ord(data[i])
-
-    n = 1 + max(transitions)  # number of states
-
-    M = np.zeros((n, n))  # create initialised matirx
-
-    for (i, j) in zip(transitions, transitions[1:]):
-        M[i][j] += 1
+    # count every (current, next) pair at once
+    pairs = transitions[:-1].astype(np.intp)*n + transitions[1:]
+    M = np.bincount(pairs, minlength=n*n).reshape(n, n).astype(float)
 
     # now convert to probabilities:
-    for row in M:
-        s = sum(row)
-        if s > 0:
-            row[:] = [f/s for f in row]
+    s = M.sum(axis=1, keepdims=True)
+    np.divide(M, s, out=M, where=s > 0)
     return M
 
 
-def cum_dist(p):
-    f = [0]
-    for symbol, probability in p.items():
-        f.append(f[-1]+probability)
+def compile_model(transition, p0, total_bits=14):
+    """
+    Quantises the initial distribution and every row of the transition matrix
+    to integer counts summing to 2**total_bits, once, so that coding a symbol
+    is only array indexing.
+
+    Parameters:
+    -----------
+    transition: numpy array
+    Transition matrix, as returned by transition_matrix
+    p0: dict
+    Initial distribution, keyed by byte value
+    total_bits=14: int
+    log2 of the total each context is quantised to
+
+    Returns:
+    --------
+    cum: list of list
+    For each context, the cumulative count below every symbol and the total,
+    indexed by byte value. Context i is the row of byte value i and the last
+    context the initial distribution.
+    lookup: list of bytes
+    For each context, the symbol whose interval holds every count from 0 to
+    2**total_bits-1, None for contexts that never occur
+    """
+    n = len(transition)
+    rows = [dict([(a, row[a]) for a in np.flatnonzero(row).tolist()]) for row in transition]
+    rows.append(p0)
 
-    f = dict([(a, mf) for a, mf in zip(p, f)])
-    return f
+    cum, lookup = [], []
+    for row in rows:
+        freq = range_coder.quantise(row, total_bits)
+        counts = [freq.get(a, 0) for a in range(max(n, max(freq, default=0) + 1))]
+        cum.append([0] + list(itertools.accumulate(counts)))
+        lookup.append(b''.join([bytes([a])*counts[a] for a in range(len(counts))]) if freq else None)
+    return cum, lookup
 
 
-def encode(x):
+def encode(x, report=None, total_bits=14):
     """
     Encodes data using the Arithmetic coding algorithm
 
     Parameters:
     -----------
-    x: str
-    Data string to be compressed
+    x: bytes-like or str
+    Data to be compressed, see bitio.symbols
+    report=None: progress.Progress
+    Reports progress if given
+    total_bits=14: int
+    log2 of the total the model is quantised to, see compile_model
 
     Returns:
     --------
-    y: binary list
+    y: bitio.BitWriter
     x data encoded with the p probability
+    transition: numpy array
+    Transition matrix, see transition_matrix
+    p0: dict
+    Initial distribution, keyed by byte value
     """
 
     # define '1' for interval based on precision available
@@ -76,43 +113,40 @@ def encode(x):
     half = 2*quarter
     threequarters = 3*quarter
 
-    # create transition matrix:
+    x = bitio.symbols(x)
+    y = bitio.BitWriter(elias_gamma_encode(len(x)))  # initialise output stream
     transition = transition_matrix(x)
     p, freq = vl.probability_dict(x)  # initial distribution to start chain
     p0 = copy.deepcopy(p)
+    cum, lookup = compile_model(transition, p0, total_bits)
 
-    f = cum_dist(p)
-
-    y = elias_gamma_encode(len(x))           # initialise output list
     lo, hi = 0, one  # initialise lo and hi to be [0,1.0)
     straddle = 0     # initialise the straddle counter to 0
 
+    f = cum[-1]   # start from the initial distribution
+    checkpoint = progress.begin(report, 'Arithmetic encoded', len(x))
     for k in range(len(x)):  # for every symbol
 
         # display progress bar
-        if k % 100 == 0:
-            so.write('Arithmetic encoded %d%%    \r' % int(math.floor(k/len(x)*100)))
-            so.flush()
+        if k == checkpoint:
+            checkpoint = report.update(k)
 
+        a = x[k]
         lohi_range = hi - lo + 1
         # narrow the interval end-points [lo,hi) to the new range [f,f+p]
-        lo = lo + int(math.ceil(f[x[k]]*lohi_range))
-        hi = lo + int(math.floor(p[x[k]]*lohi_range))
-        if (lo == hi):
-            raise NameError('Zero interval!')
+        hi = lo + (lohi_range*f[a + 1] >> total_bits) - 1
+        lo = lo + (lohi_range*f[a] >> total_bits)
 
         # Re-scale the interval if its end-points have bits in common
         while True:
             if hi < half:  # if lo < hi < 1/2
                 # append 0 and appropriate number of straddle 1s, stretch dealt with after
-                y.append(0)
-                y += [1]*straddle
+                y.write((1 << straddle) - 1, straddle + 1)
                 straddle = 0
 
             elif lo >= half:  # if hi > lo >= 1/2
                 # append 1 and appropriate number of straddle 0s, stretch dealt with after
-                y.append(1)
-                y += [0]*straddle
+                y.write(1 << straddle, straddle + 1)
                 straddle = 0
                 lo -= half
                 hi -= half
@@ -129,37 +163,40 @@ def encode(x):
             lo *= 2
             hi = 2*hi + 1
 
-        p = transition[ord(x[k])]
-        p = dict([(chr(i), p[i]) for i in range(len(p)) if p[i] > 0])
-        f = cum_dist(p)
+        f = cum[a]
 
     # termination bits
     # after processing all input symbols, flush any bits still in the 'straddle' pipeline
     straddle += 1     # adding 1 to straddle for "good measure" (ensures prefix-freeness)
     if lo < quarter:  # the position of lo determines the dyadic interval that fits
-        y.append(0)
-        y += [1]*straddle
+        y.write((1 << straddle) - 1, straddle + 1)
     else:
-        y.append(1)
-        y += [0]*straddle
+        y.write(1 << straddle, straddle + 1)
 
+    progress.end(report)
     # encode prefix free length of string
     return y, transition, p0
 
 
-def decode(y, transition, p0):
+def decode(y, transition, p0, report=None, total_bits=14, out=None):
     """
     Encodes data using the Arithmetic coding algorithm
 
     Parameters:
     -----------
-    y: binary list
+    y: list, bitio.BitWriter or bytes
     list of bits Arithmetically Encoded
+    report=None: progress.Progress
+    Reports progress if given
+    total_bits=14: int
+    log2 of the total the model is quantised to, as given to encode
+    out=None: writable bytes-like
+    Buffer to decode into, see bitio.output
 
     Returns:
     --------
-    x: list of char
-    y data decoded
+    x: bytearray or memoryview
+    y data decoded, in out if given
     """
     n, y = elias_gamma_decode(y)
 
@@ -169,45 +206,30 @@ def decode(y, transition, p0):
     half = 2*quarter
     threequarters = 3*quarter
 
-    p = p0
-    f = cum_dist(p)
+    cum, lookup = compile_model(transition, p0, total_bits)
+    f, table = cum[-1], lookup[-1]
 
-    alphabet = list(p.keys())
-
-    p = list(p.values())
-    f = list(f.values())
-
-    y.extend(precision*[0])  # dummy zeros to prevent index out of bound errors
-    x = n*[0]                # initialise all zeros
+    y = bitio.reader(y)  # reads past the end give dummy zeros
+    end = y.tell() + y.remaining + precision
+    x = bitio.output(out, n)  # initialise all zeros
 
     # initialise by taking first 'precision' bits from y and converting to a number
-    value = int(''.join(str(a) for a in y[0:precision]), 2)
-    y_position = precision  # position where currently reading y
+    value = y.read(precision)
     lo, hi = 0, one
 
     x_position = 0
+    checkpoint = progress.begin(report, 'Arithmetic decoded', n)
     while 1:
-        if x_position % 100 == 0:
-            so.write('Arithmetic decoded %d%%    \r' % int(math.floor(x_position/n*100)))
-            so.flush()
+        if x_position == checkpoint:
+            checkpoint = report.update(x_position)
 
         lohi_range = hi - lo + 1
-        a = bisect(f, (value-lo)/lohi_range) - 1
-        x[x_position] = alphabet[a]
-
-        lo = lo + int(math.ceil(f[a]*lohi_range))
-        hi = lo + int(math.floor(p[a]*lohi_range))
-
-        p = transition[ord(x[x_position])]
-        p = dict([(chr(i), p[i]) for i in range(len(p)) if p[i] > 0])
-        f = cum_dist(p)
-        alphabet = list(p.keys())
-
-        p = list(p.values())
-        f = list(f.values())
+        a = table[(((value - lo + 1) << total_bits) - 1)//lohi_range]
+        x[x_position] = a
 
-        if (lo == hi):
-            raise NameError('Zero interval!')
+        hi = lo + (lohi_range*f[a + 1] >> total_bits) - 1
+        lo = lo + (lohi_range*f[a] >> total_bits)
+        f, table = cum[a], lookup[a]
 
         while True:
             if hi < half:
@@ -225,15 +247,15 @@ def decode(y, transition, p0):
                 break
             lo = 2*lo
             hi = 2*hi + 1
-            value = 2*value + y[y_position]
-            y_position += 1
-            if y_position == len(y):
+            value = 2*value + y.read_bit()
+            if y.tell() == end:
                 break
 
         x_position += 1
-        if x_position == n or y_position == len(y):
+        if x_position == n or y.tell() == end:
             break
 
+    progress.end(report)
     return x
 
 
@@ -247,4 +269,4 @@ if __name__ == "__main__":
     y, transition, p0 = encode(data)
     print("Compression rate: {} bits/symbol".format(len(y)/len(data)))
     x = decode(y, transition, p0)
-    print(''.join(x)[:200])
+    print(x[:200].decode())
@@ -0,0 +1,89 @@
+"""
+This file details the binary indexed (Fenwick) tree used as the frequency
+model of the adaptive arithmetic coders. Symbols are the integers 0 to n-1
+and every operation the coders need, updating a count, finding the cumulative
+count below a symbol and finding the symbol whose interval holds a target
+count, takes O(log n) time instead of the O(n) of recomputing the cumulative
+distribution.
+"""
+
+
+class FenwickTree:
+    """
+    Integer counts of the symbols 0 to len(counts)-1 held as a binary indexed
+    tree: tree[i] is the sum of the counts of the i & -i symbols ending at
+    symbol i-1.
+    """
+
+    def __init__(self, counts):
+        self.n = len(counts)
+        self.mask = 1 << (self.n.bit_length() - 1) if self.n else 0
+        self.build(counts)
+
+    def build(self, counts):
+        """
+        Replaces every count, in O(n) time.
+        """
+        if len(counts) != self.n:
+            raise ValueError("Expected {} counts, got {}".format(self.n, len(counts)))
+        self.counts = list(counts)
+        self.total = sum(self.counts)
+        tree = [0] + self.counts
+        for i in range(1, self.n + 1):
+            j = i + (i & -i)
+            if j <= self.n:
+                tree[j] += tree[i]
+        self.tree = tree
+
+    def add(self, a, delta):
+        """
+        Adds delta to the count of symbol a.
+        """
+        self.counts[a] += delta
+        self.total += delta
+        i = a + 1
+        tree = self.tree
+        while i <= self.n:
+            tree[i] += delta
+            i += i & -i
+
+    def cumulative(self, a):
+        """
+        Returns the sum of the counts of the symbols below a.
+        """
+        s = 0
+        tree = self.tree
+        while a > 0:
+            s += tree[a]
+            a &= a - 1
+        return s
+
+    def find(self, target, bias=0):
+        """
+        Finds the symbol a whose interval [cumulative(a), cumulative(a+1))
+        holds target, for 0 <= target < total. If bias is given, it is added
+        to every count first, for 0 <= target < total + n*bias.
+
+        Returns:
+        --------
+        a: int
+        Symbol
+        c: int
+        cumulative(a), plus a*bias
+        """
+        a, c = 0, 0
+        step = self.mask
+        tree = self.tree
+        while step:
+            i = a + step
+            if i <= self.n and c + tree[i] + step*bias <= target:
+                a = i
+                c += tree[i] + step*bias
+            step >>= 1
+        return a, c
+
+    def scale(self, func):
+        """
+        Replaces every count c by func(c), in O(n) time.
+        """
+        self.build([func(c) for c in self.counts])
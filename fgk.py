@@ -1,110 +1,167 @@
-import numpy as np
-from sys import stdout as so
-from math import floor
+import progress
+import bitio
 
 """
 This file contains all the functions necessary for an FGK Adaptive Huffman
-coding algorithm. It uses an initial laplacian estimator for all ASCII symbols,
-and unlike vitter.py does not have functionality to decay the estimates as they
-change over time.
+coding algorithm. It uses an initial laplacian estimator for all byte values,
+or a smaller alphabet such as ASCII if asked, and unlike vitter.py does not
+have functionality to decay the estimates as they change over time.
 
 O. Jones Dec 2018
 """
 
-class SiblingPair:
+NULL = -1  # symbol of the NULL leaf of vitter.py
+
+
+class SiblingList:
     """
-    Container to help tidy up lists of Sibling Pairs for Adaptive Huffman
-    algorithms, based on the Data Structure by Gallager 1978
+    Sibling list of the Data Structure by Gallager 1978 for Adaptive Huffman
+    algorithms, held as parallel arrays of ints rather than an object per
+    pair. Pair p has two nodes, slot 2*p for its 0 branch and 2*p+1 for its
+    1 branch:
+
+        count[s]  weight of node s
+        child[s]  what node s points back to, packed as pair << 1 for an
+                  internal node or symbol << 1 | 1 for a leaf
+        fp[p]     slot pointing forward to pair p, -1 for the root
+
+    Symbols are ints, byte values or NULL.
     """
+    __slots__ = ('count', 'child', 'fp')
 
     def __init__(self):
-        self.count = np.array([0.0, 0.0])
-        self.fp = (-1, -1)  # second part indicates whether 0 or 1 traversal
-        self.bp = [(-1, False), (-1, False)]
-        return
+        self.count = []
+        self.child = []
+        self.fp = []
+
+    def append(self, fp=-1, child0=-2, child1=-2, count0=0, count1=0):
+        """
+        Adds a pair at the end of the list, returning its index.
+        """
+        self.fp.append(fp)
+        self.child += [child0, child1]
+        self.count += [count0, count1]
+        return len(self.fp) - 1
+
+    def __len__(self):
+        return len(self.fp)
+
+    def pair(self, p):
+        """
+        Returns pair p in the form (fp, [bp0, bp1], count0, count1) of the
+        SiblingPair objects this replaces, for printing.
+        """
+        fp = self.fp[p]
+        bp = [(c >> 1, bool(c & 1)) for c in self.child[2*p:2*p+2]]
+        return ((fp >> 1, fp & 1) if fp != -1 else (-1, -1), bp, self.count[2*p], self.count[2*p+1])
+
+
+def leaf(symbol):
+    """
+    Packs a leaf for SiblingList.child.
+    """
+    return (symbol << 1) | 1
 
-    def __repr__(self):
-        return str(tuple([self.fp, [self.bp[0], self.bp[1]], self.count[0], self.count[1]]))
 
-def encode(x):
+def encode(x, report=None, alphabet=256):
     """
     Encodes data using a FGK Adaptive Huffman Algorithm
 
     Parameters:
     -----------
-    x: bytes string
-    Data to be encoded
+    x: bytes-like or str
+    Data to be encoded, see bitio.symbols
+    report=None: progress.Progress
+    Reports progress if given
+    alphabet=256: int
+    Number of symbols, a power of 2, 128 is enough for ASCII text
 
     Returns:
     --------
-    y: list of bit
+    y: bitio.BitWriter
     """
-    sib_list, alphabet_pointers = init_tree()
+    sib_list, alphabet_pointers = init_tree(alphabet)
+    fp = sib_list.fp
+    x = bitio.symbols(x)
 
     # Now we have generated the starting tree we can begin to order the list
-    y = []
+    y = bitio.BitWriter()
+    checkpoint = progress.begin(report, 'Adaptive Huffman encoded', len(x))
     for i in range(len(x)):
-        if i % 100 == 0:
-            so.write('Adaptive Huffman encoded %d%%    \r' % int(floor(i/len(x)*100)))
-            so.flush()
-
-        code = []
-        pnt_list = []
-        # generate the codeword
-        pnt_list.append(alphabet_pointers[x[i]])
-        while pnt_list[-1][0] != -1:  # note root node will not be added
-            code.append(pnt_list[-1][1])
-            pair = sib_list[pnt_list[-1][0]]
-            pnt_list.append(pair.fp)
-        code = code[::-1]  # as we are traversing leaves to root so codeword is reversed
-        y += code
-
-        sib_list, alphabet_pointers = modify_tree(sib_list, alphabet_pointers, pnt_list)
-
+        if i == checkpoint:
+            checkpoint = report.update(i)
+
+        # generate the codeword, the slots from the leaf up to the root
+        if x[i] >= alphabet:
+            raise ValueError("Symbol {} outside alphabet of {}".format(x[i], alphabet))
+        slots = [alphabet_pointers[x[i]]]
+        while fp[slots[-1] >> 1] != -1:
+            slots.append(fp[slots[-1] >> 1])
+        code = 0
+        for s in reversed(slots):  # as we are traversing leaves to root so codeword is reversed
+            code = (code << 1) | (s & 1)
+        y.write(code, len(slots))
+
+        modify_tree(sib_list, alphabet_pointers, slots)
+
+    progress.end(report)
     return y
 
 
-def decode(y):
+def decode(y, report=None, alphabet=256, out=None):
     """
     Decodes data using a FGK Adaptive Huffman Algorithm
 
     Parameters:
     -----------
-    y: list of bits
+    y: list of bits, bitio.BitWriter or bytes
     Data to be decoded
+    report=None: progress.Progress
+    Reports progress if given
+    alphabet=256: int
+    Number of symbols, as given to encode
+    out=None: writable bytes-like
+    Buffer to decode into, see bitio.output
 
     Returns:
     --------
-    x: list of bytes
+    x: bytearray or memoryview
+    Decoded data, the part of out written if given
     """
+    y = bitio.reader(y)
+    n = len(y)
+
     # create initial tree as in encode
-    sib_list, alphabet_pointers = init_tree()
+    sib_list, alphabet_pointers = init_tree(alphabet)
+    child = sib_list.child
+    root = len(sib_list) - 1  # the root is at the end of the sib_list
 
     # begin decoding
-    x = []
-    pnt_list = []
-    pair = sib_list[-1]  # initialise root which is at the end of the sib_list
-    current_pnt = -1
-    for i in range(len(y)):
-        if i % 100 == 0:
-            so.write('Adaptive Huffman decoded %d%%    \r' % int(floor(i/len(y)*100)))
-            so.flush()
-        bit = y[i]
-        pnt_list.append((current_pnt, bit))
-        if pair.bp[bit][1]:  # reached leaf
-            x.append(pair.bp[bit][0])
-
-            pnt_list = pnt_list[::-1]
-            sib_list, alphabet_pointers = modify_tree(sib_list, alphabet_pointers, pnt_list)
-            pnt_list = []
-            pair = sib_list[-1]
-            current_pnt = -1
+    x = bitio.output(out)
+    k = 0  # number of symbols decoded
+    slots = []
+    current_pnt = root
+    checkpoint = progress.begin(report, 'Adaptive Huffman decoded', n)
+    for i, bit in enumerate(y):
+        if i == checkpoint:
+            checkpoint = report.update(i)
+        s = 2*current_pnt + bit
+        slots.append(s)
+        c = child[s]
+        if c & 1:  # reached leaf
+            bitio.store(x, k, c >> 1)
+            k += 1
+
+            slots.reverse()
+            modify_tree(sib_list, alphabet_pointers, slots)
+            slots = []
+            current_pnt = root
         else:
+            current_pnt = c >> 1
 
-            current_pnt = pair.bp[bit][0]
-            pair = sib_list[current_pnt]
+    progress.end(report)
+    return x[:k] if k < len(x) else x
 
-    return x
 
 def print_tree(tree):
     """
@@ -113,14 +170,14 @@ def print_tree(tree):
 
     Parameters:
     -----------
-    sib_list: list of sibling pairs
+    sib_list: SiblingList
 
     Returns:
     --------
     null
     """
-    for i, j in enumerate(tree):
-        print("Entry {}: {}".format(i, j))
+    for i in range(len(tree)):
+        print("Entry {}: {}".format(i, tree.pair(i)))
     return
 
 
@@ -134,92 +191,77 @@ def error_check_tree(sib_list):
 
     Parameters:
     -----------
-    sib_list: list of SiblingPair()
+    sib_list: SiblingList
 
     Returns:
     --------
     null
     """
+    count, child, fp = sib_list.count, sib_list.child, sib_list.fp
     # ERROR checks on the lists, uncomment for debugging
     # no pair should reference behind itself:
     for i in range(len(sib_list)):
-        if sib_list[i].fp[0] > i and sib_list[i].fp[0] != -1:  # inc will effectively flip the sign
+        if fp[i] >> 1 > i and fp[i] != -1:  # inc will effectively flip the sign
             print_tree(sib_list)
-            raise RuntimeError("Back referencing pair {}".format(sib_list[i]))
+            raise RuntimeError("Back referencing pair {}".format(sib_list.pair(i)))
 
     # the counts of every pair should be the sum of its previous
-    for i in range(len(sib_list)):
-        for bit in range(2):
-            if not sib_list[i].bp[bit][1]:
-                if sib_list[i].count[bit] != sum(sib_list[sib_list[i].bp[bit][0]].count):
-                    print("LIST ON ERROR")
-                    print_tree(sib_list)
-                    raise RuntimeError("Incorrect sum on pair {}".format(sib_list[i]))
-
-    # the counts of every pair should be <= its higher order
-    for i in range(len(sib_list)):
-        for bit in range(2):
-            if (bit == 0 and sib_list[i].count[bit] > sib_list[i].count[1]) or (bit == 1 and i != 0 and sib_list[i].count[bit] > sib_list[i-1].count[0]):
+    for s in range(len(child)):
+        if not child[s] & 1:
+            if count[s] != count[child[s] & ~1] + count[child[s] | 1]:
                 print("LIST ON ERROR")
                 print_tree(sib_list)
-                raise RuntimeError("Mis ordered pair {}".format(sib_list[i]))
+                raise RuntimeError("Incorrect sum on pair {}".format(sib_list.pair(s >> 1)))
+
+    # the counts of every pair should be <= its higher order
+    for s in range(len(count)):
+        if (not s & 1 and count[s] > count[s+1]) or (s & 1 and s != 1 and count[s] > count[s-3]):
+            print("LIST ON ERROR")
+            print_tree(sib_list)
+            raise RuntimeError("Mis ordered pair {}".format(sib_list.pair(s >> 1)))
     return
 
 
-def init_tree():
+def init_tree(alphabet=256):
     """
     Initialises sibling list and alphabet pointers for encode and decode
     functions
 
     Parameters:
     -----------
-    null
+    alphabet=256: int
+    Number of symbols, a power of 2
 
     Returns:
     --------
-    sib_list: list of SiblingPair()
-    List of sibling pair trees based on the ASCII character set
+    sib_list: SiblingList
+    List of sibling pair trees of a uniform distribution over the alphabet
 
     alphabet_pointers: dict
-    Dictionary of pointers to leaves of sib_list labelled with ascii characters
+    Dictionary of slots of the leaves of sib_list labelled with byte values
     """
     # intialise empty probability of uniform data
-    freq = dict([(chr(a), 1) for a in range(128)])
+    alphabet = list(range(alphabet))
 
     # create empty set of sibling lists:
-    sib_list = []
-    alphabet = list(freq.keys())
+    sib_list = SiblingList()
     alphabet_pointers = {}
     for i in range(len(alphabet)//2):
-        sib_list.append(SiblingPair())
-        sib_list[-1].bp[1] = (alphabet[2*i], True)
-        alphabet_pointers[alphabet[2*i]] = (i, 1)
-
-        sib_list[-1].bp[0] = (alphabet[2*i+1], True)
-        alphabet_pointers[alphabet[2*i+1]] = (i, 0)
-        sib_list[-1].count = np.array([1.0, 1.0])
+        sib_list.append(-1, leaf(alphabet[2*i+1]), leaf(alphabet[2*i]), 1, 1)
+        alphabet_pointers[alphabet[2*i]] = 2*i + 1
+        alphabet_pointers[alphabet[2*i+1]] = 2*i
 
-    # creat list of pointers so that encoding knows where to start
     # iterate through to connect the trees together
+    count, fp = sib_list.count, sib_list.fp
     assign_from = 0
     assign_to = len(sib_list)
-    while True:
-        roots = 0
-        for i in sib_list:
-            if i.fp[0] == -1:
-                roots += 1
-        if roots == 1:
-            break
-
+    while assign_to - assign_from > 1:
         for i in range(int((assign_to-assign_from+0.5)//2)):
-            sib_list.append(SiblingPair())
-            sib_list[assign_from + 2*i].fp = (len(sib_list)-1, 0)
-            sib_list[assign_from + 2*i+1].fp = (len(sib_list)-1, 1)
-
-            sib_list[-1].bp[0] = (assign_from + 2*i, False)
-            sib_list[-1].bp[1] = (assign_from + 2*i+1, False)
-            sib_list[-1].count[0] = sum(sib_list[sib_list[-1].bp[0][0]].count)
-            sib_list[-1].count[1] = sum(sib_list[sib_list[-1].bp[0][0]].count)
+            left, right = assign_from + 2*i, assign_from + 2*i+1
+            p = sib_list.append(-1, left << 1, right << 1, count[2*left] + count[2*left+1],
+                                count[2*right] + count[2*right+1])
+            fp[left] = 2*p
+            fp[right] = 2*p + 1
 
         assign_from = assign_to
         assign_to = len(sib_list)
@@ -227,33 +269,54 @@ def init_tree():
     return sib_list, alphabet_pointers
 
 
-def modify_tree(sib_list, alphabet_pointers, pnt_list):
+def swap(sib_list, alphabet_pointers, s, t):
+    """
+    Swaps what slots s and t of a sibling list point back to, leaving their
+    counts in place.
+    """
+    child, fp = sib_list.child, sib_list.fp
+    c, d = child[s], child[t]
+    if c & 1:
+        alphabet_pointers[c >> 1] = t
+    else:
+        fp[c >> 1] = t
+    if d & 1:
+        alphabet_pointers[d >> 1] = s
+    else:
+        fp[d >> 1] = s
+    child[s], child[t] = d, c
+
+
+def modify_tree(sib_list, alphabet_pointers, slots):
     """
     Modifies and exitsting sibling list for Adaptive Huffman algorithms based
     on a traversal list from an encoding or decoding process
 
     Parameters:
     -----------
-    sib_list: list of SiblingPair()
-    List of sibling pair trees based on the ASCII character set
+    sib_list: SiblingList
+    List of sibling pair trees over the alphabet
 
     alphabet_pointers: dict
-    Dictionary of pointers to leaves of sib_list labelled with ascii characters
+    Dictionary of slots of the leaves of sib_list labelled with byte values
 
-    pnt_list: list (pnt, bit)
-    list of pointers and their corrseponding bits for the tree traversal
+    slots: list
+    Slots of the tree traversal, from the leaf up to the root
 
     Returns:
     --------
-    sib_list: list of SiblingPair()
+    sib_list: SiblingList
     Modified sib_list to take into account the observed data
 
     alphabet_pointers: dict
     Modified alphabet_pointers to take into account the observed data
     """
-    for pnt, bit in pnt_list:
-        sib_list[pnt].count[bit] += 1
-        if sib_list[pnt].fp[0] == -1:
+    count, fp = sib_list.count, sib_list.fp
+    last = len(fp) - 1
+    for s in slots:
+        count[s] += 1
+        pnt = s >> 1
+        if fp[pnt] == -1:
             break
 
         # NOTE: Tree should be maintained such that all bp < fp and all
@@ -261,31 +324,17 @@ def modify_tree(sib_list, alphabet_pointers, pnt_list):
         while True:
             change = False
             for check in range(2):  # checks both back pointer counts
-                if sib_list[pnt].count[bit] > sib_list[pnt+1].count[check]:
+                t = 2*pnt + 2 + check
+                if count[s] > count[t]:
                     change = True
-                    # swap the fps of the bp pairs
-                    bckpnt1 = sib_list[pnt].bp[bit]
-                    if bckpnt1[1]:
-                        alphabet_pointers[bckpnt1[0]] = (pnt+1, check)
-                    else:
-                        sib_list[bckpnt1[0]].fp = (pnt+1, check)
-
-                    bckpnt2 = sib_list[pnt+1].bp[check]
-                    if bckpnt2[1]:
-                        alphabet_pointers[bckpnt2[0]] = (pnt, bit)
-                    else:
-                        sib_list[bckpnt2[0]].fp = (pnt, bit)
-
-                    # swap bps
-                    sib_list[pnt].bp[bit] = bckpnt2
-                    sib_list[pnt+1].bp[check] = bckpnt1
+                    swap(sib_list, alphabet_pointers, s, t)
                     new_bit = check
 
             if not change:  # if no change was made, ordering complete
                 break
 
             pnt += 1
-            bit = new_bit  # in case node has switched sides in the tree
-            if pnt >= len(sib_list)-1:
+            s = 2*pnt + new_bit  # in case node has switched sides in the tree
+            if pnt >= last:
                 break
     return sib_list, alphabet_pointers
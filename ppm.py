@@ -0,0 +1,328 @@
+from collections import OrderedDict
+import progress
+import bitio
+from adaptive_arithmetic import elias_gamma_decode, elias_gamma_encode
+
+"""
+This file details an adaptive order-k context model in the style of PPM
+(prediction by partial matching, method C) driving an integer arithmetic
+coder. Each symbol is coded in the longest previous context that has seen it,
+escaping to shorter contexts, and finally to a uniform order -1 model, when it
+has not. Symbols already ruled out by a longer context are excluded from the
+shorter ones. Encoder and decoder build the same model as they go, so nothing
+but the file length is sent ahead of the data.
+
+Contexts are kept sparsely in a hash table keyed by their last k symbols, and
+memory is bounded by a cap on the number of symbol counts stored: once it is
+exceeded the model is either reset or its least recently used contexts are
+evicted.
+"""
+
+PRECISION = 32
+ONE = (1 << PRECISION) - 1
+QUARTER = (ONE + 1) >> 2
+HALF = 2*QUARTER
+THREEQUARTERS = 3*QUARTER
+
+
+class Encoder:
+    """
+    Integer arithmetic encoder taking each symbol as its interval [c, c+f) of
+    a total, which must be at most 2**30.
+    """
+
+    def __init__(self, y):
+        self.y = y
+        self.lo, self.hi = 0, ONE
+        self.straddle = 0
+
+    def encode(self, c, f, total):
+        lohi_range = self.hi - self.lo + 1
+        lo = self.lo + lohi_range*c//total
+        hi = self.lo + lohi_range*(c + f)//total - 1
+        y = self.y
+        while True:
+            if hi < HALF:
+                y.write((1 << self.straddle) - 1, self.straddle + 1)
+                self.straddle = 0
+            elif lo >= HALF:
+                y.write(1 << self.straddle, self.straddle + 1)
+                self.straddle = 0
+                lo -= HALF
+                hi -= HALF
+            elif lo >= QUARTER and hi < THREEQUARTERS:
+                self.straddle += 1
+                lo -= QUARTER
+                hi -= QUARTER
+            else:
+                break
+            lo *= 2
+            hi = 2*hi + 1
+        self.lo, self.hi = lo, hi
+
+    def finish(self):
+        """
+        Writes the bits that identify the final interval.
+        """
+        self.straddle += 1
+        if self.lo < QUARTER:
+            self.y.write((1 << self.straddle) - 1, self.straddle + 1)
+        else:
+            self.y.write(1 << self.straddle, self.straddle + 1)
+
+
+class Decoder:
+    """
+    Inverse of Encoder: target gives the count within a total that the next
+    symbol's interval holds, and decode consumes that interval.
+    """
+
+    def __init__(self, y):
+        self.y = y   # reads past the end give dummy zeros
+        self.lo, self.hi = 0, ONE
+        self.value = y.read(PRECISION)
+
+    def target(self, total):
+        return ((self.value - self.lo + 1)*total - 1)//(self.hi - self.lo + 1)
+
+    def decode(self, c, f, total):
+        lohi_range = self.hi - self.lo + 1
+        lo = self.lo + lohi_range*c//total
+        hi = self.lo + lohi_range*(c + f)//total - 1
+        value = self.value
+        y = self.y
+        while True:
+            if hi < HALF:
+                pass
+            elif lo >= HALF:
+                lo -= HALF
+                hi -= HALF
+                value -= HALF
+            elif lo >= QUARTER and hi < THREEQUARTERS:
+                lo -= QUARTER
+                hi -= QUARTER
+                value -= QUARTER
+            else:
+                break
+            lo *= 2
+            hi = 2*hi + 1
+            value = 2*value + y.read_bit()
+        self.lo, self.hi, self.value = lo, hi, value
+
+
+class ContextModel:
+    """
+    Order-k PPM model over the symbols 0 to alphabet-1.
+
+    Parameters:
+    -----------
+    order=3: int
+    Longest context used
+    alphabet=256: int
+    Number of symbols
+    max_entries=1 << 20: int
+    Most symbol counts held over all contexts before policy is applied
+    policy='reset': str
+    'reset' to empty the model, 'evict' to drop the least recently used
+    contexts until the model is back under the cap
+    max_count=1 << 16: int
+    Counts in a context are halved when one reaches this
+    """
+
+    def __init__(self, order=3, alphabet=256, max_entries=1 << 20, policy='reset', max_count=1 << 16):
+        if policy not in ('reset', 'evict'):
+            raise ValueError('Unknown memory policy %s' % policy)
+        if alphabet*max_count > QUARTER:
+            raise ValueError("Counts of {} symbols up to {} do not fit in the coder's range".format(
+                alphabet, max_count))
+        self.order = order
+        self.alphabet = alphabet
+        self.max_entries = max_entries
+        self.policy = policy
+        self.max_count = max_count
+        self.tables = OrderedDict()   # context -> {symbol: count}, least recently used first
+        self.entries = 0
+
+    def contexts(self, history):
+        """
+        Returns the keys of the contexts of the next symbol, longest first.
+        """
+        return [tuple(history[len(history)-k:]) for k in range(min(self.order, len(history)), 0, -1)] + [()]
+
+    def _table(self, key):
+        table = self.tables.get(key)
+        if table is not None:
+            self.tables.move_to_end(key)
+        return table
+
+    def encode(self, coder, history, a):
+        """
+        Encodes symbol a following history with an Encoder.
+        """
+        excluded = set()
+        visited = []
+        for key in self.contexts(history):
+            visited.append(key)
+            table = self._table(key)
+            if not table:
+                continue
+            c, total, escape = 0, 0, 0
+            for b, f in table.items():
+                if b in excluded:
+                    continue
+                if b == a:
+                    c, count = total, f
+                total += f
+                escape += 1
+            if not escape:
+                continue
+            if a in table:
+                coder.encode(c, count, total + escape)
+                break
+            coder.encode(total, escape, total + escape)
+            excluded.update(table)
+        else:
+            # order -1: uniform over the symbols not yet excluded
+            if not 0 <= a < self.alphabet:
+                raise ValueError("Symbol {} outside alphabet of {}".format(a, self.alphabet))
+            rank = a - sum([1 for b in excluded if b < a])
+            coder.encode(rank, 1, self.alphabet - len(excluded))
+        self.update(visited, a)
+
+    def decode(self, coder, history):
+        """
+        Decodes the symbol following history with a Decoder.
+
+        Returns:
+        --------
+        a: int
+        """
+        excluded = set()
+        visited = []
+        for key in self.contexts(history):
+            visited.append(key)
+            table = self._table(key)
+            if not table:
+                continue
+            symbols = [(b, f) for b, f in table.items() if b not in excluded]
+            if not symbols:
+                continue
+            total = sum([f for b, f in symbols])
+            target = coder.target(total + len(symbols))
+            if target >= total:
+                coder.decode(total, len(symbols), total + len(symbols))
+                excluded.update(table)
+                continue
+            c = 0
+            for a, f in symbols:
+                if target < c + f:
+                    break
+                c += f
+            coder.decode(c, f, total + len(symbols))
+            break
+        else:
+            n = self.alphabet - len(excluded)
+            rank = coder.target(n)
+            coder.decode(rank, 1, n)
+            a = 0
+            while a in excluded or rank:
+                if a not in excluded:
+                    rank -= 1
+                a += 1
+        self.update(visited, a)
+        return a
+
+    def update(self, keys, a):
+        """
+        Counts symbol a in the contexts keys, those it was coded or escaped
+        from, then applies the memory policy.
+        """
+        for key in keys:
+            table = self.tables.get(key)
+            if table is None:
+                table = self.tables[key] = {}
+            if a not in table:
+                table[a] = 0
+                self.entries += 1
+            table[a] += 1
+            if table[a] >= self.max_count:
+                for b in table:
+                    table[b] = (table[b] + 1)//2
+
+        if self.entries > self.max_entries:
+            if self.policy == 'reset':
+                self.tables.clear()
+                self.entries = 0
+            else:
+                while self.entries > self.max_entries:
+                    key, table = self.tables.popitem(last=False)
+                    self.entries -= len(table)
+
+
+def encode(x, order=3, alphabet=256, max_entries=1 << 20, policy='reset', report=None):
+    """
+    Encodes data with an adaptive order-k context model and arithmetic coding
+
+    Parameters:
+    -----------
+    x: bytes-like or str
+    Data to be compressed, see bitio.symbols
+    order=3: int
+    Longest context used
+    alphabet=256: int
+    Number of symbols, bytes with values below alphabet
+    max_entries=1 << 20: int
+    Most symbol counts the model holds, see ContextModel
+    policy='reset': str
+    What to do when the model is full, 'reset' or 'evict'
+    report=None: progress.Progress
+    Reports progress if given
+
+    Returns:
+    --------
+    y: bitio.BitWriter
+    """
+    model = ContextModel(order, alphabet, max_entries, policy)
+    x = bitio.symbols(x)
+    y = bitio.BitWriter(elias_gamma_encode(len(x) + 1))  # + 1 as 0 has no Elias gamma code
+    coder = Encoder(y)
+    checkpoint = progress.begin(report, 'PPM encoded', len(x))
+    for k in range(len(x)):
+        if k == checkpoint:
+            checkpoint = report.update(k)
+        model.encode(coder, x[max(0, k-order):k], x[k])
+    coder.finish()
+    progress.end(report)
+    return y
+
+
+def decode(y, order=3, alphabet=256, max_entries=1 << 20, policy='reset', report=None, out=None):
+    """
+    Decodes data encoded by encode, given the same parameters
+
+    Parameters:
+    -----------
+    y: list, bitio.BitWriter or bytes
+    Encoded data
+    report=None: progress.Progress
+    Reports progress if given
+    out=None: writable bytes-like
+    Buffer to decode into, see bitio.output
+
+    Returns:
+    --------
+    x: bytearray or memoryview
+    Decoded data, in out if given
+    """
+    n, y = elias_gamma_decode(y)
+    n -= 1
+    model = ContextModel(order, alphabet, max_entries, policy)
+    coder = Decoder(y)
+    x = bitio.output(out, n)
+    checkpoint = progress.begin(report, 'PPM decoded', n)
+    for k in range(n):
+        if k == checkpoint:
+            checkpoint = report.update(k)
+        x[k] = model.decode(coder, x[max(0, k-order):k])
+    progress.end(report)
+    return x
@@ -0,0 +1,123 @@
+import time
+from sys import stdout
+
+"""
+This file contains the progress reporting shared by the codecs. Progress is
+off by default: every encoder and decoder takes a report argument which is
+None unless a Progress is given, in which case its callback is called every
+so many symbols, or at most once per time interval. A disabled report costs
+the loops of the codecs a single integer comparison per symbol.
+
+Codecs use it as
+
+    checkpoint = progress.begin(report, 'Arithmetic encoded', len(x))
+    for k in range(len(x)):
+        if k == checkpoint:
+            checkpoint = report.update(k)
+        ...
+    progress.end(report)
+
+A Progress can be sent to worker processes as long as its callback can, such
+as print_progress or a QueueCallback.
+"""
+
+
+def print_progress(label, done, total):
+    """
+    Callback writing a percentage to standard output, overwriting the last.
+    """
+    stdout.write('%s %d%%    \r' % (label, done*100//total if total else 100))
+    stdout.flush()
+
+
+class QueueCallback:
+    """
+    Callback putting (label, done, total) on a queue, for instance a
+    multiprocessing.Manager().Queue() read by the parent of worker processes.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def __call__(self, label, done, total):
+        self.queue.put((label, done, total))
+
+
+class Progress:
+    """
+    Reports the progress of a codec loop by calling callback(label, done,
+    total) every `every` symbols, or if interval is given at most once every
+    interval seconds, in which case the clock is read every `every` symbols.
+    """
+
+    def __init__(self, callback=print_progress, every=1 << 12, interval=None):
+        if every < 1:
+            raise ValueError('Progress must be reported at least every symbol')
+        self.callback = callback
+        self.every = every
+        self.interval = interval
+        self.label, self.total, self.last = '', 0, 0.0
+
+    def start(self, label, total, done=0):
+        """
+        Starts reporting a new loop over total symbols, starting from symbol
+        done.
+
+        Returns:
+        --------
+        checkpoint: int
+        Index of the symbol at which update should next be called
+        """
+        self.label, self.total = label, total
+        self.last = time.monotonic()
+        self.callback(label, done, total)
+        return done + self.every
+
+    def update(self, done):
+        """
+        Reports that done symbols have been processed, if the interval has
+        passed.
+
+        Returns:
+        --------
+        checkpoint: int
+        Index of the symbol at which update should next be called
+        """
+        if self.interval is None:
+            self.callback(self.label, done, self.total)
+        else:
+            now = time.monotonic()
+            if now - self.last >= self.interval:
+                self.last = now
+                self.callback(self.label, done, self.total)
+        return done + self.every
+
+    def finish(self):
+        """
+        Reports that the loop is complete.
+        """
+        self.callback(self.label, self.total, self.total)
+
+
+def begin(report, label, total, done=0):
+    """
+    Starts report, a Progress or None, on a loop over total symbols, starting
+    from symbol done.
+
+    Returns:
+    --------
+    checkpoint: int
+    Index of the symbol at which report.update should first be called, -1
+    which is never reached if report is None
+    """
+    if report is None:
+        return -1
+    return report.start(label, total, done)
+
+
+def end(report):
+    """
+    Finishes report, a Progress or None.
+    """
+    if report is not None:
+        report.finish()
@@ -0,0 +1,277 @@
+from bisect import bisect
+import bitio
+
+"""
+This file details an integer range coder, an arithmetic coder that works only
+with integer cumulative frequencies and renormalises a byte at a time. The
+model is quantised to a total of 2**total_bits so every symbol keeps a count of
+at least 1, which means the interval can never shrink to zero, and carries out
+of the low end of the interval are propagated through a cached byte as in the
+LZMA range coder.
+"""
+
+
+def quantise(frequencies, total_bits=16):
+    """
+    Scales symbol counts to integers summing to exactly 2**total_bits, keeping
+    every symbol with a non-zero count at 1 or more.
+
+    Parameters:
+    -----------
+    frequencies: dict
+    Alphabet and corresponding counts (or probabilities)
+    total_bits=16: int
+    log2 of the total of the quantised counts
+
+    Returns:
+    --------
+    freq: dict
+    Alphabet, in sorted order, and corresponding integer count
+    """
+    total = 1 << total_bits
+    symbols = sorted([a for a in frequencies if frequencies[a] > 0])
+    if len(symbols) > total:
+        raise ValueError("{} symbols do not fit in a total of {}".format(len(symbols), total))
+    if not symbols:
+        return {}
+
+    n = sum([frequencies[a] for a in symbols])
+    freq = dict([(a, max(1, int(frequencies[a]*total/n))) for a in symbols])
+
+    # hand out or take back the rounding error, largest counts first
+    error = total - sum(freq.values())
+    order = sorted(symbols, key=lambda a: freq[a], reverse=True)
+    k = 0
+    while error != 0:
+        a = order[k % len(order)]
+        if error > 0:
+            freq[a] += 1
+            error -= 1
+        elif freq[a] > 1:
+            freq[a] -= 1
+            error += 1
+        k += 1
+    return freq
+
+
+def decode_table(frequencies, total_bits=16):
+    """
+    Builds what decode needs from the model, so that it can be built once and
+    shared by many streams coded with the same counts.
+
+    Parameters:
+    -----------
+    frequencies: dict
+    Alphabet and corresponding counts, as given to encode
+    total_bits=16: int
+    log2 of the total the counts are quantised to, as given to encode
+
+    Returns:
+    --------
+    table: tuple
+    (alphabet, f, p, lookup) giving the symbols in order, their cumulative
+    and quantised counts, and the index of the symbol of every target count
+    if total_bits is at most 16, None otherwise
+    """
+    freq = quantise(frequencies, total_bits)
+    alphabet = list(freq)
+    f = [0]
+    for a in alphabet:
+        f.append(f[-1] + freq[a])
+    f.pop()
+    p = [freq[a] for a in alphabet]
+
+    # symbol lookup by target count, a table when it is small enough
+    lookup = None
+    if total_bits <= 16:
+        lookup = []
+        for a in range(len(alphabet)):
+            lookup.extend([a]*p[a])
+    return alphabet, f, p, lookup
+
+
+def _check(precision, total_bits):
+    if not 16 <= precision <= 62:
+        raise ValueError("Precision {} not in range 16 to 62 bits".format(precision))
+    if not 1 <= total_bits <= precision - 8:
+        raise ValueError("Total of 2**{} needs at most precision-8 = {} bits".format(total_bits, precision - 8))
+
+
+def encode(x, frequencies, precision=32, total_bits=16, y=None):
+    """
+    Encodes data using the integer range coder
+
+    Parameters:
+    -----------
+    x: bytes or str
+    Data to be compressed
+    frequencies: dict
+    Alphabet and corresponding counts
+    precision=32: int
+    Width in bits of the coder's range, at most 62
+    total_bits=16: int
+    log2 of the total the counts are quantised to, at most precision-8
+    y=None: bitio.BitWriter
+    Stream to append the encoded data to
+
+    Returns:
+    --------
+    y: bitio.BitWriter
+    x data encoded with the quantised counts
+    """
+    if y is None:
+        y = bitio.BitWriter()
+    for out in encode_iter([x], frequencies, precision, total_bits):
+        y.write(int.from_bytes(out, 'big'), 8*len(out))
+    return y
+
+
+def encode_iter(chunks, frequencies, precision=32, total_bits=16):
+    """
+    Generator version of encode that takes the data in chunks, yielding the
+    bytes output for each chunk and finally the bytes flushed at the end.
+
+    Parameters:
+    -----------
+    chunks: iterable of bytes or str
+    Data to be compressed, in order
+    frequencies: dict
+    Alphabet and corresponding counts over all the chunks
+    precision=32: int
+    Width in bits of the coder's range, at most 62
+    total_bits=16: int
+    log2 of the total the counts are quantised to, at most precision-8
+    """
+    _check(precision, total_bits)
+    freq = quantise(frequencies, total_bits)
+    cum = {}
+    f = 0
+    for a in freq:
+        cum[a] = f
+        f += freq[a]
+
+    mask = (1 << precision) - 1
+    top = 1 << (precision - 8)         # range is kept at or above this
+    carry_limit = 0xFF << (precision - 8)
+    shift = precision - 8
+
+    out = bytearray()
+    low, rng = 0, mask
+    cache, cache_size = 0, 1           # top byte of low waiting on a possible carry
+
+    for x in chunks:
+        for a in x:
+            r = rng >> total_bits
+            low += r*cum[a]
+            rng = r*freq[a]
+
+            while rng < top:
+                # shift the top byte out of low, unless a carry could still change it
+                if low < carry_limit or low > mask:
+                    carry = low >> precision
+                    out.append((cache + carry) & 0xFF)
+                    out.extend([(0xFF + carry) & 0xFF]*(cache_size-1))
+                    cache_size = 0
+                    cache = (low >> shift) & 0xFF
+                cache_size += 1
+                low = (low << 8) & mask
+                rng <<= 8
+
+        yield bytes(out)
+        out = bytearray()
+
+    # flush every byte of low
+    for k in range((precision + 7)//8 + 1):
+        if low < carry_limit or low > mask:
+            carry = low >> precision
+            out.append((cache + carry) & 0xFF)
+            out.extend([(0xFF + carry) & 0xFF]*(cache_size-1))
+            cache_size = 0
+            cache = (low >> shift) & 0xFF
+        cache_size += 1
+        low = (low << 8) & mask
+
+    yield bytes(out)
+
+
+def decode(y, frequencies, n, precision=32, total_bits=16, out=None, table=None):
+    """
+    Decodes data using the integer range coder
+
+    Parameters:
+    -----------
+    y: bitio.BitReader, bitio.BitWriter or bytes
+    Encoded data
+    frequencies: dict
+    Alphabet and corresponding counts, as given to encode
+    n: int
+    Number of symbols to decode
+    precision=32: int
+    Width in bits of the coder's range, as given to encode
+    total_bits=16: int
+    log2 of the total the counts are quantised to, as given to encode
+    out=None: writable bytes-like
+    Buffer to decode byte values into, see bitio.output
+    table=None: tuple
+    Model built by decode_table with the same total_bits, used instead of
+    frequencies if given
+
+    Returns:
+    --------
+    x: bytearray, memoryview if out is given, or list if frequencies has
+    symbols other than byte values
+    Decoded symbols
+    """
+    if table is None:
+        table = decode_table(frequencies, total_bits)
+    if out is None and not bitio.is_bytes(table[0]):
+        x = []
+        for block in decode_iter(y, frequencies, n, precision, total_bits, table=table):
+            x.extend(block)
+        return x
+
+    x = bitio.output(out, n)
+    k = 0
+    for block in decode_iter(y, frequencies, n, precision, total_bits, table=table):
+        x[k:k+len(block)] = bytes(block)
+        k += len(block)
+    return x
+
+
+def decode_iter(y, frequencies, n, precision=32, total_bits=16, chunk=1 << 16, table=None):
+    """
+    Generator version of decode, yielding the decoded symbols in lists of at
+    most chunk symbols so they can be written out as they are decoded.
+    """
+    _check(precision, total_bits)
+    if table is None:
+        table = decode_table(frequencies, total_bits)
+    alphabet, f, p, lookup = table
+
+    top = 1 << (precision - 8)
+    last = (1 << total_bits) - 1
+
+    y = bitio.reader(y)
+    y.skip(8)                          # the encoder's first byte only holds carries
+    code = y.read(precision)           # offset of the stream value from low
+    rng = (1 << precision) - 1
+
+    if lookup is not None:
+        find = lookup.__getitem__
+    else:
+        find = lambda target: bisect(f, target) - 1
+
+    for start in range(0, n, chunk):
+        x = min(chunk, n - start)*[0]
+        for k in range(len(x)):
+            r = rng >> total_bits
+            a = find(min(code//r, last))
+            x[k] = alphabet[a]
+            code -= r*f[a]
+            rng = r*p[a]
+
+            while rng < top:
+                code = (code << 8) | y.read(8)
+                rng <<= 8
+
+        yield x
@@ -0,0 +1,58 @@
+import adaptive_arithmetic
+from fenwick import FenwickTree
+from random import Random
+
+
+def test_fenwick():
+    rng = Random(0)
+    counts = [rng.randint(1, 20) for k in range(37)]
+    tree = FenwickTree(counts)
+    for k in range(200):
+        a = rng.randrange(37)
+        tree.add(a, 3)
+        counts[a] += 3
+    assert tree.total == sum(counts)
+    for a in range(37):
+        c = sum(counts[:a])
+        assert tree.cumulative(a) == c
+        assert tree.find(c) == (a, c)
+        assert tree.find(c + counts[a] - 1) == (a, c)
+        assert tree.find(c + 5*a, 5) == (a, c + 5*a)
+        assert tree.find(c + 5*a + counts[a] + 4, 5) == (a, c + 5*a)
+
+
+def test_round_trip():
+    with open('hamlet.txt', 'rb') as file:
+        data = file.read()[:5000]
+    for N, alpha in [(1500, 0.5), (10, 0.5), (10**6, 1)]:
+        y = adaptive_arithmetic.encode(data, N=N, alpha=alpha)
+        assert adaptive_arithmetic.decode(y, N=N, alpha=alpha) == data
+
+    x = bytes(range(256))*20
+    y = adaptive_arithmetic.encode(x, max_total=1000)
+    assert adaptive_arithmetic.decode(y, max_total=1000) == x
+
+
+def test_decay():
+    with open('hamlet.txt', 'rb') as file:
+        data = file.read()[:5000]
+    # decay divides the weight of new symbols by alpha, with counts scaled
+    # back down together once they reach max_total
+    for N, alpha, max_total in [(1, 0.5, 1 << 24), (3, 0.01, 1 << 12), (7, 0.9, 1000)]:
+        y = adaptive_arithmetic.encode(data, N=N, alpha=alpha, max_total=max_total)
+        assert adaptive_arithmetic.decode(y, N=N, alpha=alpha, max_total=max_total) == data
+
+    # the floor under every count keeps frequent decay better than uniform
+    assert len(adaptive_arithmetic.encode(data, N=1, alpha=0.5)) < 7.5*len(data)
+
+    freq = FenwickTree([1, 1, 3000, 5000])
+    assert adaptive_arithmetic._normalise(freq, 1000.5, 4096) == 1000.5/512
+    assert freq.counts == [1, 1, 6, 10]
+    assert adaptive_arithmetic._normalise(FenwickTree([5000, 10]), 1.0, 4096) == 1.0
+
+    # weights keep 8 fractional bits once scaled
+    assert adaptive_arithmetic._scale(256, 1 << 24) == 256
+    assert adaptive_arithmetic._scale(256, 1000) == 1
+    freq = FenwickTree([1, 1, 3000, 5000])
+    assert adaptive_arithmetic._normalise(freq, 1000.5, 4096, 256) == 1000.5/2
+    assert freq.counts == [1, 1, 1500, 2500]
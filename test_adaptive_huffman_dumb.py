@@ -0,0 +1,35 @@
+import adaptive_huffman_dumb as dumb
+import vl_codes
+import trees
+from random import Random
+
+
+def test_round_trip():
+    with open('hamlet.txt', 'rb') as file:
+        data = file.read()[:3000]
+    for N, alpha in [(10, 0.5), (100, 0.9), (10**9, 1)]:
+        y = dumb.encode(data, N, alpha)
+        assert dumb.decode(y, N, alpha) == data
+
+
+def test_cached_tree():
+    rng = Random(0)
+    freq = dict([(chr(a), 1) for a in range(40)])
+    tree = dumb.CachedHuffman(freq)
+    for k in range(300):
+        a = chr(rng.randrange(10) if k % 3 else rng.randrange(40))
+        freq[a] += rng.choice([1, 1, 5])
+        tree.update(a, freq[a])
+        if k % 50 == 0:
+            freq = dict([(b, f*0.7) for b, f in freq.items()])
+            tree.rescale(freq)
+
+        # the same tree vl_codes.huffman builds from scratch
+        xt = vl_codes.huffman(freq)
+        assert [xt[node][:2] for node in range(len(freq), len(xt))] == [
+            [tree.parent[node], tree.children[node]] for node in range(len(freq), len(xt))]
+        codebook = trees.xtree2code(xt)
+        for b in freq:
+            code, length = tree.code(b)
+            assert [(code >> j) & 1 for j in range(length - 1, -1, -1)] == codebook[b]
+    assert tree.merges < 300
@@ -0,0 +1,119 @@
+import io
+import os
+import archive
+import camzip
+import camunzip
+import container
+import vl_codes
+import pytest
+from random import Random
+
+
+def small_files():
+    # many short extracts of text and a few files of other bytes
+    rng = Random(0)
+    with open('hamlet.txt', 'rb') as file:
+        text = file.read()
+    members = []
+    for i in range(100):
+        k = rng.randrange(len(text) - 2000)
+        members.append(('log%03d.txt' % i, text[k:k+rng.randrange(100, 2000)]))
+    for i in range(20):
+        members.append(('bin%02d' % i, bytes(rng.choices(range(200, 256), k=500))))
+    members.append(('empty', b''))
+    return members
+
+
+def test_round_trip():
+    members = small_files()
+    for method in ['huffman', 'canonical', 'range']:
+        f = io.BytesIO()
+        archive.write(f, method, members, 2, 1000)
+        f.seek(0)
+        assert list(archive.read(f)) == members
+        f.seek(0)
+        assert archive.extract(f, 'log042.txt') == members[42][1]
+
+
+def test_shared_model():
+    members = small_files()
+    separate = 0
+    for name, x in members:
+        f = io.BytesIO()
+        container.write(f, 'huffman', [x] if x else [], vl_codes.count_symbols(x))
+        separate += len(f.getvalue())
+    f = io.BytesIO()
+    archive.write(f, 'huffman', members, 2)
+    assert len(f.getvalue()) < 0.95*separate
+
+    # text and the other files are given a model each
+    f.seek(0)
+    method, models, entries = archive.read_directory(f)
+    assert len(models) == 2
+    assert len(set([group for name, group, n, offset in entries[:100]])) == 1
+    assert len(set([group for name, group, n, offset in entries[100:120]])) == 1
+
+
+def test_extract_alone():
+    members = small_files()
+    f = io.BytesIO()
+    archive.write(f, 'huffman', members)
+    f.seek(0)
+    method, models, entries = archive.read_directory(f)
+    assert [(name, n) for name, group, n, offset in entries] == [(name, len(x)) for name, x in members]
+
+    # other members are not decoded, so corrupting them does not matter
+    data = bytearray(f.getvalue())
+    for name, group, n, offset in entries[1:]:
+        if n:
+            data[offset + 12] ^= 0xff
+    f = io.BytesIO(data)
+    assert archive.extract(f, 'log000.txt') == members[0][1]
+    f.seek(0)
+    with pytest.raises(ValueError):
+        archive.extract(f, 'log001.txt')
+    f.seek(0)
+    with pytest.raises(KeyError):
+        archive.extract(f, 'missing')
+
+
+def test_rejected():
+    with pytest.raises(ValueError):
+        archive.write(io.BytesIO(), 'arithmetic', small_files())
+    for name in ['/etc/passwd', '../x', 'a/../../x', 'a\\..\\x', 'C:x', '\\\\host\\x', '']:
+        with pytest.raises(ValueError):
+            archive.write(io.BytesIO(), 'huffman', [(name, b'abc')])
+    archive.check_name('a/b..c/..d')
+
+
+def test_crafted_name():
+    # an archive written elsewhere may name a member anything
+    f = io.BytesIO()
+    archive.write(f, 'huffman', [('abc', b'abcabc')])
+    data = f.getvalue().replace(b'abc', b'../', 1)
+    assert data.count(b'../') == 1 and data.endswith(b'../')
+    f = io.BytesIO(data)
+    with pytest.raises(ValueError):
+        archive.read_directory(f)
+    f.seek(0)
+    with pytest.raises(ValueError):
+        archive.extract(f, '../')
+
+
+def test_truncated():
+    f = io.BytesIO()
+    archive.write(f, 'huffman', small_files(), 2)
+    method, models, entries = archive.read_directory(io.BytesIO(f.getvalue()))
+    data = f.getvalue()
+    for end in [archive._HEADER.size + 2, archive._HEADER.size + 4 + len(models[0]) // 2, len(data) - 3]:
+        with pytest.raises(ValueError, match='Truncated'):
+            archive.read_directory(io.BytesIO(data[:end]))
+
+
+def test_camzip_archive():
+    camzip.camzip_archive('huffman', ['hamlet.txt'], 'hamlet.txt.czar')
+    assert camunzip.camunzip_list('hamlet.txt.czar') == [('hamlet.txt', os.path.getsize('hamlet.txt'))]
+    camunzip.camunzip_archive('hamlet.txt.czar', ['hamlet.txt'])
+    with open('hamlet.txt', 'rb') as f, open('hamlet.txt.cuz', 'rb') as g:
+        assert f.read() == g.read()
+    os.remove('hamlet.txt.czar')
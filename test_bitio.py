@@ -0,0 +1,79 @@
+import bitio
+import vl_codes
+import numpy as np
+import pytest
+from random import Random
+
+
+def test_bits2bytes_round_trip():
+    rng = Random(0)
+    for n in range(0, 40):
+        x = [rng.randint(0, 1) for k in range(n)]
+        y = vl_codes.bits2bytes(x)
+        assert len(y) == (n + 3 + 7)//8
+        assert y[0] >> 5 == (8 - (n + 3) % 8) % 8
+        assert vl_codes.bytes2bits(y) == x
+
+
+def test_writer_matches_list():
+    rng = Random(1)
+    x = [rng.randint(0, 1) for k in range(1000)]
+    w = bitio.BitWriter()
+    for k in range(0, len(x), 7):
+        w.write_bits(x[k:k+7])
+    assert len(w) == len(x)
+    assert list(w) == x
+    assert w[3:20] == x[3:20]
+    assert w[-1] == x[-1]
+
+    corrupted = w.copy()
+    corrupted[400] ^= 1
+    assert corrupted[400] != w[400]
+    assert bytes(vl_codes.bits2bytes(x)) == w.getvalue()
+
+
+def test_reader():
+    w = bitio.BitWriter()
+    w.write(0b1011, 4)
+    w.write_run(1, 70)
+    w.write(5, 3)
+    r = bitio.BitReader(w.getvalue())
+    assert len(r) == 77
+    assert r.read(4) == 0b1011
+    assert r.read(70) == (1 << 70) - 1
+    assert r.peek(3) == 5
+    assert r.read(8) == 5 << 5  # zeros past the end
+    assert r.remaining == 0
+
+
+def test_symbols():
+    x = bytes(range(256))
+    for data in [x, bytearray(x), memoryview(x), np.frombuffer(x, dtype=np.uint8).reshape(16, 16),
+                 np.frombuffer(x, dtype=np.int8), x.decode('latin-1')]:
+        view = bitio.symbols(data)
+        assert (view.format, view.ndim, list(view)) == ('B', 1, list(x))
+    buffer = bytearray(x)
+    bitio.symbols(buffer)[0] = 7  # a view, not a copy
+    assert buffer[0] == 7
+
+
+def test_output():
+    assert bitio.output(None, 5) == bytearray(5)
+    out = bytearray(8)
+    x = bitio.output(out, 5)
+    x[4] = 7
+    assert len(x) == 5 and out[4] == 7
+    x = bitio.output(memoryview(out)[6:])
+    bitio.store(x, 1, 9)
+    assert out[7] == 9
+    with pytest.raises(ValueError):
+        bitio.store(x, 2, 0)
+    for a, n in [(b'read only', 2), (out, 9)]:
+        with pytest.raises(ValueError):
+            bitio.output(a, n)
+
+    # without a buffer the output grows as it is stored
+    x = bitio.output()
+    for k in range(3):
+        bitio.store(x, k, k)
+    assert x == bytes([0, 1, 2])
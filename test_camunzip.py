@@ -1,5 +1,9 @@
 import camunzip
+import camzip
 import filecmp
+import os
+import shutil
+import pytest
 
 
 def test_shanon_fano():
@@ -18,3 +22,57 @@ def test_arithmetic():
     camunzip.camunzip("hamlet.txt.cza")
     assert filecmp.cmp('hamlet.txt', 'hamlet.txt'+'.cuz')
     return
+
+
+def test_canonical():
+    camunzip.camunzip("hamlet.txt.czc")
+    assert filecmp.cmp('hamlet.txt', 'hamlet.txt'+'.cuz')
+    return
+
+
+def test_range():
+    camunzip.camunzip("hamlet.txt.czr")
+    assert filecmp.cmp('hamlet.txt', 'hamlet.txt'+'.cuz')
+    return
+
+
+def test_renamed():
+    # the codec is read from the file, not its name
+    shutil.copy("hamlet.txt.czr", "hamlet.txt.tmp")
+    camunzip.camunzip("hamlet.txt.tmp")
+    os.remove("hamlet.txt.tmp")
+    assert filecmp.cmp('hamlet.txt', 'hamlet.txt'+'.cuz')
+    return
+
+
+def test_blocks():
+    camzip.camzip_blocks("range", "hamlet.txt", 2, 1 << 14)
+    camunzip.camunzip("hamlet.txt.czr", 2)
+    camzip.camzip("range", "hamlet.txt")
+    assert filecmp.cmp('hamlet.txt', 'hamlet.txt'+'.cuz')
+    return
+
+
+def test_range_slice():
+    with open('hamlet.txt', 'rb') as f:
+        x = f.read()
+    assert camunzip.camunzip_range("hamlet.txt.czh", 1000, 2000) == x[1000:2000]
+    return
+
+
+def test_mmap():
+    camzip.camzip("canonical", "hamlet.txt", 1 << 14)
+    camunzip.camunzip_mmap("hamlet.txt.czc")
+    camzip.camzip("canonical", "hamlet.txt")
+    assert filecmp.cmp('hamlet.txt', 'hamlet.txt'+'.cuz')
+
+    # a corrupted block is reported as such, with the output file unmapped
+    with open("hamlet.txt.czc", 'rb') as f:
+        y = bytearray(f.read())
+    y[len(y)//2] ^= 0xff
+    with open("hamlet.txt.tmp", 'wb') as f:
+        f.write(y)
+    with pytest.raises(ValueError):
+        camunzip.camunzip_mmap("hamlet.txt.tmp")
+    os.remove("hamlet.txt.tmp")
+    return
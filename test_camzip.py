@@ -1,4 +1,5 @@
 import camzip
+import vl_codes
 
 def test_shanon_fano():
     camzip.camzip("shannon_fano", "hamlet.txt")
@@ -11,3 +12,48 @@ def test_huffman():
 def test_arithmetic():
     camzip.camzip("arithmetic", "hamlet.txt")
     return
+
+def test_canonical():
+    camzip.camzip("canonical", "hamlet.txt")
+    return
+
+def test_range():
+    camzip.camzip("range", "hamlet.txt")
+    return
+
+def test_stream():
+    for method in ["huffman", "canonical", "range"]:
+        camzip.camzip(method, "hamlet.txt")
+        with open("hamlet.txt.cz" + method[0], 'rb') as f:
+            y = f.read()
+        camzip.camzip_stream(method, "hamlet.txt")
+        with open("hamlet.txt.cz" + method[0], 'rb') as f:
+            assert f.read() == y
+    return
+
+def test_blocks():
+    camzip.camzip_blocks("huffman", "hamlet.txt", 1, 1 << 14)
+    with open("hamlet.txt.czh", 'rb') as f:
+        y = f.read()
+    camzip.camzip_blocks("huffman", "hamlet.txt", 2, 1 << 14)
+    with open("hamlet.txt.czh", 'rb') as f:
+        assert f.read() == y
+    camzip.camzip("huffman", "hamlet.txt")
+    return
+
+def test_count_frequencies():
+    with open("hamlet.txt", 'rb') as f:
+        frequencies = vl_codes.probability_dict(f.read())[1]
+    assert camzip.count_frequencies("hamlet.txt", 10000, 2) == frequencies
+    return
+
+def test_mmap():
+    for method in ["huffman", "arithmetic", "range"]:
+        camzip.camzip(method, "hamlet.txt", 1 << 14)
+        with open("hamlet.txt.cz" + method[0], 'rb') as f:
+            y = f.read()
+        camzip.camzip_mmap(method, "hamlet.txt", 1 << 14)
+        with open("hamlet.txt.cz" + method[0], 'rb') as f:
+            assert f.read() == y
+        camzip.camzip(method, "hamlet.txt")
+    return
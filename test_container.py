@@ -0,0 +1,106 @@
+import io
+import container
+import vl_codes
+import pytest
+from random import Random
+
+
+def round_trip(method, x, block_size):
+    frequencies = {}
+    for a in x:
+        frequencies[a] = frequencies.get(a, 0) + 1
+    blocks = [x[k:k+block_size] for k in range(0, len(x), block_size)]
+    f = io.BytesIO()
+    container.write(f, method, blocks, frequencies, block_size)
+    f.seek(0)
+    return b''.join(container.read(f)), f
+
+
+def test_round_trip():
+    rng = Random(0)
+    x = bytes([rng.choice(b'abcdefgh\x00\xff') for k in range(5000)])
+    for method in container.CODECS:
+        for data in [x, b'', b'aaaa']:
+            y, f = round_trip(method, data, 1000)
+            assert y == data
+
+
+def test_decode_into():
+    x = bytes(range(256)) + b'abracadabra'*300
+    frequencies = vl_codes.count_symbols(x)
+    for method in container.CODECS:
+        state = container.coder(method, container.decode_model(method, container.encode_model(method, frequencies)))
+        y = container.encode_block(method, state, x)
+        out = bytearray(len(x) + 3)
+        view = container.decode_block(method, state, y, len(x), memoryview(out)[3:])
+        assert view == x and out[3:] == x and out[:3] == bytes(3)
+
+
+def test_model():
+    frequencies = {0: 1, 65: 300, 255: 10**12}
+    model = container.encode_model('range', frequencies)
+    assert len(model) == 2 + 2 + 3 + 7
+    assert container.decode_model('range', model) == frequencies
+
+
+def test_checksum():
+    x = b'abracadabra'*100
+    y, f = round_trip('huffman', x, 256)
+    data = bytearray(f.getvalue())
+    data[-3] ^= 0x10
+    with pytest.raises(ValueError):
+        b''.join(container.read(io.BytesIO(data)))
+    with pytest.raises(ValueError):
+        list(container.read(io.BytesIO(b'PK\x03\x04' + bytes(20))))
+
+
+def test_independent():
+    rng = Random(1)
+    x = bytes([rng.choice(b'abc\x00') for k in range(3000)]) + bytes(range(256))*4
+    blocks = [x[k:k+500] for k in range(0, len(x), 500)]
+    for method in container.CODECS:
+        out = []
+        for workers in [1, 2]:
+            f = io.BytesIO(b'junk')
+            f.seek(4)
+            container.write_independent(f, method, blocks, len(x), 500, workers)
+            f.seek(4)
+            assert b''.join(container.read(f, workers)) == x
+            out.append(f.getvalue())
+        assert out[0] == out[1]
+
+
+def test_read_range():
+    rng = Random(2)
+    x = bytes([rng.choice(b'abcdefgh\x00\xff') for k in range(3000)])
+    blocks = [x[k:k+256] for k in range(0, len(x), 256)]
+    y, f = round_trip('arithmetic', x, 256)
+    g = io.BytesIO()
+    container.write_independent(g, 'range', blocks, len(x), 256, 1)
+    for data in [f.getvalue(), g.getvalue()]:
+        for start, end in [(0, 1), (255, 257), (1000, 2500), (2990, 4000), (5, 5), (3000, 3001)]:
+            assert container.read_range(io.BytesIO(data), start, end) == x[start:end]
+
+
+def test_written_as():
+    # the arithmetic coder fails its checksum on this, the range coder does not
+    x = b'a'*1000000 + b'bc'
+    y, f = round_trip('arithmetic', x, 1 << 20)
+    assert y == x
+    f.seek(0)
+    assert container.read_header(f)[0] == 'range'
+    with pytest.raises(ValueError):
+        container.write_header(io.BytesIO(), 'arithmetic', 0, b'')
+
+
+def test_unindexed():
+    # version 1 containers have no index but can still be read
+    x = b'abracadabra'*100
+    y, f = round_trip('huffman', x, 256)
+    data = f.getvalue()
+    method, n, model, block_size, version = container.read_header(io.BytesIO(data))
+    start = container._HEADER.size + len(model)
+    nindex = container._OFFSET.size*container.block_count(n, block_size)
+    data = data[:4] + bytes([container.UNINDEXED_VERSION]) + data[5:start] + data[start+nindex:]
+    assert b''.join(container.read(io.BytesIO(data))) == x
+    assert container.read_range(io.BytesIO(data), 500, 800) == x[500:800]
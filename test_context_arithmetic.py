@@ -0,0 +1,26 @@
+import numpy as np
+import context_arithmetic
+
+
+def test_transition_matrix():
+    data = 'abracadabra'
+    M = context_arithmetic.transition_matrix(data)
+    assert M.shape == (ord('r') + 1, ord('r') + 1)
+    assert M[ord('a'), ord('b')] == 0.5
+    assert M[ord('r'), ord('a')] == 1
+    assert np.allclose(M[ord('a')].sum(), 1) and M[ord('e')].sum() == 0
+
+
+def test_round_trip():
+    with open('hamlet.txt', 'rb') as file:
+        data = file.read()[:20000]
+    for x in [data, b'a', b'abcabc\x00\xff']:
+        y, transition, p0 = context_arithmetic.encode(x)
+        assert context_arithmetic.decode(y, transition, p0) == x
+        out = bytearray(len(x))
+        context_arithmetic.decode(y, transition, p0, out=memoryview(out))
+        assert out == x
+
+    # any buffer of bytes, encoded as its contents
+    y, transition, p0 = context_arithmetic.encode(np.frombuffer(data, dtype=np.uint8))
+    assert y == context_arithmetic.encode(data)[0]
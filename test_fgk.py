@@ -0,0 +1,33 @@
+import fgk
+
+
+def test_round_trip():
+    with open('hamlet.txt', 'rb') as file:
+        data = file.read()[:5000]
+    y = fgk.encode(data)
+    assert fgk.decode(y) == data
+
+    x = bytes(range(256))*20
+    assert fgk.decode(fgk.encode(bytearray(x))) == x
+
+    # a smaller alphabet for 7-bit text
+    assert fgk.decode(fgk.encode(data, alphabet=128), alphabet=128) == data
+
+    # into a buffer of the caller's, returning the part written
+    out = bytearray(len(data) + 100)
+    assert fgk.decode(y, out=out) == data and out[:len(data)] == data
+
+
+def test_tree():
+    sib_list, alphabet_pointers = fgk.init_tree()
+    assert len(sib_list) == 255
+    for a in 'abracadabra'*20:
+        slots = [alphabet_pointers[ord(a)]]
+        while sib_list.fp[slots[-1] >> 1] != -1:
+            slots.append(sib_list.fp[slots[-1] >> 1])
+        fgk.modify_tree(sib_list, alphabet_pointers, slots)
+    for a, s in alphabet_pointers.items():
+        assert sib_list.child[s] == fgk.leaf(a)
+    for s, c in enumerate(sib_list.child):
+        if not c & 1:
+            assert sib_list.fp[c >> 1] == s
@@ -0,0 +1,34 @@
+import ppm
+import context_arithmetic
+
+
+def test_round_trip():
+    with open('hamlet.txt', 'rb') as file:
+        data = file.read()[:20000]
+    for order in [0, 1, 3]:
+        y = ppm.encode(data, order)
+        assert ppm.decode(y, order) == data
+    assert ppm.decode(ppm.encode(b'')) == b''
+
+    x = bytes(range(256))*4 + bytes(500)
+    assert ppm.decode(ppm.encode(x, 2), 2) == x
+
+
+def test_beats_order_1():
+    with open('hamlet.txt', 'rb') as file:
+        data = file.read()[:20000]
+    y, transition, p0 = context_arithmetic.encode(data)
+    assert len(ppm.encode(data, 3)) < len(y)
+
+
+def test_memory_cap():
+    with open('hamlet.txt', 'rb') as file:
+        data = file.read()[:20000]
+    for policy in ['reset', 'evict']:
+        model = ppm.ContextModel(3, max_entries=2000, policy=policy)
+        coder = ppm.Encoder(ppm.bitio.BitWriter())
+        for k in range(len(data)):
+            model.encode(coder, data[max(0, k-3):k], data[k])
+            assert model.entries <= 2000
+        y = ppm.encode(data, 3, max_entries=2000, policy=policy)
+        assert ppm.decode(y, 3, max_entries=2000, policy=policy) == data
@@ -0,0 +1,26 @@
+import queue
+import arithmetic
+import fgk
+import progress
+import vl_codes
+
+
+def test_progress():
+    x = b'abracadabra'*100
+    p, frequencies = vl_codes.probability_dict(x)
+    calls = []
+    report = progress.Progress(lambda *a: calls.append(a), every=100)
+    y = arithmetic.encode(x, p, report)
+    assert calls[0] == ('Arithmetic encoded', 0, len(x))
+    assert calls[-1] == ('Arithmetic encoded', len(x), len(x))
+    assert [done for label, done, total in calls] == list(range(0, len(x), 100)) + [len(x)]
+    assert arithmetic.encode(x, p).getvalue() == y.getvalue()
+
+
+def test_queue():
+    q = queue.Queue()
+    report = progress.Progress(progress.QueueCallback(q), every=1000, interval=3600)
+    x = fgk.decode(fgk.encode(b'hello world'*200), report)
+    assert x == b'hello world'*200
+    # the interval never passes so only the start and end are reported
+    assert q.qsize() == 2
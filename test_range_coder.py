@@ -0,0 +1,35 @@
+import range_coder
+import vl_codes
+
+
+def test_encode_decode():
+    with open('hamlet.txt', 'rb') as file:
+        data = file.read()
+
+    p, frequencies = vl_codes.probability_dict(data)
+    for precision, total_bits in [(32, 16), (24, 12), (62, 40)]:
+        y = range_coder.encode(data, frequencies, precision, total_bits)
+        x = range_coder.decode(y.getvalue(), frequencies, len(data), precision, total_bits)
+        assert bytes(x) == data
+
+        # with the model built once, as for every block of a container
+        table = range_coder.decode_table(frequencies, total_bits)
+        x = range_coder.decode(y, {}, len(data), precision, total_bits, table=table)
+        assert bytes(x) == data
+
+
+def test_skewed():
+    # arithmetic.encode gives a zero interval for the rare symbols
+    x = [0]*1000 + [1, 2]
+    frequencies = {0: 10**10, 1: 1, 2: 1}
+    freq = range_coder.quantise(frequencies, 16)
+    assert sum(freq.values()) == 2**16 and min(freq.values()) == 1
+
+    y = range_coder.encode(x, frequencies)
+    assert range_coder.decode(y, frequencies, len(x)) == bytes(x)
+
+    # symbols other than bytes are returned as a list
+    frequencies = {0: 10**10, 300: 1, 2: 1}
+    x = [0]*1000 + [300, 2]
+    y = range_coder.encode(x, frequencies)
+    assert range_coder.decode(y, frequencies, len(x)) == x
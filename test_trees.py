@@ -0,0 +1,38 @@
+import trees
+import vl_codes
+
+
+def test_tree2xtree():
+    xt = trees.tree2xtree([3, 3, 4, 4, -1], ['a', 'b', 'c'])
+    assert xt == [[3, [], 'a'], [3, [], 'b'], [4, [], 'c'], [4, [0, 1], '1003'], [-1, [2, 3], '1004']]
+    assert trees.tree2code([3, 3, 4, 4, -1]) == {'1000': [1, 0], '1001': [1, 1], '1002': [0]}
+    assert trees.code2tree(trees.tree2code([3, 3, 4, 4, -1])) == [-1, 0, 1, 1, 0]
+
+
+def test_array_tree():
+    c = {'0': [1], '1': [0, 1], '2': [0, 0, 1], '3': [0, 0, 0]}
+    at = trees.code2array(c)
+    assert at.root == 0
+    assert trees.array2xtree(at) == trees.code2xtree(c)
+    assert trees.array2code(at) == trees.xtree2code(trees.code2xtree(c))
+
+    p = dict([(chr(a), a + 1) for a in range(60)])
+    xt = vl_codes.huffman(p)
+    at = trees.xtree2array(xt)
+    assert at.root == len(xt) - 1
+    assert trees.array2xtree(at) == xt
+    assert trees.array2code(at) == trees.xtree2code(xt)
+
+    # a codeword 1 with no codeword starting 0 leaves child 0 empty
+    at = trees.code2array({'a': [1, 0], 'b': [1, 1]})
+    assert (at.child0[0], at.child1[0]) == (-1, 1)
+    assert trees.array2xtree(at)[0] == [-1, [-1, 1], '0']
+
+
+def test_vl_decode():
+    x = b'abracadabra'*50
+    p, freq = vl_codes.probability_dict(x)
+    c = vl_codes.shannon_fano(p)
+    y = vl_codes.vl_encode(x, c)
+    assert bytes(vl_codes.vl_decode(y, trees.code2xtree(c))) == x
+    assert bytes(vl_codes.vl_decode(y, trees.code2array(c))) == x
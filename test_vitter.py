@@ -0,0 +1,65 @@
+import vitter
+
+
+def test_round_trip():
+    with open('hamlet.txt', 'rb') as file:
+        data = file.read()[:5000]
+    for N, alpha, remove in [(200, 0.5, False), (50, 0.3, True), (10**9, 1, False)]:
+        y = vitter.vitter_encode(data, N, alpha, remove)
+        assert vitter.vitter_decode(y, N, alpha, remove) == data
+
+    x = bytes(range(255, -1, -1))*20
+    y = vitter.vitter_encode(memoryview(x), 100, 0.5, True)
+    assert vitter.vitter_decode(y, 100, 0.5, True) == x
+    y = vitter.vitter_encode(data, alphabet=128)
+    assert vitter.vitter_decode(y, alphabet=128) == data
+
+
+def test_leaders():
+    with open('hamlet.txt', 'rb') as file:
+        data = file.read()[:3000]
+    sib_list, alphabet_pointers = vitter.init_tree(data[0])
+    for k, a in enumerate(data[1:]):
+        if alphabet_pointers[a] == -1:
+            vitter.add_symbol(sib_list, alphabet_pointers, a)
+        vitter.modify_tree_vitter(sib_list, alphabet_pointers, a)
+        if k % 500 == 0:
+            sib_list, alphabet_pointers = vitter.decay_list(sib_list, alphabet_pointers, 0.5)
+        count = sib_list.count
+        ranked = [count[r ^ 1] for r in range(len(count))]
+        assert ranked == sorted(ranked, reverse=True)
+        # weight 0 is only NULL's, whose leader add_symbol sets
+        assert dict([(c, r) for c, r in sib_list.leader.items() if c]) == dict(
+            [(c, ranked.index(c)) for c in set(ranked) if c])
+    vitter.error_check_tree(sib_list)
+
+
+def test_decay():
+    sib_list, alphabet_pointers = vitter.init_tree(ord('a'))
+    for a in 'bbcccdddd':
+        if alphabet_pointers[ord(a)] == -1:
+            vitter.add_symbol(sib_list, alphabet_pointers, ord(a))
+        vitter.modify_tree_vitter(sib_list, alphabet_pointers, ord(a))
+    vitter.error_check_tree(sib_list)
+
+    sib_list, alphabet_pointers = vitter.decay_list(sib_list, alphabet_pointers, 0.5, remove=True)
+    assert alphabet_pointers[ord('a')] == -1
+    assert [sib_list.count[alphabet_pointers[ord(a)]] for a in 'bcd'] == [1, 1, 2]
+    assert sib_list.count[alphabet_pointers[vitter.NULL]] == 0
+    assert len(sib_list) == 3
+    vitter.error_check_tree(sib_list)
+
+    # decaying again rebuilds the same list in place
+    tree = sib_list
+    sib_list, alphabet_pointers = vitter.decay_list(sib_list, alphabet_pointers, 0.5, remove=True)
+    assert sib_list is tree
+    assert [alphabet_pointers[ord(a)] for a in 'bcd'] == [-1, -1, 1]
+    assert (sib_list.count, sib_list.fp, sib_list.leader) == ([0, 1], [-1], {1: 0, 0: 1})
+
+
+def test_empty_tree():
+    # frequent decay with removal empties the tree, after which symbols are
+    # sent as literals until it regrows
+    data = bytes([33 + (7*k) % 90 for k in range(3000)])
+    y = vitter.vitter_encode(data, 3, 0.5, True)
+    assert vitter.vitter_decode(y, 3, 0.5, True) == data
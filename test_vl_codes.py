@@ -0,0 +1,98 @@
+import bitio
+import trees
+import vl_codes
+import pytest
+from random import Random
+
+
+def test_decode_table():
+    with open('hamlet.txt', 'rb') as file:
+        data = file.read()
+
+    p, frequencies = vl_codes.probability_dict(data)
+    xt = vl_codes.huffman(p)
+    c = trees.xtree2code(xt)
+    y = vl_codes.vl_encode(data, c)
+    for k in [1, 4, 9]:
+        assert bytes(vl_codes.vl_decode_table(y, vl_codes.decode_table(xt, k))) == data
+
+    # straight into a buffer, only the part written is returned
+    out = bytearray(len(data) + 10)
+    assert vl_codes.vl_decode_table(y, vl_codes.decode_table(xt), out) == data
+    assert out[:len(data)] == data
+    assert vl_codes.vl_decode(y, xt, memoryview(out)[5:]) == data
+    with pytest.raises(ValueError):
+        vl_codes.vl_decode_table(y, vl_codes.decode_table(xt), bytearray(100))
+
+
+def test_decode_table_long_codes():
+    # dyadic source gives codewords up to 19 bits, beyond two table levels
+    p = dict([(a, 2.0**-(a+1)) for a in range(19)])
+    p[19] = 2.0**-19
+    c = trees.xtree2code(vl_codes.huffman(p))
+    rng = Random(0)
+    x = rng.choices(list(p), weights=list(p.values()), k=2000) + [18, 19]
+    y = vl_codes.vl_encode(x, c)
+    assert vl_codes.vl_decode_table(y, vl_codes.decode_table(c, 6)) == bytes(x)
+    assert vl_codes.vl_decode_table(y.getvalue(), vl_codes.decode_table(c, 6)) == bytes(x)
+
+    # symbols other than bytes are returned as a list
+    c = dict([(chr(0x3b1 + a), c[a]) for a in c])
+    x = [chr(0x3b1 + a) for a in x]
+    y = vl_codes.vl_encode(x, c)
+    assert vl_codes.vl_decode_table(y, vl_codes.decode_table(c, 6)) == x
+    assert vl_codes.vl_decode(y, trees.code2xtree(c)) == x
+
+
+def test_canonical_code():
+    with open('hamlet.txt', 'rb') as file:
+        data = file.read()
+
+    p, frequencies = vl_codes.probability_dict(data)
+    lengths = vl_codes.code_lengths(vl_codes.huffman(p))
+    c = vl_codes.canonical_code(lengths)
+    assert vl_codes.code_lengths(c) == lengths
+
+    y = bitio.BitWriter()
+    vl_codes.write_code_lengths(y, lengths)
+    y = vl_codes.vl_encode(data, c, y)
+
+    y = bitio.BitReader(y.getvalue())
+    c = vl_codes.canonical_code(vl_codes.read_code_lengths(y))
+    assert bytes(vl_codes.vl_decode_table(y, vl_codes.decode_table(c))) == data
+
+
+def test_huffman_max_length():
+    p = dict([(a, 2.0**-(a+1)) for a in range(19)])
+    p[19] = 2.0**-19
+    assert max([len(a) for a in trees.xtree2code(vl_codes.huffman(p)).values()]) == 19
+
+    for max_length in [5, 8, 12]:
+        c = trees.xtree2code(vl_codes.huffman(p, max_length=max_length))
+        assert max([len(a) for a in c.values()]) == max_length
+        assert sum([2.0**-len(a) for a in c.values()]) == 1.0
+        assert vl_codes.code_lengths(c) == vl_codes.package_merge(p, max_length)
+
+
+def test_vl_encode_array():
+    with open('hamlet.txt', 'rb') as file:
+        data = file.read()
+
+    p, frequencies = vl_codes.probability_dict(data)
+    for c in [trees.xtree2code(vl_codes.huffman(p)), vl_codes.shannon_fano(p)]:
+        for prefix in [[], [1], [0, 1, 1, 0, 1]]:
+            y = vl_codes.vl_encode(list(data[:5000]), c, bitio.BitWriter(prefix))
+            y_array = vl_codes.vl_encode_array(data[:5000], c, bitio.BitWriter(prefix), chunk=777)
+            assert len(y_array) == len(y)
+            assert y_array.getvalue() == y.getvalue()
+
+
+def test_count_symbols():
+    data = bytes(range(0, 256, 3))*7 + b'\x00'
+    frequencies = vl_codes.count_symbols(data)
+    assert list(frequencies) == sorted(set(data))
+    assert frequencies[0] == 8 and frequencies[3] == 7
+    assert vl_codes.count_symbols(memoryview(data)) == frequencies
+    assert vl_codes.count_symbols('abca') == {'a': 2, 'b': 1, 'c': 1}
+    assert vl_codes.merge_frequencies([vl_codes.count_symbols(data[:100]),
+                                       vl_codes.count_symbols(data[100:])]) == frequencies
@@ -76,11 +76,10 @@ def xtree2newick(xt, labels=[], n=-1):
 
 
 def tree2xtree(t, labels=[]):
-    xt = [[] for node in t]
-    for node in range(len(t)):
-        children = [ind for ind in range(len(t)) if t[ind] == node]
-        xt[node].append(t[node])
-        xt[node].append(children)
+    xt = [[t[node], []] for node in range(len(t))]
+    for node in range(len(t)):  # one pass, so children are in increasing order
+        if t[node] != -1:
+            xt[t[node]][1].append(node)
 
     # if tree only partially labeled or no labels, use partial labels
     # and natural numbering for remaining nodes, starting from leaves first
@@ -104,17 +103,29 @@ def xtree2tree(xt):
 
 
 def xtree2code(xt):
-    leaves = [ind for ind in range(len(xt)) if len(xt[ind][1]) == 0]
+    # which number child every node is, the first place it appears in its parent
+    nchild = [None]*len(xt)
+    for node in range(len(xt)):
+        for ind in range(len(xt[node][1]) - 1, -1, -1):
+            if xt[node][1][ind] != -1:
+                nchild[xt[node][1][ind]] = ind
+
+    # codewords of the nodes, each found from that of its parent, so that
+    # every node is visited once
+    codewords = [None]*len(xt)
     code = {}
-    for leaf in leaves:
-        codeword = []
+    for leaf in range(len(xt)):
+        if len(xt[leaf][1]) != 0:
+            continue
+        path = []
         node = leaf
-        while xt[node][0] != -1:  # while node is not root
-            parent = xt[node][0]  # node's parent
-            # which number child am I?
-            nchild = [ind for ind in range(len(xt[parent][1])) if xt[parent][1][ind] == node]
-            codeword.insert(0, nchild[0])
-            node = parent
+        while codewords[node] is None and xt[node][0] != -1:  # while node is not root
+            path.append(node)
+            node = xt[node][0]  # node's parent
+        codeword = codewords[node] or []
+        for node in reversed(path):
+            codeword = codeword + [nchild[node]]
+            codewords[node] = codeword
         code[xt[leaf][2]] = codeword
 
     return code
@@ -148,3 +159,108 @@ def code2xtree(c):
 
 def code2tree(c):
     return xtree2tree(code2xtree(c))
+
+
+class ArrayTree:
+    """
+    Binary tree held as arrays indexed by node: parent, child0 and child1 are
+    the indices of the parent and children of each node, -1 for none, label
+    its label, symbols at the leaves, and root the index of the root. The
+    conversions to and from codebooks and extended trees take O(n) time.
+    """
+    __slots__ = ('parent', 'child0', 'child1', 'label', 'root')
+
+    def __init__(self, parent, child0, child1, label):
+        self.parent = parent
+        self.child0 = child0
+        self.child1 = child1
+        self.label = label
+        roots = [k for k in range(len(parent)) if parent[k] == -1]
+        if len(roots) != 1:
+            raise NameError('Tree with no or multiple roots!')
+        self.root = roots[0]
+
+    def __len__(self):
+        return len(self.parent)
+
+
+def code2array(c):
+    """
+    Builds the ArrayTree of a binary codebook, numbering and labelling its
+    nodes as code2xtree does.
+    """
+    parent, child = [-1], ([-1], [-1])
+    label = [None]
+    for symbol in c:
+        node = 0  # reset to root
+        for digit in c[symbol]:
+            if digit not in (0, 1):
+                raise ValueError('Codeword of {} is not binary'.format(symbol))
+            if child[digit][node] == -1:
+                # create new node
+                child[digit][node] = len(parent)
+                parent.append(node)
+                child[0].append(-1)
+                child[1].append(-1)
+                label.append(None)
+            node = child[digit][node]
+        label[node] = symbol
+
+    # label the nodes that are not codewords by numbering them
+    k = 0
+    for node in range(len(label)):
+        if label[node] is None:
+            label[node] = str(k)
+            k += 1
+    return ArrayTree(parent, child[0], child[1], label)
+
+
+def xtree2array(xt):
+    """
+    Converts a binary extended tree to an ArrayTree with the same numbering.
+    """
+    child0, child1 = [-1]*len(xt), [-1]*len(xt)
+    for node in range(len(xt)):
+        children = xt[node][1]
+        if len(children) > 2:
+            raise ValueError('Node {} has more than two children'.format(node))
+        if len(children) > 0:
+            child0[node] = children[0]
+        if len(children) > 1:
+            child1[node] = children[1]
+    return ArrayTree([node[0] for node in xt], child0, child1, [node[2] for node in xt])
+
+
+def array2xtree(at):
+    """
+    Converts an ArrayTree to an extended tree, with lists of children as
+    code2xtree makes them.
+    """
+    xt = []
+    for node in range(len(at)):
+        if at.child1[node] != -1:
+            children = [at.child0[node], at.child1[node]]
+        elif at.child0[node] != -1:
+            children = [at.child0[node]]
+        else:
+            children = []
+        xt.append([at.parent[node], children, at.label[node]])
+    return xt
+
+
+def array2code(at):
+    """
+    Returns the codebook of the leaves of an ArrayTree, as xtree2code does
+    for the equivalent extended tree.
+    """
+    codewords = [None]*len(at)
+    codewords[at.root] = []
+    stack = [at.root]
+    while stack:  # parents are visited before their children
+        node = stack.pop()
+        for bit, child in enumerate((at.child0[node], at.child1[node])):
+            if child != -1:
+                codewords[child] = codewords[node] + [bit]
+                stack.append(child)
+    return dict([(at.label[node], codewords[node]) for node in range(len(at))
+                 if at.child0[node] == -1 and at.child1[node] == -1])
@@ -1,8 +1,7 @@
-from fgk import print_tree, SiblingPair, error_check_tree
-import numpy as np
-from bitstring import BitArray
-from sys import stdout as so
-from math import floor
+from fgk import SiblingList, error_check_tree, leaf, swap, NULL
+import math
+import progress
+import bitio
 
 """
 This file details the functions needed to apply a Vitter algorithm of Adaptive
@@ -14,14 +13,98 @@ O. Jones Dec 2018
 """
 
 
-def vitter_encode(x, N=200, alpha=0.5, remove=False):
+class BlockList(SiblingList):
+    """
+    SiblingList indexed by the blocks of Vitter's implicit numbering. Nodes
+    are ranked from the root down the list, the 1 side of each pair first, so
+    that slot s has rank s ^ 1, and weights never increase with rank. leader
+    maps each weight to the first rank of its block, which is the node an
+    update swaps with.
+    """
+    __slots__ = ('leader',)
+
+    def __init__(self):
+        super().__init__()
+        self.leader = {}
+
+    def index_blocks(self):
+        """
+        Rebuilds leader from the counts, in O(n) time.
+        """
+        count = self.count
+        leader = {}
+        for r in range(len(count) - 1, -1, -1):
+            leader[count[r ^ 1]] = r
+        self.leader = leader
+
+    def increment(self, s):
+        """
+        Adds one to the count of slot s, moving it from its block to the
+        next, in O(1) time.
+        """
+        count, leader = self.count, self.leader
+        c = count[s]
+        r = s ^ 1
+        if leader[c] == r:
+            # the block of c now starts at the next rank, if it has one
+            if r + 1 < len(count) and count[(r + 1) ^ 1] == c:
+                leader[c] = r + 1
+            else:
+                del leader[c]
+        if leader.get(c + 1, r + 1) > r:
+            leader[c + 1] = r
+        count[s] = c + 1
+
+
+def init_tree(a, alphabet=256):
+    """
+    Initialises the sibling list and alphabet pointers of a tree holding only
+    the NULL leaf and symbol a, with a count of 1, out of the symbols 0 to
+    alphabet-1.
+
+    Returns:
+    --------
+    sib_list: BlockList
+    alphabet_pointers: dict
+    Dictionary of slots of the leaves of sib_list labelled with symbols, -1
+    for those not in the tree
+    """
+    alphabet_pointers = dict([(b, -1) for b in range(alphabet)])
+    alphabet_pointers[NULL] = 0
+
+    # keep null pointer on all zeros
+    sib_list = BlockList()
+    sib_list.append(-1, leaf(NULL), leaf(a), 0, 1)
+    sib_list.index_blocks()
+    alphabet_pointers[a] = 1  # may be a 1 bit so check decoding
+    return sib_list, alphabet_pointers
+
+
+def add_symbol(sib_list, alphabet_pointers, a):
+    """
+    Splits the NULL leaf into a new pair of the NULL leaf and symbol a. If
+    decay has removed every symbol the tree is empty, NULL is at the root and
+    the new pair becomes the root.
+    """
+    null = alphabet_pointers[NULL]
+    p = sib_list.append(null, leaf(NULL), leaf(a), 0, 0)
+    if null != -1:
+        sib_list.child[null] = p << 1
+        sib_list.count[null] = 0
+    # NULL, at the last rank, is the only other node of weight 0
+    sib_list.leader[0] = null ^ 1 if null != -1 else 0
+    alphabet_pointers[NULL] = 2*p
+    alphabet_pointers[a] = 2*p + 1
+
+
+def vitter_encode(x, N=200, alpha=0.5, remove=False, report=None, alphabet=256):
     """
     Encodes data using a Vitter Adaptive Huffman Algorithm
 
     Parameters:
     -----------
-    x: bytes string
-    Data to be encoded
+    x: bytes-like or str
+    Data to be encoded, see bitio.symbols
 
     N=200: int
     Amount of symbols to encode before decaying weights by alpha
@@ -32,91 +115,68 @@ def vitter_encode(x, N=200, alpha=0.5, remove=False):
     remove=False: Bool
     Whether low weight symbols should be removed from the tree after decaying
 
+    report=None: progress.Progress
+    Reports progress if given
+
+    alphabet=256: int
+    Number of symbols, new ones are sent as literals of its bit length
+
     Returns:
     --------
-    y: list of bit
+    y: bitio.BitWriter
     """
     # initialise alphabet pointers with null
     if alpha > 1:
         raise ValueError("{} is not a valid alpha, alpha <=1".format(alpha))
 
-    alphabet_pointers = dict([(chr(a), (-1, -1)) for a in range(128)])
-    alphabet_pointers["NULL"] = (0, 0)
-
-    # keep null pointer on all zeros
-    init_pair = SiblingPair()
-    init_pair.fp = (-1, -1)
-    init_pair.bp = [("NULL", True), (x[0], True)]
-    init_pair.count = np.array([0.0, 1.0])
-    alphabet_pointers[x[0]] = (0, 1)  # may be a 1 bit so check decoding
-    sib_list = [init_pair]
+    x = bitio.symbols(x)
+    literal = (alphabet - 1).bit_length()
+    if max(x) >= alphabet:
+        raise ValueError("Symbol {} outside alphabet of {}".format(max(x), alphabet))
+    sib_list, alphabet_pointers = init_tree(x[0], alphabet)
 
     # Now we have generated the starting tree we can begin to order the list
-    init_code = [int(a) for a in bin(ord(x[0]))[2:]]
-    init_code = [0]*(7-len(init_code)) + init_code  # extend to make full 7 bits
-    y = init_code
+    y = bitio.BitWriter()
+    y.write(x[0], literal)  # first symbol is sent as a literal
+    checkpoint = progress.begin(report, 'Adaptive Huffman encoded', len(x), 1)
     for i in range(1, len(x)):
-        if i % 100 == 0:
-            so.write('Adaptive Huffman encoded %d%%    \r' % int(floor(i/len(x)*100)))
-            so.flush()
-
-        code = []
-        try:
-            # non ASCII characters not set up to be decoded but this exception
-            # handler will add it to the alphabet for benchmarking purposes
-            a = alphabet_pointers[x[i]][0]
-        except KeyError:
-            print("Warning non ASCII character encoded, decoder will not recognise\n")
-            alphabet_pointers[x[i]] = (-1, -1)
-
-        if alphabet_pointers[x[i]][0] == -1:  # not yet in tree
-            # create a new pair
-            new_pair = SiblingPair()
-            new_pair.count = np.array([0.0, 0.0])
-            new_pair.fp = (alphabet_pointers["NULL"][0], 0)
-            new_pair.bp = [("NULL", True), (x[i], True)]
-            sib_list.append(new_pair)
-            sib_list[alphabet_pointers["NULL"][0]].bp[0] = (len(sib_list)-1, False)
-            sib_list[alphabet_pointers["NULL"][0]].count[0] = 0.0
-
-            pnt, bit = alphabet_pointers["NULL"]
-            alphabet_pointers["NULL"] = (len(sib_list)-1, 0)
-            alphabet_pointers[x[i]] = (len(sib_list)-1, 1)
-
-            # generate the codeword
-            while pnt != -1:  # note root node will not be added
-                code.append(bit)
-                pnt, bit = sib_list[pnt].fp
-            code = code[::-1]  # as we are traversing leaves to root so codeword is reversed
-            sym_code = [int(a) for a in bin(ord(x[i]))[2:]]
-            code = code + [0]*(7-len(sym_code)) + sym_code
-
-        else:
-            # generate the codeword
-            pnt, bit = alphabet_pointers[x[i]]
-            while pnt != -1:  # note root node will not be added
-                code.append(bit)
-                pnt, bit = sib_list[pnt].fp
-
-            code = code[::-1]  # as we are traversing leaves to root so codeword is reversed
-
-        y += code
-        sib_list, alphabet_pointers = modify_tree_vitter(sib_list, alphabet_pointers, char=x[i])
+        if i == checkpoint:
+            checkpoint = report.update(i)
+
+        a = x[i]
+        new = alphabet_pointers[a] == -1  # not yet in tree
+        s = alphabet_pointers[NULL] if new else alphabet_pointers[a]
+        if new:
+            add_symbol(sib_list, alphabet_pointers, a)
+
+        # generate the codeword, note root node will not be added
+        fp = sib_list.fp
+        code, length = 0, 0
+        while s != -1:
+            code |= (s & 1) << length  # traversing leaves to root so codeword is reversed
+            length += 1
+            s = fp[s >> 1]
+        y.write(code, length)
+        if new:
+            y.write(a, literal)  # followed by the symbol as a literal
+
+        modify_tree_vitter(sib_list, alphabet_pointers, a)
 
         if i % N == 0 and alpha != 1:
             sib_list, alphabet_pointers = decay_list(sib_list, alphabet_pointers, alpha, remove)
 
     error_check_tree(sib_list)
+    progress.end(report)
     return y
 
 
-def vitter_decode(y, N=200, alpha=0.5, remove=False):
+def vitter_decode(y, N=200, alpha=0.5, remove=False, report=None, alphabet=256, out=None):
     """
     Decodes data using a Vitter Adaptive Huffman Algorithm
 
     Parameters:
     -----------
-    y: list of bits
+    y: list of bits, bitio.BitWriter or bytes
     Data to be decoded
 
     N=200: int
@@ -128,90 +188,74 @@ def vitter_decode(y, N=200, alpha=0.5, remove=False):
     remove=False: Bool
     Whether low weight symbols should be removed from the tree after decaying
 
-    Returns:
-    --------
-    x: list of bytes
-    """
-    # first symbol will be uncompressed and 7 bits ascii
-    x = []
-    init_sym = y[:7]
-    init_sym = chr(BitArray(init_sym).uint)
-
-    x.append(init_sym)
-    # initialise alphabet pointers with null
-    alphabet_pointers = dict([(chr(a), (-1, -1)) for a in range(128)])
-    alphabet_pointers["NULL"] = (0, 0)
+    report=None: progress.Progress
+    Reports progress if given
 
-    # keep null pointer on all zeros
-    init_pair = SiblingPair()
-    init_pair.fp = (-1, -1)
-    init_pair.bp = [("NULL", True), (x[0], True)]
-    init_pair.count = np.array([0.0, 1.0])
-    alphabet_pointers[x[0]] = (0, 1)  # may be a 1 bit so check decoding
-    sib_list = [init_pair]
-
-    pair = sib_list[0]  # initialise root which is at start of the list
-    current_pnt = 0
-    i = 7
-    while i < len(y):
-        if i % 100 == 0:
-            so.write('Adaptive Huffman decoded %d%%    \r' % int(floor(i/len(y)*100)))
-            so.flush()
-
-        bit = y[i]
-
-        if pair.bp[bit][1]:  # reached leaf
-            if pair.bp[bit][0] == "NULL":  # if new symbol
-                code = y[i+1:i+8] #gathers block code
-                i += 7  # additional incremented add at the end of the loop
-                symb = chr(BitArray(code).uint)
-                if alphabet_pointers[symb][0] != -1:
-                    print("ERROR CURRENT TREE:")
-                    print_tree(sib_list)
-                    print("ALPHABET POINTERS:")
-                    for j, k in alphabet_pointers.items():
-                        print("{}: {}".format(j, k))
-                    print(x)
-                    raise RuntimeError("Null root for existing items: {}".format(symb))
-                x.append(symb)
-
-                # create a new pair
-                new_pair = SiblingPair()
-                new_pair.count = np.array([0.0, 0.0])
-                new_pair.fp = (alphabet_pointers["NULL"][0], 0)
-                new_pair.bp = [("NULL", True), (x[-1], True)]
-                sib_list.append(new_pair)
-                sib_list[alphabet_pointers["NULL"][0]].bp[0] = (len(sib_list)-1, False)
-                alphabet_pointers["NULL"] = (len(sib_list)-1, 0)
-                alphabet_pointers[x[-1]] = (len(sib_list)-1, 1)
+    alphabet=256: int
+    Number of symbols, as given to vitter_encode
 
-            else:
-                x.append(pair.bp[bit][0])
+    out=None: writable bytes-like
+    Buffer to decode into, see bitio.output
 
-            sib_list, alphabet_pointers = modify_tree_vitter(sib_list, alphabet_pointers, x[-1])
-            if len(x) % N == 1 and alpha != 1:
+    Returns:
+    --------
+    x: bytearray or memoryview
+    Decoded data, the part of out written if given
+    """
+    y = bitio.reader(y)
+    n = len(y)
+
+    # first symbol will be uncompressed
+    literal = (alphabet - 1).bit_length()
+    x = bitio.output(out)
+    bitio.store(x, 0, y.read(literal))
+    k = 1  # number of symbols decoded
+    sib_list, alphabet_pointers = init_tree(x[0], alphabet)
+
+    current_pnt = 0  # initialise root which is at start of the list
+    checkpoint = progress.begin(report, 'Adaptive Huffman decoded', n, y.tell())
+    while y.tell() < n:
+        i = y.tell()
+        if i == checkpoint:
+            checkpoint = report.update(i)
+
+        if alphabet_pointers[NULL] == -1:  # empty tree, NULL has no codeword
+            c = leaf(NULL)
+        else:
+            c = sib_list.child[2*current_pnt + y.read_bit()]
+        if c & 1:  # reached leaf
+            a = c >> 1
+            if a == NULL:  # if new symbol
+                a = y.read(literal)  # gathers block code
+                if alphabet_pointers[a] != -1:
+                    raise RuntimeError("Null root for existing item {} at position {}".format(a, k))
+                add_symbol(sib_list, alphabet_pointers, a)
+            bitio.store(x, k, a)
+            k += 1
+
+            modify_tree_vitter(sib_list, alphabet_pointers, a)
+            if k % N == 1 and alpha != 1:
                 sib_list, alphabet_pointers = decay_list(sib_list, alphabet_pointers, alpha, remove)
 
             current_pnt = 0
         else:
-            current_pnt = pair.bp[bit][0]
-        pair = sib_list[current_pnt]
-        i += 1
+            current_pnt = c >> 1
 
-    return x
+    progress.end(report)
+    return x[:k] if k < len(x) else x
 
 
 def decay_list(sib_list, alphabet_pointers, alpha, remove=False):
     """
     Decays the counts of a Huffman tree by alpha and re-arranges it to satisfy
-    the Vitter criteria.
+    the Vitter criteria, rebuilding it in place in O(n log n) time.
 
     Parameters:
     -----------
-    sib_list: list of SiblingPair()
+    sib_list: BlockList
     Tree structure to be modified
 
-    alphabet_pointers: dict {symbol: (<forward_pointer>, bit)}
+    alphabet_pointers: dict {symbol: slot}
     Leaves of the tree structure
 
     alpha: float <= 1
@@ -222,82 +266,84 @@ def decay_list(sib_list, alphabet_pointers, alpha, remove=False):
 
     Returns:
     --------
-    sib_list: list of SiblingPair()
-    Modified sib_list
+    sib_list: BlockList
+    sib_list, modified
 
-    alphabet_pointers: dict {symbol: (<forward_pointer>, bit)}
+    alphabet_pointers: dict {symbol: slot}
     Modified alphabet_pointers
     """
     if remove:
-        func = np.floor
+        func = math.floor
     else:
-        func = np.ceil
+        func = math.ceil
 
-    for item in sib_list:
-        item.count = func(item.count*alpha)
+    count, child, fp = sib_list.count, sib_list.child, sib_list.fp
 
-    # create list of alphabet_counts:
-    alphabet_counts = {}
-    for char in alphabet_pointers:
-        if alphabet_pointers[char][0] != -1:
-            if sib_list[alphabet_pointers[char][0]].count[alphabet_pointers[char][1]] == 0:
-                alphabet_pointers[char] = (-1, -1)
+    # create list of leaves with their decayed counts:
+    leaves = []
+    for a, s in alphabet_pointers.items():
+        if s != -1:
+            c = func(count[s]*alpha)
+            if c == 0:
+                alphabet_pointers[a] = -1
             else:
-                alphabet_counts[char] = sib_list[alphabet_pointers[char]
-                                                 [0]].count[alphabet_pointers[char][1]]
-
-    alphabet_counts = [(a, b, True) for a, b in alphabet_counts.items()]
-    alphabet_counts.append(("NULL", 0.0, True))
-    # create new tree
-    # sort in order of frequency
-    alphabet_counts = sorted(alphabet_counts, key=lambda el: (el[1], el[2]))
-
-    # create list of sibling pairs which will be length len(alphabet)-1
-    sib_list = [SiblingPair() for i in range(len(alphabet_counts)-1)]
-
-    rev_pnt = -1
-    while len(alphabet_counts) > 1:
-        # sort in order of frequency putting internal nodes at the bottom to stop
-        # parents or Null pair being at the top of the 1 weight class
-        alphabet_counts = sorted(alphabet_counts, key=lambda el: (el[1], el[2]))
+                leaves.append((a, c))
+
+    leaves.append((NULL, 0))
+    # sort in order of frequency, once, as the internal nodes are created in
+    # order of frequency and can be queued separately
+    leaves.sort(key=lambda el: el[1])
+
+    # rebuild the tree in place, from the bottom of the list up, with
+    # len(leaves)-1 pairs
+    size = len(leaves) - 1
+    del count[2*size:], child[2*size:], fp[size:]
+    nodes = []  # internal nodes (pair, count) not yet given a parent
+    i, j = 0, 0
+    for p in range(size - 1, -1, -1):
         for bit in range(2):
-            sib_list[rev_pnt].bp[bit] = (alphabet_counts[bit][0], alphabet_counts[bit][2])
-            sib_list[rev_pnt].count[bit] = alphabet_counts[bit][1]
-            if alphabet_counts[bit][2]:  # if not internal node
-                alphabet_pointers[alphabet_counts[bit][0]] = (len(sib_list) + rev_pnt, bit)
+            # take the lightest node, putting internal nodes at the bottom to
+            # stop parents or Null pair being at the top of the 1 weight class
+            if j < len(nodes) and (i == len(leaves) or nodes[j][1] <= leaves[i][1]):
+                q, c = nodes[j]
+                j += 1
+                child[2*p + bit] = q << 1
+                fp[q] = 2*p + bit
             else:
-                sib_list[alphabet_counts[bit][0]].fp = (len(sib_list) + rev_pnt, bit)
-
-        alphabet_counts.pop(0)
-        alphabet_counts.pop(0)
-        alphabet_counts.append((len(sib_list)+rev_pnt, np.sum(sib_list[rev_pnt].count), False))
-
-        rev_pnt -= 1
-
+                a, c = leaves[i]
+                i += 1
+                child[2*p + bit] = leaf(a)
+                alphabet_pointers[a] = 2*p + bit
+            count[2*p + bit] = c
+        nodes.append((p, count[2*p] + count[2*p + 1]))
+    if size:
+        fp[0] = -1
+
+    sib_list.index_blocks()
     # Error check tree
     # error_check_tree(sib_list)
     return sib_list, alphabet_pointers
 
 
-def modify_tree_vitter(sib_list, alphabet_pointers, char):
+def modify_tree_vitter(sib_list, alphabet_pointers, a):
     """
     Modifies and exitsting sibling list for Adaptive Huffman algorithms based
     on a traversal list from an encoding or decoding process
 
     Parameters:
     -----------
-    sib_list: list of SiblingPair()
-    List of sibling pair trees based on the ASCII character set
+    sib_list: BlockList
+    List of sibling pair trees over the alphabet
 
     alphabet_pointers: dict
-    Dictionary of pointers to leaves of sib_list labelled with ascii characters
+    Dictionary of slots of the leaves of sib_list labelled with symbols
 
-    char: character
+    a: int
     Symbol that has been encoded on the tree
 
     Returns:
     --------
-    sib_list: list of SiblingPair()
+    sib_list: BlockList
     Modified sib_list to take into account the observed data
 
     alphabet_pointers: dict
@@ -305,45 +351,18 @@ def modify_tree_vitter(sib_list, alphabet_pointers, char):
     """
     # NOTE: Tree should be maintained such that all bp < fp and all
     # counts higher up the list <= than those below it
-    get_out = False
-    # check alphabet_pointers
-    pnt, bit = alphabet_pointers[char]
-    while pnt != -1:  # could skip first iteration if new char as will be in max place?
-        for index in range(pnt+1):  # could do check that once greater than swap to that position to limit iterations
-            for i in range(2):
-                if sib_list[index].count[1-i] == sib_list[pnt].count[bit]:  # 1-i to make sure it is left as possible
-                    if (index, 1-i) == (pnt, bit) or (index, 1-i) == sib_list[pnt].fp:
-                        # if already at highest order
-                        # also don't swap with parent node
-                        pass
-                    else:
-                        # swap fps and bps
-                        bckpnt1 = sib_list[pnt].bp[bit]
-                        if bckpnt1[1]:
-                            alphabet_pointers[bckpnt1[0]] = (index, 1-i)
-                        else:
-                            sib_list[bckpnt1[0]].fp = (index, 1-i)
-
-                        bckpnt2 = sib_list[index].bp[1-i]
-                        if bckpnt2[1]:
-                            alphabet_pointers[bckpnt2[0]] = (pnt, bit)
-                        else:
-                            sib_list[bckpnt2[0]].fp = (pnt, bit)
-
-                        # swap bps
-                        sib_list[pnt].bp[bit] = bckpnt2
-                        sib_list[index].bp[1-i] = bckpnt1
-                        pnt, bit = index, 1-i
-                    get_out = True
-                    break
-
-            if get_out:
-                get_out = False
-                break
-
-        sib_list[pnt].count[bit] += 1
-
-        pnt, bit = sib_list[pnt].fp
+    count, fp, leader = sib_list.count, sib_list.fp, sib_list.leader
+    s = alphabet_pointers[a]
+    while s != -1:
+        # swap with the leader of the block, the highest order node of the
+        # same weight
+        t = leader[count[s]] ^ 1
+        if t != s and t != fp[s >> 1]:  # if already at highest order, also don't swap with parent node
+            swap(sib_list, alphabet_pointers, s, t)
+            s = t
+
+        sib_list.increment(s)
+        s = fp[s >> 1]
 
     # Error Check tree
     # error_check_tree(sib_list)
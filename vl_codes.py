@@ -1,5 +1,9 @@
 import math
-import itertools
+import heapq
+import collections
+import numpy as np
+import bitio
+import trees
 
 
 def probability_dict(x):
@@ -20,12 +24,54 @@ def probability_dict(x):
     Alphabet and corresponding frequencies in file data
     """
 
-    frequencies = dict([(key, len(list(group))) for key, group in itertools.groupby(sorted(x))])
+    frequencies = count_symbols(x)
     n = sum([frequencies[a] for a in frequencies])
     p = dict([(a, frequencies[a]/n) for a in frequencies])
     return(p, frequencies)
 
 
+def count_symbols(x):
+    """
+    Counts the symbols of x in linear time: with numpy.bincount over a
+    zero-copy view for bytes-like data, with a Counter otherwise.
+
+    Parameters:
+    -----------
+    x: bytes, str or sequence
+    file data
+
+    Returns:
+    --------
+    frequencies: dict
+    Alphabet, in sorted order, and corresponding frequencies in file data
+    """
+    if isinstance(x, (bytes, bytearray, memoryview)):
+        counts = np.bincount(np.frombuffer(x, dtype=np.uint8), minlength=256)
+        return dict([(int(a), int(counts[a])) for a in np.flatnonzero(counts)])
+    counts = collections.Counter(x)
+    return dict([(a, counts[a]) for a in sorted(counts)])
+
+
+def merge_frequencies(counts):
+    """
+    Merges symbol counts of separate parts of some data, such as those
+    returned by count_symbols for each of its chunks.
+
+    Parameters:
+    -----------
+    counts: iterable of dict
+
+    Returns:
+    --------
+    frequencies: dict
+    Alphabet, in sorted order, and corresponding frequencies over all parts
+    """
+    frequencies = collections.Counter()
+    for c in counts:
+        frequencies.update(c)
+    return dict([(a, frequencies[a]) for a in sorted(frequencies)])
+
+
 def shannon_fano(p):
     """
     Produces binary codebook for a given alphabet using the Shannon-Fano
@@ -81,14 +127,20 @@ def shannon_fano(p):
     return code  # return the code table
 
 
-def huffman(p):
+def huffman(p, max_length=None):
     """
     Produces binary codebook for a given alphabet using the Huffman algorithm.
+    The two least probable nodes are taken from a heap, giving O(n log n)
+    construction. Ties are broken in the order the nodes were created, so the
+    tree is the same as when re-sorting the list on every merge.
 
     Parameters:
     -----------
     p: dict
     Alphabet and corresponding probability
+    max_length=None: int
+    Longest codeword allowed. If the Huffman code has longer codewords the
+    optimal length-limited code from package_merge is used instead
 
     Returns:
     --------
@@ -105,62 +157,218 @@ def huffman(p):
     # create an xtree with all the source symbols (to be the leaves) initially orphaned
     xt = [[-1, [], a] for a in p]
 
-    # convert p to list of tuples with pointer to tree and their probability
-    p = [(k, p[a]) for k, a in zip(range(len(p)), p)]
+    # heap of (probability, pointer to tree), the pointer breaks ties in order of creation
+    heap = [(p[a], k) for k, a in zip(range(len(p)), p)]
+    heapq.heapify(heap)
 
     nodelabel = len(p)
 
-    while len(p) > 1:
-        # sort probabilities in ascending order
-        p = sorted(p, key=lambda el: el[1])
+    while len(heap) > 1:
+        # take the nodes with the smallest probabilities
+        p0, n0 = heapq.heappop(heap)
+        p1, n1 = heapq.heappop(heap)
 
-        # Now append a new node to the tree xt with no parent or children
-        xt.append([-1, [], nodelabel])
+        # Now append a new node to the tree xt with the two nodes as children
+        xt.append([-1, [n0, n1], nodelabel])
         nodelabel += 1
+        xt[n0][0] = len(xt)-1
+        xt[n1][0] = len(xt)-1
 
-        # assign parent of the nodes pointed to by the smallest probabilities
-        xt[p[0][0]][0] = len(xt)-1
-        xt[p[1][0]][0] = len(xt)-1
-
-        # assign children to appended node
-        xt[-1][1] = [p[0][0], p[1][0]]
+        # replace nodes, with combined node
+        heapq.heappush(heap, (p0+p1, len(xt)-1))
 
-        # replace nodes, with combined nodes
-        p.append((len(xt)-1, p[0][1]+p[1][1]))
-        p.pop(0)
-        p.pop(0)
+    if max_length is not None and len(xt) > 1:
+        # parents are always after their children so depths come from one reverse pass
+        depth = [0]*len(xt)
+        for k in range(len(xt)-2, -1, -1):
+            depth[k] = depth[xt[k][0]] + 1
+        if max(depth) > max_length:
+            c = canonical_code(package_merge(p, max_length))
+            xt = trees.code2xtree(c)
 
     return(xt)
 
 
+def package_merge(p, max_length):
+    """
+    Produces the codeword lengths of the optimal prefix code with no codeword
+    longer than max_length, using the package-merge algorithm of Larmore and
+    Hirschberg in O(n max_length) time.
+
+    Parameters:
+    -----------
+    p: dict
+    Alphabet and corresponding probability (or count)
+    max_length: int
+    Longest codeword allowed
+
+    Returns:
+    --------
+    lengths: dict
+    Alphabet and corresponding codeword length
+    """
+    alphabet = list(p)
+    if len(alphabet) == 1:
+        return {alphabet[0]: 1}
+    if (1 << max_length) < len(alphabet):
+        raise ValueError("{} symbols cannot be coded with at most {} bits".format(len(alphabet), max_length))
+
+    # items are (weight, leaf index) or (weight, (item, item)) for a package
+    leaves = sorted([(p[a], k) for k, a in zip(range(len(alphabet)), alphabet)], key=lambda el: el[0])
+    items = leaves
+    for level in range(max_length-1):
+        packages = [(items[k][0]+items[k+1][0], (items[k], items[k+1])) for k in range(0, len(items)-1, 2)]
+        items = list(heapq.merge(leaves, packages, key=lambda el: el[0]))
+
+    # each time a leaf appears in the 2n-2 cheapest items its codeword gets a bit longer
+    lengths = [0]*len(alphabet)
+    stack = items[:2*len(alphabet)-2]
+    while stack:
+        weight, content = stack.pop()
+        if isinstance(content, tuple):
+            stack.extend(content)
+        else:
+            lengths[content] += 1
+
+    return dict([(a, length) for a, length in zip(alphabet, lengths)])
+
+
+def code_lengths(c):
+    """
+    Returns the codeword length of every symbol in a codebook, which is all a
+    canonical Huffman code needs to be rebuilt.
+
+    Parameters:
+    -----------
+    c: dict or extended tree
+    Codebook of source symbols and corresponding binary code, or the extended
+    tree it is derived from
+
+    Returns:
+    --------
+    lengths: dict
+    Alphabet and corresponding codeword length
+    """
+    if not isinstance(c, dict):
+        c = trees.xtree2code(c)
+    lengths = dict([(a, len(c[a])) for a in c])
+    if len(lengths) == 1:
+        # a lone symbol still needs one bit so the decoder can count it
+        lengths = dict([(a, 1) for a in lengths])
+    return lengths
+
+
+def canonical_code(lengths):
+    """
+    Produces the canonical prefix code for a set of codeword lengths. Symbols
+    are ordered by length and then by value, and each is assigned the next
+    binary number of its length, so the code is fully described by the
+    lengths.
+
+    Parameters:
+    -----------
+    lengths: dict
+    Alphabet and corresponding codeword length, 0 for unused symbols
+
+    Returns:
+    --------
+    code: dict
+    Alphabet and corresponding binary codeword
+    """
+    code = {}
+    value = 0
+    prev = 0
+    for symbol, length in sorted([(a, lengths[a]) for a in lengths if lengths[a] > 0],
+                                 key=lambda el: (el[1], el[0])):
+        value <<= length - prev
+        if value >> length:
+            raise ValueError("Codeword lengths violate the Kraft inequality")
+        code[symbol] = [int(b) for b in format(value, '0%db' % length)]
+        value += 1
+        prev = length
+    return code
+
+
+def write_code_lengths(y, lengths, alphabet=256):
+    """
+    Writes the codeword lengths of a byte alphabet as a compact header: 8 bits
+    giving the width w of each field, then alphabet fields of w bits.
+
+    Parameters:
+    -----------
+    y: bitio.BitWriter
+    Stream to write the header to
+    lengths: dict
+    Symbol (int in range(alphabet)) and corresponding codeword length
+    alphabet=256: int
+    Number of symbols in the header
+    """
+    width = max(lengths.values(), default=0).bit_length()
+    y.write(width, 8)
+    for a in range(alphabet):
+        y.write(lengths.get(a, 0), width)
+
+
+def read_code_lengths(y, alphabet=256):
+    """
+    Reads a header written by write_code_lengths
+
+    Parameters:
+    -----------
+    y: bitio.BitReader
+    Stream positioned at the header, left positioned after it
+
+    Returns:
+    --------
+    lengths: dict
+    Symbol and corresponding codeword length, for symbols that are used
+    """
+    width = y.read(8)
+    lengths = {}
+    for a in range(alphabet):
+        length = y.read(width)
+        if length:
+            lengths[a] = length
+    return lengths
+
+
 def bits2bytes(x):
-    n = len(x)+3
-    r = (8 - n % 8) % 8
-    prefix = format(r, '03b')
-    x = ''.join(str(a) for a in x)
-    suffix = '0'*r
-    x = prefix + x + suffix
-    x = [x[k:k+8] for k in range(0, len(x), 8)]
-    y = []
-    for a in x:
-        y.append(int(a, 2))
+    """
+    Packs a list of bits into bytes, prefixed by 3 bits giving the number of
+    zero bits padding the end of the last byte.
 
-    return y
+    Parameters:
+    -----------
+    x: list of bits or bitio.BitWriter
+    Binary data
+
+    Returns:
+    --------
+    y: list of int
+    Byte values of the packed data
+    """
+    if not isinstance(x, bitio.BitWriter):
+        x = bitio.BitWriter(x)
+    return list(x.getvalue())
 
 
 def bytes2bits(y):
-    x = [format(a, '08b') for a in y]
-    r = int(x[0][0:3], 2)
-    x = ''.join(x)
-    x = [int(a) for a in x]
-    for k in range(3):
-        x.pop(0)
-    for k in range(r):
-        x.pop()
-    return x
+    """
+    Inverse of bits2bytes, removes the padding header and trailing zeros.
+
+    Parameters:
+    -----------
+    y: bytes-like or list of int
+    Packed data
+
+    Returns:
+    --------
+    x: list of bits
+    """
+    return list(bitio.BitReader(bytes(y)))
 
 
-def vl_encode(x, c):
+def vl_encode(x, c, y=None):
     """
     Encodes data based on provided codebook
 
@@ -170,48 +378,285 @@ def vl_encode(x, c):
     Data to be encoded
     c: dict
     Codebook of source symbols and corresponding binary code
+    y=None: bitio.BitWriter
+    Stream to append the encoded data to, e.g. after a header
 
     Returns:
     --------
-    y: list
+    y: bitio.BitWriter
     Binary list of encoded data
     """
-    y = []
+    if isinstance(x, (bytes, bytearray, memoryview)) and all((a in range(256) for a in c)):
+        return vl_encode_array(x, c, y)
+
+    c = dict([(a, (int(''.join(str(b) for b in c[a]) or '0', 2), len(c[a]))) for a in c])
+    if y is None:
+        y = bitio.BitWriter()
     for a in x:
-        y.extend(c[a])
+        y.write(*c[a])
     return y
 
 
-def vl_decode(y, xt):
+def vl_encode_array(x, c, y=None, chunk=1 << 16):
     """
-    Decodes data based on extended tree codebook
+    Encodes bytes with numpy, producing the same bits as vl_encode. Each
+    chunk of input is mapped through codeword and length lookup arrays, the
+    bit position of every codeword comes from a cumulative sum of the lengths,
+    and the codewords are shifted into place in 32 bit words. Codewords in the
+    same word do not overlap so each word is the sum of its codewords.
 
     Parameters:
     -----------
-    y: list
+    x: bytes-like
+    Data to be encoded
+    c: dict
+    Codebook of byte values and corresponding binary code
+    y=None: bitio.BitWriter
+    Stream to append the encoded data to, e.g. after a header
+    chunk=65536: int
+    Number of input bytes encoded at a time, bounding the working memory
+
+    Returns:
+    --------
+    y: bitio.BitWriter
     Binary list of encoded data
+    """
+    if y is None:
+        y = bitio.BitWriter()
+    if max([len(c[a]) for a in c], default=0) > 32:
+        # codewords no longer fit in a word with room to shift
+        return vl_encode(list(x), c, y)
+
+    codes = np.zeros(256, dtype=np.uint64)
+    lengths = np.zeros(256, dtype=np.uint64)
+    valid = np.zeros(256, dtype=bool)
+    for a in c:
+        codes[a] = int(''.join(str(b) for b in c[a]) or '0', 2)
+        lengths[a] = len(c[a])
+        valid[a] = True
+
+    x = np.frombuffer(x, dtype=np.uint8)
+    for start in range(0, len(x), chunk):
+        block = x[start:start+chunk]
+        if not valid[block].all():
+            raise KeyError(int(block[~valid[block]][0]))
+
+        block_lengths = lengths[block]
+        ends = np.cumsum(block_lengths) + np.uint64(y.alignment)
+        nbits = int(ends[-1]) - y.alignment
+        if nbits == 0:
+            continue
+        starts = ends - block_lengths
+
+        # place each codeword at its offset in a 64 bit window over words w and w+1
+        w = starts >> np.uint64(5)
+        window = codes[block] << (np.uint64(64) - (starts & np.uint64(31)) - block_lengths)
+        first = np.flatnonzero(np.concatenate(([True], w[1:] != w[:-1])))
+        words = np.zeros(int(w[-1]) + 2, dtype=np.uint64)
+        words[w[first]] += np.add.reduceat(window >> np.uint64(32), first)
+        words[w[first] + np.uint64(1)] += np.add.reduceat(window & np.uint64(0xFFFFFFFF), first)
+
+        y.write_packed(words.astype('>u4').view(np.uint8), nbits)
+
+    return y
+
+
+def vl_decode(y, xt, out=None):
+    """
+    Decodes data based on extended tree codebook
+
+    Parameters:
+    -----------
+    y: list, bitio.BitWriter or bytes
+    Binary list of encoded data, or the packed stream read from a file
     xt: tree
-    Extended tree of coding data
+    Extended tree of coding data, or its trees.ArrayTree
+    out=None: writable bytes-like
+    Buffer to decode byte values into, see bitio.output
 
     Returns:
     --------
-    x: list
-    Character list decoded from y based on xt
+    x: bytearray, memoryview if out is given, or list if xt has symbols other
+    than byte values
+    Character list decoded from y based on xt, the part of out written
     """
-    x = []
-    root = [k for k in range(len(xt)) if xt[k][0] == -1]
-    if len(root) != 1:
-        raise NameError('Tree with no or multiple roots!')
-    root = root[0]
-
-    n = root
-    for k in y:
-        if len(xt[n][1]) < k:
-            raise NameError('Symbol exceeds alphabet size in tree node')
-        if xt[n][1][k] == -1:
+    if not isinstance(xt, trees.ArrayTree):
+        xt = trees.xtree2array(xt)
+    child = (xt.child0, xt.child1)
+    leaf = [a == -1 and b == -1 for a, b in zip(*child)]
+    label = xt.label
+
+    symbols = out is None and not bitio.is_bytes([a for a, b in zip(label, leaf) if b])
+    x = [] if symbols else bitio.output(out)
+    m = 0  # number of symbols decoded
+    root = n = xt.root
+    for k in bitio.reader(y):
+        n = child[k][n]
+        if n == -1:
             raise NameError('Symbol not assigned in tree node')
-        n = xt[n][1][k]
-        if len(xt[n][1]) == 0:  # it's a leaf!
-            x.append(xt[n][2])
+        if leaf[n]:  # it's a leaf!
+            if symbols:
+                x.append(label[n])
+            else:
+                bitio.store(x, m, label[n])
+            m += 1
             n = root
-    return x
+    return x[:m] if m < len(x) else x
+
+
+def _fill_table(codes, used, k):
+    """
+    Builds the lookup table for a group of codewords that share their first
+    used bits, recursing into sub-tables for codewords that do not fit.
+    """
+    width = min(k, max([length for symbol, value, length in codes]) - used)
+    table = [(0, None)]*(1 << width)
+    long_codes = {}
+    for symbol, value, length in codes:
+        rest = length - used
+        tail = value & ((1 << rest) - 1)
+        if rest <= width:
+            # fill every index that starts with the rest of this codeword
+            start = tail << (width - rest)
+            for index in range(start, start + (1 << (width - rest))):
+                table[index] = (length, symbol)
+        else:
+            long_codes.setdefault(tail >> (rest - width), []).append((symbol, value, length))
+
+    for prefix, group in long_codes.items():
+        sub_width, sub = _fill_table(group, used + width, k)
+        table[prefix] = (-sub_width, sub)
+
+    return width, table
+
+
+def decode_table(c, k=9):
+    """
+    Builds lookup tables for decoding a whole codeword at a time. The first
+    level is indexed by the next k bits of the stream, codewords longer than k
+    bits are resolved by second level tables indexed by the following bits
+    (nested further for codewords longer than 2k bits).
+
+    Parameters:
+    -----------
+    c: dict or extended tree
+    Codebook of source symbols and corresponding binary code, or the extended
+    tree it is derived from
+    k=9: int
+    Number of bits indexing each table
+
+    Returns:
+    --------
+    table: tuple
+    (k, maxlen, primary) where table entries are (length, symbol) for a
+    codeword, (-width, subtable) for a sub-table indexed by the next width
+    bits, or (0, None) for an unassigned prefix
+    """
+    if not isinstance(c, dict):
+        c = trees.xtree2code(c)
+    codes = [(a, int(''.join(str(b) for b in c[a]) or '0', 2), len(c[a])) for a in c]
+    maxlen = max([length for a, value, length in codes], default=0)
+    if maxlen == 0:
+        raise NameError('Codebook has no codewords of non-zero length')
+
+    k, primary = _fill_table(codes, 0, k)
+    return (k, maxlen, primary)
+
+
+def _table_symbols(table):
+    # every symbol of a table from decode_table, with repeats
+    for length, symbol in table:
+        if length > 0:
+            yield symbol
+        elif symbol is not None:
+            yield from _table_symbols(symbol)
+
+
+def vl_decode_table(y, table, out=None):
+    """
+    Decodes data with the lookup tables from decode_table, producing the same
+    output as vl_decode with one table hit per symbol rather than one tree
+    step per bit.
+
+    Parameters:
+    -----------
+    y: list, bitio.BitWriter or bytes
+    Binary list of encoded data, or the packed stream read from a file
+    table: tuple
+    Decoding tables returned by decode_table
+    out=None: writable bytes-like
+    Buffer to decode byte values into, see bitio.output
+
+    Returns:
+    --------
+    x: bytearray, memoryview if out is given, or list if the table has
+    symbols other than byte values
+    Symbol list decoded from y, the part of out written
+    """
+    if out is None and not bitio.is_bytes(_table_symbols(table[2])):
+        x = []
+        for block in vl_decode_table_iter(y, table):
+            x.extend(block)
+        return x
+
+    x = bitio.output(out)
+    k = 0
+    for block in vl_decode_table_iter(y, table):
+        if out is None:
+            x.extend(block)
+        elif k + len(block) > len(x):
+            raise ValueError('Output buffer of {} bytes is too small'.format(len(x)))
+        else:
+            x[k:k+len(block)] = bytes(block)
+        k += len(block)
+    return x[:k] if k < len(x) else x
+
+
+def vl_decode_table_iter(y, table, chunk=1 << 16):
+    """
+    Generator version of vl_decode_table, yielding the decoded symbols in
+    lists of about chunk symbols so they can be written out as they are
+    decoded.
+    """
+    k, maxlen, primary = table
+    y = bitio.reader(y)
+    kmask = (1 << k) - 1
+
+    x = []
+    append = x.append
+    acc, nacc = 0, 0  # the last nacc bits of acc have not been decoded yet
+    end = 0           # zero bits padding the end of the stream
+    remaining = y.remaining
+    while nacc > end or remaining:
+        if nacc < maxlen:
+            if len(x) >= chunk:
+                yield x
+                x = []
+                append = x.append
+            if remaining:
+                n = min(64, remaining)
+                remaining -= n
+                acc = ((acc & ((1 << nacc) - 1)) << n) | y.read(n)
+                nacc += n
+            if nacc < maxlen:
+                # pad the end of the stream so the tables can still be indexed
+                end += maxlen - nacc
+                acc <<= maxlen - nacc
+                nacc = maxlen
+
+        length, symbol = primary[(acc >> (nacc - k)) & kmask]
+        if length <= 0:
+            used = k
+            while length <= 0:
+                if symbol is None:
+                    raise NameError('Symbol not assigned in tree node')
+                used -= length
+                length, symbol = symbol[(acc >> (nacc - used)) & ((1 << -length) - 1)]
+
+        nacc -= length
+        if nacc < end:
+            break  # stream ends part way through a codeword
+        append(symbol)
+
+    if x:
+        yield x